@@ -1,4 +1,8 @@
 import sys
 import os
 
+# The modules of the app import each other as top-level modules, e.g. `db` and
+# `model`. The tests of the modules that use the database or the app singletons import
+# them the same way, so that they share one copy of the models and singletons.
 sys.path.append(os.path.join(os.path.dirname(__file__), "../wkwallet"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../wkwallet/connectrum"))
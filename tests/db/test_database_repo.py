@@ -2,7 +2,10 @@ import os
 import tempfile
 import unittest
 
+from peewee import OperationalError
+from wkwallet.db.base_model import pooled_reads
 from wkwallet.db.database_repo import DB_LOCATION_MEMORY, DatabaseRepo
+from wkwallet.db.wallet_data import WalletData
 
 
 def remove_file_if_exist(file_path):
@@ -29,3 +32,37 @@ class DatabaseRepoUnitTest(unittest.TestCase):
 
         # Cleanup
         remove_file_if_exist(unit_test_db_path)
+
+
+class DatabaseRepoReadPoolUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.db_path = os.path.join(tempfile.gettempdir(), "unit_test_read_pool.db")
+        self.remove_db_files()
+        self.test_repo = DatabaseRepo(self.db_path)
+
+    def tearDown(self) -> None:
+        self.test_repo.read_db.close_all()
+        self.test_repo.db.close()
+        self.remove_db_files()
+
+    def remove_db_files(self):
+        for suffix in ("", "-wal", "-shm"):
+            remove_file_if_exist(self.db_path + suffix)
+
+    def test_wal_journal(self):
+        journal_mode = self.test_repo.db.execute_sql("PRAGMA journal_mode").fetchone()
+        self.assertEqual(journal_mode[0], "wal")
+
+    def test_pooled_reads_see_committed_rows(self):
+        WalletData.create(name="committed")
+        with self.test_repo.db.atomic():
+            WalletData.create(name="pending")
+            with pooled_reads():
+                names = [wallet_data.name for wallet_data in WalletData.select()]
+        self.assertEqual(names, ["committed"])
+        self.assertEqual(WalletData.select().count(), 2)
+
+    def test_pooled_reads_are_read_only(self):
+        with pooled_reads():
+            with self.assertRaises(OperationalError):
+                WalletData.create()
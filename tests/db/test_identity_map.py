@@ -0,0 +1,81 @@
+import unittest
+from typing import Optional
+
+from tests.helpers import ZPUB, QueryCounter
+from wkwallet.db.account_data import AccountData
+from wkwallet.db.address_data import AddressData
+from wkwallet.db.chain_data import ChainData
+from wkwallet.db.database_repo import DB_LOCATION_MEMORY, DatabaseRepo
+from wkwallet.db.identity_map import identity_map
+from wkwallet.db.tx_data import TxData
+from wkwallet.db.wallet_data import WalletData
+from wkwallet.model.script_type import ScriptType
+
+
+class IdentityMapUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_repo: Optional[DatabaseRepo] = DatabaseRepo(DB_LOCATION_MEMORY)
+        wallet_data = WalletData.create()
+        account_data = AccountData.create(
+            wallet=wallet_data, account_index=0, xpub=ZPUB
+        )
+        for chain_index in (0, 1):
+            ChainData.create(
+                account=account_data, chain_index=chain_index, script_type_name="WPKH"
+            )
+        for i in range(3):
+            AddressData.create(
+                wallet=wallet_data,
+                account=account_data,
+                address_str=f"addr{i}",
+                script_hash=f"{i}",
+                account_index=0,
+                chain_index=0,
+                address_index=i,
+                path=f"0/{i}",
+            )
+        TxData.create(wallet=wallet_data, tx_id="tx")
+
+    def tearDown(self) -> None:
+        self.test_repo = None
+
+    def test_foreign_keys_return_the_same_object(self):
+        with QueryCounter(self.test_repo.db) as counter:
+            addresses_data = list(AddressData.select())
+            account_data = addresses_data[0].account
+            wallet_data = account_data.wallet
+            for address_data in addresses_data:
+                self.assertIs(address_data.account, account_data)
+                self.assertIs(address_data.wallet, wallet_data)
+            self.assertIs(TxData.get().wallet, wallet_data)
+        # The addresses, the account, the wallet and the tx.
+        self.assertEqual(counter.statements.count("SELECT"), 4)
+
+    def test_registered_objects_are_returned(self):
+        wallet_data = identity_map().add(WalletData.get())
+        self.assertIs(identity_map().add(WalletData.get()), wallet_data)
+        self.assertIs(AccountData.get().wallet, wallet_data)
+
+        identity_map().remove(wallet_data)
+        self.assertIsNot(AccountData.get().wallet, wallet_data)
+
+    def test_cleared_with_the_database(self):
+        wallet_data = TxData.get().wallet
+        self.test_repo = DatabaseRepo(DB_LOCATION_MEMORY)
+        self.assertIsNone(identity_map().get(WalletData, wallet_data.id))
+
+    def test_account_is_parsed_on_first_use(self):
+        account_data = AccountData.get()
+        self.assertNotIn("master_pub_key", account_data.__dict__)
+        self.assertEqual(
+            account_data.addr_str(chain_index=0, addr_index=0),
+            "bc1quv97d3679z2t5z5y2ttafkru7d6y4063jpxkfx",
+        )
+
+        self.assertNotIn(2, account_data.chain_script_type)
+        account_data.wallet.has_fidelity_bonds = True
+        account_data.reset_chain_script_types()
+        self.assertEqual(
+            account_data.chain_script_type[2].script_type_name(),
+            ScriptType.WSH_FB.script_type_name(),
+        )
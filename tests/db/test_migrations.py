@@ -0,0 +1,161 @@
+import os
+import tempfile
+import unittest
+
+from peewee import SqliteDatabase
+from tests.db.test_tx_data import TX_HEX
+from tests.helpers import ZPUB, QueryCounter
+from wkwallet.db.account_data import AccountData
+from wkwallet.db.address_data import AddressData
+from wkwallet.db.database_repo import DatabaseRepo
+from wkwallet.db.migrations import SCHEMA_VERSION, add_columns, schema_version
+from wkwallet.db.raw_tx_data import RawTxData
+from wkwallet.db.raw_tx_store import raw_tx_store
+from wkwallet.db.tx_data import TxData
+from wkwallet.db.wallet_data import WalletData
+
+# The columns added since the first released version.
+NEW_COLUMNS = {
+    "addressdata": ["status_hash"],
+    "txdata": ["cj_value", "cj_count"],
+    "walletdata": ["history_backfill_height"],
+}
+
+
+def index_columns(db, table_name):
+    return {tuple(index.columns) for index in db.get_indexes(table_name)}
+
+
+def trigger_names(db):
+    return {
+        name
+        for (name,) in db.execute_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        ).fetchall()
+    }
+
+
+class MigrationsUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.db_path = os.path.join(tempfile.gettempdir(), "unit_test_migrations.db")
+        if os.path.isfile(self.db_path):
+            os.remove(self.db_path)
+
+    def tearDown(self) -> None:
+        if os.path.isfile(self.db_path):
+            os.remove(self.db_path)
+
+    def create_first_version_database(self):
+        """
+        Create a database with the schema of the first released version: no indexes,
+        no triggers, no new columns, the raw txs stored as hex.
+        """
+        test_repo = DatabaseRepo(self.db_path)
+        test_repo.db.close()
+
+        db = SqliteDatabase(self.db_path)
+        for (index_name,) in db.execute_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        ).fetchall():
+            db.execute_sql(f'DROP INDEX "{index_name}"')
+        for trigger_name in trigger_names(db):
+            db.execute_sql(f'DROP TRIGGER "{trigger_name}"')
+        db.execute_sql('DROP TABLE "rawtxdata"')
+        for table_name, column_names in NEW_COLUMNS.items():
+            for column_name in column_names:
+                db.execute_sql(
+                    f'ALTER TABLE "{table_name}" DROP COLUMN "{column_name}"'
+                )
+        db.execute_sql('ALTER TABLE "txdata" ADD COLUMN "hex" VARCHAR(255)')
+        db.execute_sql(
+            "INSERT INTO walletdata (name, has_fidelity_bonds, gap_limit, "
+            "completed_initial_sync, currency) VALUES ('', 0, 20, 0, 'sat')"
+        )
+        db.execute_sql(
+            "INSERT INTO txdata (wallet_id, height, tx_id, hex, balance_change, "
+            "is_processed, label) VALUES (1, 10, 'tx', ?, 0, 1, '')",
+            (TX_HEX,),
+        )
+        db.pragma("user_version", 0)
+        db.close()
+
+    def test_new_database_is_at_current_version(self):
+        test_repo = DatabaseRepo(self.db_path)
+        self.assertEqual(schema_version(test_repo.db), SCHEMA_VERSION)
+        self.assertIn(
+            ("wallet_id", "address_str"), index_columns(test_repo.db, "addressdata")
+        )
+        self.assertIn("txdata_insert_generation", trigger_names(test_repo.db))
+
+    def test_migrate_first_version_database(self):
+        self.create_first_version_database()
+
+        test_repo = DatabaseRepo(self.db_path)
+        db = test_repo.db
+        self.assertEqual(schema_version(db), SCHEMA_VERSION)
+        for table_name, column_names in NEW_COLUMNS.items():
+            existing_columns = {column.name for column in db.get_columns(table_name)}
+            self.assertTrue(set(column_names) <= existing_columns, table_name)
+        txdata_columns = {column.name for column in db.get_columns("txdata")}
+        self.assertFalse({"raw", "hex"} & txdata_columns)
+
+        tx_data = TxData.get(TxData.tx_id == "tx")
+        self.assertEqual(tx_data.raw, bytes.fromhex(TX_HEX))
+        # Decoded by the migration, reading it doesn't write it.
+        self.assertEqual(RawTxData.get(RawTxData.tx_id == "tx").vsize, 182)
+        with QueryCounter(db) as counter:
+            self.assertEqual(raw_tx_store().decoded_tx("tx").vsize, 182)
+        self.assertEqual(counter.statements, ["SELECT"])
+
+        self.assertLessEqual(
+            {
+                ("wallet_id", "address_str"),
+                ("wallet_id", "script_hash"),
+                ("wallet_id", "account_index", "chain_index", "address_index"),
+            },
+            index_columns(db, "addressdata"),
+        )
+        self.assertIn(("tx_id", "address_id"), index_columns(db, "utxodata"))
+        self.assertIn(
+            ("wallet_id", "is_processed", "height", "tx_id"),
+            index_columns(db, "txdata"),
+        )
+        self.assertEqual(len(trigger_names(db)), 6)
+        db.close()
+
+        # The migrations aren't applied again.
+        test_repo = DatabaseRepo(self.db_path)
+        self.assertEqual(schema_version(test_repo.db), SCHEMA_VERSION)
+        test_repo.db.close()
+
+    def test_add_columns_to_existing_table(self):
+        test_repo = DatabaseRepo(self.db_path)
+        db = test_repo.db
+        wallet_data = WalletData.create()
+        AddressData.insert(
+            wallet=wallet_data,
+            account=AccountData.create(wallet=wallet_data, account_index=0, xpub=ZPUB),
+            address_str="addr",
+            script_hash="script_hash",
+            account_index=0,
+            chain_index=0,
+            address_index=0,
+            path="0/0",
+        ).execute()
+        db.execute_sql('ALTER TABLE "addressdata" DROP COLUMN "status_hash"')
+
+        # The existing columns are skipped.
+        add_columns(db, AddressData.status_hash, AddressData.label)
+        self.assertIn(
+            "status_hash", {column.name for column in db.get_columns("addressdata")}
+        )
+        self.assertIsNone(AddressData.get().status_hash)
+        db.close()
+
+    def test_newer_database_is_rejected(self):
+        db = SqliteDatabase(self.db_path)
+        db.execute_sql("CREATE TABLE other (id INTEGER)")
+        db.pragma("user_version", SCHEMA_VERSION + 1)
+        db.close()
+        with self.assertRaises(ValueError):
+            DatabaseRepo(self.db_path)
@@ -0,0 +1,71 @@
+import unittest
+from typing import Optional
+
+from tests.db.test_tx_data import TX_HEX
+from tests.helpers import QueryCounter
+from wkwallet.db.database_repo import DB_LOCATION_MEMORY, DatabaseRepo
+from wkwallet.db.raw_tx_data import RawTxData
+from wkwallet.db.raw_tx_store import RawTxStore, raw_tx_store
+from wkwallet.db.tx_data import TxData
+from wkwallet.db.wallet_data import WalletData
+
+TX_ID = "tx"
+
+
+class RawTxStoreUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_repo: Optional[DatabaseRepo] = DatabaseRepo(DB_LOCATION_MEMORY)
+        self.wallets_data = [WalletData.create() for _ in range(3)]
+        for wallet_data in self.wallets_data:
+            TxData.create(wallet=wallet_data, tx_id=TX_ID)
+
+    def tearDown(self) -> None:
+        self.test_repo = None
+
+    def test_tx_of_several_wallets_is_stored_once(self):
+        decoded_tx = raw_tx_store().add(TX_ID, bytes.fromhex(TX_HEX))
+        self.assertIs(raw_tx_store().add(TX_ID, bytes.fromhex(TX_HEX)), decoded_tx)
+        self.assertEqual(RawTxData.select().count(), 1)
+
+        with QueryCounter(self.test_repo.db) as counter:
+            for tx_data in TxData.select():
+                self.assertIs(tx_data.decoded_tx, decoded_tx)
+        # The txs only, the decoded tx is shared.
+        self.assertEqual(counter.statements.count("SELECT"), 1)
+        self.assertEqual(TxData.get().raw, bytes.fromhex(TX_HEX))
+        self.assertEqual(TxData.get().tx_object.id(), TxData.get().tx_object.id())
+
+    def test_decoded_tx_is_loaded_from_the_store(self):
+        raw_tx_store().add(TX_ID, bytes.fromhex(TX_HEX))
+        TxData.get().set_fee(500)
+
+        store = RawTxStore()
+        decoded_tx = store.decoded_tx(TX_ID)
+        self.assertEqual(decoded_tx.total_out(), 3000)
+        self.assertEqual(
+            (decoded_tx.vsize, decoded_tx.size, decoded_tx.fee), (182, 264, 500)
+        )
+        self.assertIsNone(store.decoded_tx("other"))
+
+    def test_least_recently_used_are_evicted(self):
+        store = RawTxStore(max_decoded_txs=2)
+        for tx_id in ("a", "b"):
+            store.add(tx_id, bytes.fromhex(TX_HEX))
+        store.decoded_tx("a")
+        store.add("c", bytes.fromhex(TX_HEX))
+
+        with QueryCounter(self.test_repo.db) as counter:
+            store.decoded_tx("a")
+            store.decoded_tx("c")
+        self.assertEqual(counter.statements, [])
+        with QueryCounter(self.test_repo.db) as counter:
+            store.decoded_tx("b")
+        self.assertEqual(counter.statements, ["SELECT"])
+
+    def test_delete_unreferenced(self):
+        for tx_id in (TX_ID, "other"):
+            raw_tx_store().add(tx_id, bytes.fromhex(TX_HEX))
+        raw_tx_store().delete_unreferenced(TxData.select(TxData.tx_id))
+        self.assertEqual(
+            [raw_tx_data.tx_id for raw_tx_data in RawTxData.select()], [TX_ID]
+        )
@@ -0,0 +1,55 @@
+import unittest
+from typing import Optional
+
+from pycoin.symbols.btc import network as BTC
+from wkwallet.db.database_repo import DB_LOCATION_MEMORY, DatabaseRepo
+from wkwallet.db.decoded_tx_data import DecodedTx
+
+# A segwit tx with 2 inputs and 2 outputs.
+TX_HEX = (
+    "02000000000102000102030405060708090a0b0c0d0e0f101112131415161718191a1b1c1d1e1f01"
+    "00000000fdffffff0102030405060708090a0b0c0d0e0f101112131415161718191a1b1c1d1e1f20"
+    "0000000000ffffffff02e80300000000000016001411111111111111111111111111111111111111"
+    "11d00700000000000016001422222222222222222222222222222222222222220247303030303030"
+    "30303030303030303030303030303030303030303030303030303030303030303030303030303030"
+    "30303030303030303030303030303030303030303030303030210202020202020202020202020202"
+    "020202020202020202020202020202020202020000000000"
+)
+
+
+class TxDataUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_repo: Optional[DatabaseRepo] = DatabaseRepo(DB_LOCATION_MEMORY)
+        self.wallet_data = self.test_repo.add_wallet()
+        self.test_repo.commit()
+        self.tx = BTC.tx.from_hex(TX_HEX)
+
+    def tearDown(self) -> None:
+        self.test_repo = None
+
+    def test_decoded_tx(self):
+        decoded_tx = DecodedTx.from_tx(self.tx)
+        self.assertEqual(
+            [
+                (tx_in.previous_hash, tx_in.previous_index)
+                for tx_in in decoded_tx.txs_in
+            ],
+            [
+                (str(tx_in.previous_hash), tx_in.previous_index)
+                for tx_in in self.tx.txs_in
+            ],
+        )
+        self.assertEqual(
+            [
+                (tx_out.coin_value, tx_out.puzzle_script())
+                for tx_out in decoded_tx.txs_out
+            ],
+            [(tx_out.coin_value, tx_out.puzzle_script()) for tx_out in self.tx.txs_out],
+        )
+        # 154 bytes without the witness, 264 with it: a weight of 726.
+        self.assertEqual((decoded_tx.size, decoded_tx.vsize), (264, 182))
+
+        unpacked = DecodedTx.unpack(*decoded_tx.pack(), decoded_tx.vsize, 500, 264)
+        self.assertEqual(unpacked.txs_in, decoded_tx.txs_in)
+        self.assertEqual(unpacked.txs_out, decoded_tx.txs_out)
+        self.assertEqual((unpacked.vsize, unpacked.fee, unpacked.size), (182, 500, 264))
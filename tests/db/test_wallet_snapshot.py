@@ -0,0 +1,156 @@
+import datetime
+import json
+import unittest
+import zlib
+from typing import Optional
+
+from tests.helpers import ZPUB, QueryCounter
+from wkwallet.db.account_data import AccountData
+from wkwallet.db.address_data import AddressData
+from wkwallet.db.database_repo import DB_LOCATION_MEMORY, DatabaseRepo
+from wkwallet.db.identity_map import identity_map
+from wkwallet.db.tx_data import TxData
+from wkwallet.db.wallet_data import WalletData
+from wkwallet.db.wallet_snapshot import (
+    SNAPSHOT_VERSION,
+    WalletGenerationData,
+    WalletSnapshotData,
+    load_snapshot_tx_heights,
+    load_wallet_snapshot,
+    save_wallet_snapshot,
+    wallet_generation,
+)
+
+TIMESTAMP = datetime.datetime(2024, 5, 1, 12, 30)
+
+
+class WalletSnapshotUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_repo: Optional[DatabaseRepo] = DatabaseRepo(DB_LOCATION_MEMORY)
+        self.wallet_data = identity_map().add(WalletData.create())
+        self.other_wallet_data = WalletData.create()
+        account_data = AccountData.create(
+            wallet=self.wallet_data, account_index=0, xpub=ZPUB
+        )
+        for i in range(3):
+            AddressData.create(
+                wallet=self.wallet_data,
+                account=account_data,
+                address_str=f"addr{i}",
+                script_hash=f"{i}",
+                account_index=0,
+                chain_index=0,
+                address_index=i,
+                path=f"0/{i}",
+                is_active=i == 0,
+                confirmed_balance=1000 * i,
+                update_time=TIMESTAMP,
+            )
+        TxData.create(wallet=self.wallet_data, tx_id="pending")
+        TxData.create(
+            wallet=self.wallet_data,
+            tx_id="confirmed",
+            height=800000,
+            timestamp=TIMESTAMP,
+            is_processed=True,
+            balance_change=-500,
+        )
+        TxData.create(wallet=self.other_wallet_data, tx_id="other")
+
+    def tearDown(self) -> None:
+        self.test_repo = None
+
+    def save_snapshot(self):
+        save_wallet_snapshot(
+            self.wallet_data,
+            AddressData.select().order_by(AddressData.address_index),
+            TxData.select()
+            .where(TxData.wallet == self.wallet_data)
+            .order_by(TxData.height),
+        )
+
+    def test_snapshot_is_loaded_in_one_query(self):
+        self.save_snapshot()
+
+        with QueryCounter(self.test_repo.db) as counter:
+            snapshot = load_wallet_snapshot(self.wallet_data)
+        self.assertEqual(counter.statements, ["SELECT"])
+
+        self.assertEqual(
+            [
+                (a.address_str, a.is_active, a.total_balance, a.update_time)
+                for a in snapshot.addresses
+            ],
+            [
+                ("addr0", True, 0, TIMESTAMP),
+                ("addr1", False, 1000, TIMESTAMP),
+                ("addr2", False, 2000, TIMESTAMP),
+            ],
+        )
+        self.assertIs(snapshot.addresses[0].wallet, self.wallet_data)
+        tx_data = snapshot.recent_txs[1]
+        self.assertEqual(
+            (tx_data.tx_id, tx_data.timestamp, tx_data.balance_change),
+            ("confirmed", TIMESTAMP, -500),
+        )
+        self.assertEqual(tx_data.id, TxData.get(TxData.tx_id == "confirmed").id)
+
+        # The objects are loaded like the rows of a select.
+        tx_data.label = "label"
+        self.assertEqual(tx_data.save(), 1)
+        self.assertEqual(TxData.select().count(), 3)
+
+    def test_tx_heights_are_loaded_separately(self):
+        self.save_snapshot()
+        generation = load_wallet_snapshot(self.wallet_data).generation
+        self.assertEqual(
+            sorted(load_snapshot_tx_heights(self.wallet_data, generation)),
+            [("confirmed", 800000, True), ("pending", 0, False)],
+        )
+
+        TxData.create(wallet=self.wallet_data, tx_id="new")
+        self.assertIsNone(load_snapshot_tx_heights(self.wallet_data, generation))
+
+    def test_writes_to_the_wallet_invalidate_its_snapshot(self):
+        for write in (
+            lambda: AddressData.update(label="label")
+            .where(AddressData.address_str == "addr1")
+            .execute(),
+            lambda: TxData.create(wallet=self.wallet_data, tx_id="new"),
+            lambda: TxData.delete().where(TxData.tx_id == "new").execute(),
+        ):
+            self.save_snapshot()
+            generation = wallet_generation(self.wallet_data)
+            write()
+            self.assertEqual(wallet_generation(self.wallet_data), generation + 1)
+            self.assertIsNone(load_wallet_snapshot(self.wallet_data))
+
+        self.save_snapshot()
+        TxData.update(label="label").where(TxData.tx_id == "other").execute()
+        self.assertIsNotNone(load_wallet_snapshot(self.wallet_data))
+
+    def test_snapshot_of_another_format_is_ignored(self):
+        self.save_snapshot()
+        WalletSnapshotData.update(version=SNAPSHOT_VERSION + 1).execute()
+        self.assertIsNone(load_wallet_snapshot(self.wallet_data))
+
+        self.save_snapshot()
+        snapshot_data = WalletSnapshotData.get()
+        data = json.loads(zlib.decompress(snapshot_data.data))
+        data["addresses"]["columns"].remove("status_hash")
+        WalletSnapshotData.update(
+            data=zlib.compress(json.dumps(data).encode())
+        ).execute()
+        self.assertIsNone(load_wallet_snapshot(self.wallet_data))
+
+    def test_unsupported_values_are_rejected(self):
+        address_data = AddressData.get()
+        address_data.confirmed_balance = b"1000"
+        with self.assertRaises(TypeError):
+            save_wallet_snapshot(self.wallet_data, [address_data], [])
+
+    def test_snapshot_is_deleted_with_the_wallet(self):
+        self.save_snapshot()
+        self.wallet_data.delete_instance(recursive=True)
+        self.assertEqual(WalletSnapshotData.select().count(), 0)
+        self.assertEqual(WalletGenerationData.select().count(), 0)
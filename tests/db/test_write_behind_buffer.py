@@ -0,0 +1,149 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from typing import Optional
+
+from tests.helpers import ZPUB, QueryCounter
+from wkwallet.db.account_data import AccountData
+from wkwallet.db.database_repo import DB_LOCATION_MEMORY, DatabaseRepo
+from wkwallet.db.wallet_data import WalletData
+from wkwallet.db.write_behind_buffer import WriteBehindBuffer
+
+
+class WriteBehindBufferUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_repo: Optional[DatabaseRepo] = DatabaseRepo(DB_LOCATION_MEMORY)
+        self.buffer = self.test_repo.write_behind_buffer
+
+    def tearDown(self) -> None:
+        self.test_repo = None
+
+    def test_saves_are_deduplicated_and_batched(self):
+        wallets_data = [WalletData(name=str(i)) for i in range(250)]
+        for _ in range(3):
+            for wallet_data in wallets_data:
+                self.buffer.save(wallet_data)
+        self.assertEqual(self.buffer.pending_count, 250)
+
+        with QueryCounter(self.test_repo.db) as counter:
+            self.buffer.flush()
+        self.assertEqual(counter.statements.count("INSERT"), 3)
+        self.assertEqual(self.buffer.pending_count, 0)
+        self.assertEqual(
+            [(wallet_data.id, wallet_data.name) for wallet_data in wallets_data],
+            list(WalletData.select(WalletData.id, WalletData.name).tuples()),
+        )
+
+    def test_ids_follow_the_largest_id(self):
+        WalletData.create(id=10, name="10")
+        WalletData.create(id=5, name="5")
+        wallets_data = [WalletData(name=str(i)) for i in (11, 12)]
+        for wallet_data in wallets_data:
+            self.buffer.save(wallet_data)
+        self.buffer.flush()
+
+        self.assertEqual([wallet_data.id for wallet_data in wallets_data], [11, 12])
+        self.assertEqual(
+            list(WalletData.select(WalletData.id, WalletData.name).tuples()),
+            [(5, "5"), (10, "10"), (11, "11"), (12, "12")],
+        )
+
+    def test_referenced_rows_are_inserted_first(self):
+        wallet_data = WalletData()
+        account_data = AccountData(wallet=wallet_data, account_index=0, xpub=ZPUB)
+        self.buffer.save(account_data)
+        self.buffer.save(wallet_data)
+        self.buffer.flush()
+
+        self.assertEqual(
+            AccountData.get_by_id(account_data.id).wallet.id, wallet_data.id
+        )
+
+    def test_only_dirty_fields_are_updated(self):
+        wallets_data = [WalletData.create(name=str(i)) for i in range(3)]
+        for wallet_data in wallets_data:
+            wallet_data.gap_limit = 30
+            self.buffer.save(wallet_data)
+        # Changed meanwhile, and not saved again.
+        WalletData.update(name="renamed").execute()
+
+        with QueryCounter(self.test_repo.db) as counter:
+            self.buffer.flush()
+        self.assertEqual(counter.statements.count("UPDATE"), 1)
+        self.assertEqual(
+            set(WalletData.select(WalletData.name, WalletData.gap_limit).tuples()),
+            {("renamed", 30)},
+        )
+
+        # Nothing changed since the flush.
+        self.buffer.save(wallets_data[0])
+        with QueryCounter(self.test_repo.db) as counter:
+            self.buffer.flush()
+        self.assertNotIn("UPDATE", counter.statements)
+
+    def test_delete(self):
+        wallet_data = WalletData.create()
+        AccountData.create(wallet=wallet_data, account_index=0, xpub=ZPUB)
+        self.buffer.save(wallet_data)
+        self.buffer.delete(wallet_data)
+        self.buffer.flush()
+
+        self.assertEqual(WalletData.select().count(), 0)
+        self.assertEqual(AccountData.select().count(), 0)
+
+    def test_failed_batch_is_saved_one_by_one(self):
+        saved_wallet_data = WalletData()
+        invalid_account_data = AccountData(wallet=saved_wallet_data, xpub=ZPUB)
+        self.buffer.save(saved_wallet_data)
+        self.buffer.save(invalid_account_data)
+        self.buffer.flush()
+
+        self.assertEqual(list(WalletData.select()), [saved_wallet_data])
+        self.assertIsNone(invalid_account_data.id)
+
+    def test_submitted_write_runs_after_the_pending_saves(self):
+        wallet_data = WalletData()
+        self.buffer.save(wallet_data)
+        future = self.buffer.submit(lambda: WalletData.get_by_id(wallet_data.id).id)
+        self.assertEqual(future.result(0), wallet_data.id)
+        self.assertEqual(self.buffer.pending_count, 0)
+
+    def test_submitted_write_failure_is_set_on_its_future(self):
+        future = self.buffer.submit(lambda: AccountData.create(xpub=ZPUB))
+        self.assertIsNotNone(future.exception(0))
+        self.assertEqual(AccountData.select().count(), 0)
+
+
+class WriteBehindBufferThreadUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.db_path = os.path.join(tempfile.gettempdir(), "unit_test_write_behind.db")
+        if os.path.isfile(self.db_path):
+            os.remove(self.db_path)
+        self.test_repo: Optional[DatabaseRepo] = DatabaseRepo(self.db_path)
+
+    def tearDown(self) -> None:
+        self.test_repo.db.close()
+        self.test_repo = None
+        os.remove(self.db_path)
+
+    def test_flushed_after_interval(self):
+        buffer = WriteBehindBuffer(self.test_repo.db, flush_interval=0.05)
+        buffer.save(WalletData())
+        deadline = time.monotonic() + 5
+        while buffer.pending_count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        buffer.close()
+        self.assertEqual(WalletData.select().count(), 1)
+
+    def test_submitted_write_runs_on_the_thread(self):
+        buffer = WriteBehindBuffer(self.test_repo.db, flush_interval=60)
+        buffer.save(WalletData())
+        future = buffer.submit(
+            lambda: (threading.current_thread().name, WalletData.select().count())
+        )
+        thread_name, count = future.result(5)
+        buffer.close()
+        self.assertNotEqual(thread_name, threading.current_thread().name)
+        self.assertEqual(count, 1)
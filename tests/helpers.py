@@ -0,0 +1,29 @@
+from peewee import SqliteDatabase
+
+ZPUB = "zpub6qSqRUnhGDST2CweecVFEEfzHHFHPiKLqKg9iTtXsAk1AF7PyH75wgEGyxBRYicMhiBhpZPWR1fEShbnRhBbu8kiHrbZiv8n5qUQbd5T7km"
+
+
+class QueryCounter:
+    """
+    Record the statements executed on the database, and their first keyword, e.g.
+    "SELECT".
+    """
+
+    def __init__(self, db: SqliteDatabase) -> None:
+        self.statements = []
+        self.sql = []
+        self._db = db
+
+    def __enter__(self):
+        self._execute_sql = self._db.execute_sql
+
+        def execute_sql(sql, *args, **kwargs):
+            self.statements.append(sql.split(" ")[0])
+            self.sql.append(sql)
+            return self._execute_sql(sql, *args, **kwargs)
+
+        self._db.execute_sql = execute_sql
+        return self
+
+    def __exit__(self, *args):
+        del self._db.execute_sql
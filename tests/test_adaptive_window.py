@@ -0,0 +1,64 @@
+import unittest
+
+from wkwallet.model.adaptive_window import AdaptiveRequestWindow
+
+
+class AdaptiveRequestWindowUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.window = AdaptiveRequestWindow(
+            initial_batch_size=40,
+            min_batch_size=5,
+            max_batch_size=150,
+            batch_size_step=10,
+            initial_in_flight=4,
+            max_in_flight_limit=8,
+            target_rtt=1.0,
+        )
+
+    def test_slow_start_on_fast_server(self):
+        self.window.on_success(0.1)
+        self.assertEqual((self.window.batch_size, self.window.max_in_flight), (80, 5))
+        self.window.on_success(0.1)
+        self.assertEqual((self.window.batch_size, self.window.max_in_flight), (150, 6))
+
+        # Additive increase once slow start has reached the max batch size.
+        for _ in range(6):
+            self.window.on_success(0.1)
+        self.assertEqual((self.window.batch_size, self.window.max_in_flight), (150, 7))
+
+    def test_additive_increase_after_slow_batch(self):
+        self.window.on_success(1.5)
+        self.assertEqual(self.window.batch_size, 40)
+        self.window.on_success(0.5)
+        self.assertEqual(self.window.batch_size, 50)
+
+    def test_decrease_on_slow_batches(self):
+        self.window.on_success(3.0)
+        self.assertEqual(self.window.batch_size, 30)
+        self.assertEqual(self.window.max_in_flight, 4)
+
+    def test_halve_on_errors(self):
+        self.window.on_error(TimeoutError())
+        self.assertEqual((self.window.batch_size, self.window.max_in_flight), (20, 2))
+        for _ in range(5):
+            self.window.on_error()
+        self.assertEqual((self.window.batch_size, self.window.max_in_flight), (5, 1))
+        self.assertEqual(self.window.stats()["error_count"], 6)
+
+    def test_in_flight_capacity(self):
+        for _ in range(4):
+            self.assertTrue(self.window.has_capacity())
+            self.window.acquire()
+        self.assertFalse(self.window.has_capacity())
+        self.window.release()
+        self.assertTrue(self.window.has_capacity())
+
+    def test_history_and_reset(self):
+        self.window.on_success(0.1)
+        self.window.on_error()
+        self.window.reset()
+
+        reasons = [change.reason for change in self.window.stats()["history"]]
+        self.assertEqual(reasons, ["reset", "slow start", "error", "reset"])
+        self.assertEqual((self.window.batch_size, self.window.max_in_flight), (40, 4))
+        self.assertIsNone(self.window.smoothed_rtt)
@@ -0,0 +1,62 @@
+import unittest
+
+from pycoin.symbols.btc import network as BTC
+from wkwallet.model.address_deriver import AddressDeriver
+from wkwallet.model.crypt_utils import script_to_ES_hash
+from wkwallet.model.script_type import ScriptType
+
+YPUB = "ypub6YJU6EV45fu1DQLQ5YW2ZZCgdJEgU9YVS1Ko2fkokb1oaZLhUw7JpZ7Wz48voFZ9YLSKEukvEUMyGdn4HY3dyS7dYPuYHYTSuENMUoHmrsH"
+ZPUB = "zpub6qSqRUnhGDST2CweecVFEEfzHHFHPiKLqKg9iTtXsAk1AF7PyH75wgEGyxBRYicMhiBhpZPWR1fEShbnRhBbu8kiHrbZiv8n5qUQbd5T7km"
+
+
+class AddressDeriverUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.master_key = BTC.parse(ZPUB)
+        self.deriver = AddressDeriver(
+            self.master_key,
+            {0: ScriptType.WPKH, 1: ScriptType.WPKH, 2: ScriptType.WSH_FB},
+        )
+
+    def test_derive(self):
+        derived_address = self.deriver.derive(0, 0)
+        self.assertEqual(
+            derived_address.address_str, "bc1quv97d3679z2t5z5y2ttafkru7d6y4063jpxkfx"
+        )
+        self.assertEqual(
+            derived_address.script_hash, script_to_ES_hash(derived_address.script)
+        )
+        self.assertIsNone(self.deriver.derive(3, 0))
+
+    def test_derive_range_matches_per_path_derivation(self):
+        for chain_index in (0, 1, 2):
+            script_type = self.deriver._chain_script_types[chain_index]
+            derived_addresses = self.deriver.derive_range(chain_index, 5, 15)
+            self.assertEqual(
+                [derived.address_index for derived in derived_addresses],
+                list(range(5, 15)),
+            )
+            for derived in derived_addresses:
+                script_object = script_type(
+                    self.master_key.subkey_for_path(
+                        f"{chain_index}/{derived.address_index}"
+                    ),
+                    derived.address_index,
+                )
+                self.assertEqual(derived.address_str, script_object.address())
+                self.assertEqual(derived.script, script_object.script())
+                self.assertEqual(derived.script_hash, script_object.ES_hash())
+
+    def test_sh_wpkh(self):
+        deriver = AddressDeriver(BTC.parse(YPUB), {0: ScriptType.SH_WPKH})
+        derived_address = deriver.derive(0, 0)
+        self.assertEqual(
+            derived_address.address_str, "3JAKVZztstukAHcs35qhiktrsxAMFxfLXP"
+        )
+        self.assertEqual(
+            BTC.address.for_script(derived_address.script),
+            derived_address.address_str,
+        )
+
+    def test_invalid_chain(self):
+        with self.assertRaises(ValueError):
+            self.deriver.derive_range(3, 0, 10)
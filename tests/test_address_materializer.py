@@ -0,0 +1,96 @@
+import unittest
+from typing import Optional
+
+from db.account_data import AccountData
+from db.address_data import AddressData
+from db.chain_data import ChainData
+from db.database_repo import DB_LOCATION_MEMORY, DatabaseRepo
+from db.wallet_data import WalletData
+from model.address_deriver import DerivedAddress
+from model.address_materializer import (
+    MAX_RANGES_PER_QUERY,
+    materialize_addresses,
+    select_address_ranges,
+)
+from model.wallet_account import WalletAccount
+from tests.helpers import ZPUB, QueryCounter
+
+
+class AddressMaterializerUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_repo: Optional[DatabaseRepo] = DatabaseRepo(DB_LOCATION_MEMORY)
+        self.wallet_data = WalletData.create()
+        account_data = AccountData.create(
+            wallet=self.wallet_data, account_index=0, xpub=ZPUB
+        )
+        for chain_index in (0, 1):
+            ChainData.create(
+                account=account_data, chain_index=chain_index, script_type_name="WPKH"
+            )
+        self.accounts = {0: WalletAccount(account_data)}
+
+    def tearDown(self) -> None:
+        self.test_repo = None
+
+    def materialize(self, address_index_tuples, derived_addresses=None):
+        return materialize_addresses(
+            self.wallet_data, self.accounts, address_index_tuples, derived_addresses
+        )
+
+    def test_missing_addresses_are_inserted_in_one_statement(self):
+        existing = self.materialize([(0, 0, i) for i in range(10)])
+        address_index_tuples = [(0, 0, i) for i in range(60)] + [
+            (0, 1, i) for i in range(30)
+        ]
+
+        with QueryCounter(self.test_repo.db) as counter:
+            tuple_to_data = self.materialize(address_index_tuples)
+        # The rows of the ranges, and the largest id of the inserted rows.
+        self.assertEqual(counter.statements.count("SELECT"), 2)
+        self.assertEqual(counter.statements.count("INSERT"), 1)
+
+        self.assertEqual(set(tuple_to_data), set(address_index_tuples))
+        self.assertEqual(
+            [tuple_to_data[(0, 0, i)].id for i in range(10)],
+            [existing[(0, 0, i)].id for i in range(10)],
+        )
+        self.assertEqual(AddressData.select().count(), 90)
+        address_data = AddressData.get_by_id(tuple_to_data[(0, 1, 0)].id)
+        self.assertEqual(address_data.address_str, tuple_to_data[(0, 1, 0)].address_str)
+        self.assertEqual(
+            tuple_to_data[(0, 0, 0)].address_str,
+            "bc1quv97d3679z2t5z5y2ttafkru7d6y4063jpxkfx",
+        )
+        self.assertEqual(tuple_to_data[(0, 1, 5)].path, "1/5")
+
+    def test_derived_addresses_are_used(self):
+        derived_addresses = {
+            (0, 0, 3): DerivedAddress(3, "derived", b"", "derived_script_hash")
+        }
+        tuple_to_data = self.materialize([(0, 0, 3), (0, 0, 4)], derived_addresses)
+        self.assertEqual(tuple_to_data[(0, 0, 3)].address_str, "derived")
+        self.assertEqual(derived_addresses, {})
+
+    def test_derived_addresses_of_existing_rows_are_dropped(self):
+        self.materialize([(0, 0, i) for i in range(3)])
+        derived_addresses = {
+            (0, 0, i): DerivedAddress(i, "derived", b"", "derived_script_hash")
+            for i in (1, 5)
+        }
+        tuple_to_data = self.materialize([(0, 0, 1)], derived_addresses)
+        self.assertNotEqual(tuple_to_data[(0, 0, 1)].address_str, "derived")
+        self.assertEqual(list(derived_addresses), [(0, 0, 5)])
+
+    def test_ranges_are_selected_by_batches(self):
+        address_index_tuples = [(0, 0, 2 * i) for i in range(MAX_RANGES_PER_QUERY + 1)]
+        self.materialize(address_index_tuples)
+
+        with QueryCounter(self.test_repo.db) as counter:
+            addresses_data = list(
+                select_address_ranges(self.wallet_data, address_index_tuples)
+            )
+        self.assertEqual(counter.statements.count("SELECT"), 2)
+        self.assertEqual(
+            sorted(address_data.indexes_tuple() for address_data in addresses_data),
+            address_index_tuples,
+        )
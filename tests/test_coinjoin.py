@@ -0,0 +1,120 @@
+import random
+import unittest
+from types import SimpleNamespace
+
+from wkwallet.model.coinjoin import AnonSetCalculator, equal_output_value_and_count
+
+
+def quadratic_cj_value_and_count(output_values):
+    # The previous implementation of Wallet.get_cj_value_and_count.
+    cj_value, cj_count = None, 1
+    for value_i in output_values:
+        count = 0
+        for value_j in output_values:
+            if value_j == value_i:
+                count += 1
+        if count > cj_count:
+            cj_value, cj_count = value_i, count
+    return cj_value, cj_count
+
+
+class FakeTxOut:
+    def __init__(self, coin_value, script):
+        self.coin_value = coin_value
+        self.script = script
+
+    def puzzle_script(self):
+        return self.script
+
+
+def fake_tx(tx_id, inputs, outputs):
+    """
+    inputs: [(pre_tx_id, pre_index)], outputs: [(coin_value, script)]
+    """
+    txs_in = [
+        SimpleNamespace(previous_hash=pre_tx_id, previous_index=pre_index)
+        for pre_tx_id, pre_index in inputs
+    ]
+    txs_out = [FakeTxOut(coin_value, script) for coin_value, script in outputs]
+    return SimpleNamespace(
+        tx_id=tx_id,
+        decoded_tx=SimpleNamespace(txs_in=txs_in, txs_out=txs_out),
+        cj_value=None,
+        cj_count=None,
+    )
+
+
+class EqualOutputValueUnitTest(unittest.TestCase):
+    def test_matches_quadratic_implementation(self):
+        rng = random.Random(0)
+        for _ in range(200):
+            output_values = [
+                rng.choice((1, 2, 3, 5, 8)) for _ in range(rng.randint(0, 12))
+            ]
+            self.assertEqual(
+                equal_output_value_and_count(output_values),
+                quadratic_cj_value_and_count(output_values),
+            )
+
+    def test_tie_keeps_first_output(self):
+        self.assertEqual(equal_output_value_and_count([7, 3, 3, 7]), (7, 2))
+        self.assertEqual(equal_output_value_and_count([7, 3]), (None, 1))
+
+
+class AnonSetCalculatorUnitTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.txs = {}
+        self.fetches = []
+        self.calculator = AnonSetCalculator(
+            get_tx=self.get_tx,
+            contains_tx=lambda tx_id: tx_id in self.txs,
+            owns_script=lambda script: script.startswith(b"mine"),
+        )
+
+    async def get_tx(self, tx_id):
+        self.fetches.append(tx_id)
+        return self.txs[tx_id]
+
+    def add_coinjoin(self, tx_id, inputs, counterparties, value=100):
+        # The wallet owns the first output of each coinjoin.
+        outputs = [(value, b"mine" + tx_id.encode())] + [
+            (value, b"other%d" % i) for i in range(counterparties)
+        ]
+        self.txs[tx_id] = fake_tx(tx_id, inputs, outputs)
+
+    async def test_chain_of_coinjoins(self):
+        self.add_coinjoin("a", [], 4)
+        self.add_coinjoin("b", [("a", 0)], 2)
+        self.add_coinjoin("c", [("b", 0), ("foreign", 0)], 3)
+        # b adds 2 counterparties, a adds 4.
+        self.assertEqual(
+            await self.calculator.ancestors_anon_set_count(self.txs["c"], 100), 6
+        )
+        # Smaller outputs of the ancestors don't count.
+        self.assertEqual(
+            await self.calculator.ancestors_anon_set_count(self.txs["c"], 101), 0
+        )
+
+    async def test_each_edge_is_walked_once(self):
+        # A ladder of coinjoins each spending two outputs of the previous one: the
+        # number of paths doubles at each level.
+        depth = 12
+        self.txs["0"] = fake_tx(
+            "0", [], [(100, b"mine0-0"), (100, b"mine0-1"), (100, b"other")]
+        )
+        for level in range(1, depth + 1):
+            tx_id, pre_tx_id = str(level), str(level - 1)
+            self.txs[tx_id] = fake_tx(
+                tx_id,
+                [(pre_tx_id, 0), (pre_tx_id, 1)],
+                [(100, b"mine%d-0" % level), (100, b"mine%d-1" % level), (100, b"x")],
+            )
+
+        count = await self.calculator.ancestors_anon_set_count(
+            self.txs[str(depth)], 100
+        )
+        # Each path adds 2 counterparties per level, and there are 2^k paths to level
+        # depth - k.
+        self.assertEqual(count, sum(2 * 2**k for k in range(1, depth + 1)))
+        self.assertEqual(len(self.fetches), 2 * depth)
+        self.assertEqual((self.txs["0"].cj_value, self.txs["0"].cj_count), (100, 3))
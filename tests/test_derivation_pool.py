@@ -0,0 +1,43 @@
+import unittest
+
+from pycoin.symbols.btc import network as BTC
+from wkwallet.model.address_deriver import AddressDeriver
+from wkwallet.model.derivation_pool import DerivationPool, address_index_ranges
+from wkwallet.model.script_type import ScriptType
+
+ZPUB = "zpub6qSqRUnhGDST2CweecVFEEfzHHFHPiKLqKg9iTtXsAk1AF7PyH75wgEGyxBRYicMhiBhpZPWR1fEShbnRhBbu8kiHrbZiv8n5qUQbd5T7km"
+
+
+class AddressIndexRangesUnitTest(unittest.TestCase):
+    def test_ranges(self):
+        address_index_tuples = [(0, 1, 4), (0, 0, 1), (0, 0, 0), (0, 1, 2), (0, 1, 3)]
+        self.assertEqual(
+            address_index_ranges(address_index_tuples),
+            [(0, 0, 0, 2), (0, 1, 2, 5)],
+        )
+        self.assertEqual(
+            address_index_ranges(address_index_tuples, max_length=2),
+            [(0, 0, 0, 2), (0, 1, 2, 4), (0, 1, 4, 5)],
+        )
+
+
+class DerivationPoolUnitTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.deriver = AddressDeriver(
+            BTC.parse(ZPUB), {1: ScriptType.WPKH, 2: ScriptType.WSH_FB}
+        )
+
+    async def check_pool(self, pool):
+        try:
+            for chain_index in (1, 2):
+                self.assertEqual(
+                    await pool.derive_range(self.deriver, chain_index, 10, 30),
+                    self.deriver.derive_range(chain_index, 10, 30),
+                )
+            with self.assertRaises(ValueError):
+                await pool.derive_range(self.deriver, 0, 0, 10)
+        finally:
+            pool.shutdown()
+
+    async def test_threads(self):
+        await self.check_pool(DerivationPool(max_workers=2))
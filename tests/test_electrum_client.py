@@ -0,0 +1,247 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from wkwallet.electrum_client import (
+    CACHE_TTLS,
+    GET_HEADER_RPC,
+    RPC_CACHE_MAX_SIZE,
+    BatchedRPC,
+    ElectrumClient,
+    ElectrumErrorResponse,
+    RPCCache,
+)
+
+METHOD = "blockchain.transaction.get"
+
+
+class FakeBatchClient:
+    """
+    Answers the batches with "result <param>", or an error for the "missing" param.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.error = None
+
+    async def batch_rpc(self, requests, return_exceptions=False):
+        self.batches.append([params for _, *params in requests])
+        if self.error is not None:
+            raise self.error
+        results = [
+            ElectrumErrorResponse("missing")
+            if param == "missing"
+            else f"result {param}"
+            for _, param in requests
+        ]
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, ElectrumErrorResponse):
+                    raise result
+        return results
+
+
+class BatchedRPCUnitTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.client = FakeBatchClient()
+
+    async def test_calls_are_sent_after_the_window(self):
+        batched_rpc = BatchedRPC(self.client, METHOD, window=0.01, max_batch_size=10)
+        tasks = [asyncio.ensure_future(batched_rpc.call(str(i))) for i in range(3)]
+        await asyncio.sleep(0)
+        self.assertEqual(self.client.batches, [])
+
+        self.assertEqual(
+            await asyncio.gather(*tasks), ["result 0", "result 1", "result 2"]
+        )
+        self.assertEqual(self.client.batches, [[["0"], ["1"], ["2"]]])
+
+    async def test_full_batch_is_sent_at_once(self):
+        batched_rpc = BatchedRPC(self.client, METHOD, window=60, max_batch_size=3)
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batched_rpc.call(str(i)) for i in range(3))), 1
+        )
+        self.assertEqual(results, ["result 0", "result 1", "result 2"])
+        self.assertEqual(len(self.client.batches), 1)
+
+    async def test_calls_are_sent_in_chunks(self):
+        batched_rpc = BatchedRPC(self.client, METHOD, window=0.01, max_batch_size=2)
+        results = await asyncio.gather(*(batched_rpc.call(str(i)) for i in range(5)))
+        self.assertEqual(results, [f"result {i}" for i in range(5)])
+        self.assertEqual([len(batch) for batch in self.client.batches], [2, 2, 1])
+
+    async def test_failed_call_returns_none(self):
+        batched_rpc = BatchedRPC(self.client, METHOD, window=0.01)
+        results = await asyncio.gather(
+            batched_rpc.call("0"), batched_rpc.call("missing"), batched_rpc.call("2")
+        )
+        self.assertEqual(results, ["result 0", None, "result 2"])
+
+    async def test_failed_batch_fails_every_call(self):
+        self.client.error = ConnectionError("lost")
+        batched_rpc = BatchedRPC(self.client, METHOD, window=0.01)
+        results = await asyncio.gather(
+            *(batched_rpc.call(str(i)) for i in range(3)), return_exceptions=True
+        )
+        self.assertEqual(len(results), 3)
+        for result in results:
+            self.assertIs(result, self.client.error)
+
+
+class ElectrumClientUnitTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.electrum_client = ElectrumClient()
+        self.fake_client = FakeBatchClient()
+        self.electrum_client.conn = self.fake_client
+
+    def tearDown(self) -> None:
+        self.electrum_client.loop.call_soon_threadsafe(self.electrum_client.loop.stop)
+
+    async def test_batch_rpc_raises_failures(self):
+        requests = [(METHOD, "0"), (METHOD, "missing")]
+        with self.assertRaises(ElectrumErrorResponse):
+            await self.electrum_client.batch_rpc(requests)
+
+        results = await self.electrum_client.batch_rpc(requests, return_exceptions=True)
+        self.assertEqual(results[0], "result 0")
+        self.assertIsInstance(results[1], ElectrumErrorResponse)
+
+
+class FakeSubscriptionConn:
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.batches = []
+        self.queue = None
+
+    def subscription_queue(self, method):
+        self.queue = asyncio.Queue()
+        return self.queue
+
+    async def batch_rpc(self, requests, return_exceptions=False):
+        self.batches.append([script_hash for _, script_hash in requests])
+        return [self.statuses.get(script_hash) for _, script_hash in requests]
+
+
+class ScriptHashSubscriptionUnitTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.electrum_client = ElectrumClient()
+        self.conn = FakeSubscriptionConn({"a": "status a"})
+        self.electrum_client.conn = self.conn
+
+    def tearDown(self) -> None:
+        self.electrum_client.loop.call_soon_threadsafe(self.electrum_client.loop.stop)
+
+    async def test_statuses_of_the_subscriptions(self):
+        statuses = await self.electrum_client.subscribe_script_hashes(["a", "b"])
+        self.assertEqual(statuses, ["status a", None])
+        self.assertEqual(self.conn.batches, [["a", "b"]])
+        self.assertTrue(self.electrum_client.is_script_hash_subscribed("b"))
+        self.assertEqual(self.electrum_client.script_hash_status("a"), "status a")
+        self.assertIsNone(self.electrum_client.script_hash_status("b"))
+
+    async def test_notifications_update_the_statuses(self):
+        await self.electrum_client.subscribe_script_hashes(["a"])
+        self.conn.queue.put_nowait(["a", "new status a"])
+        # Of a subscription from a closed connection.
+        self.conn.queue.put_nowait(["c", "status c"])
+
+        self.assertEqual(self.electrum_client.script_hash_status("a"), "new status a")
+        self.assertFalse(self.electrum_client.is_script_hash_subscribed("c"))
+
+    async def test_statuses_are_cleared_on_disconnect(self):
+        await self.electrum_client.subscribe_script_hashes(["a"])
+        self.electrum_client._on_disconnected(self.conn)
+        self.assertFalse(self.electrum_client.is_script_hash_subscribed("a"))
+        self.assertIsNone(self.electrum_client.script_hash_status("a"))
+
+
+class RPCCacheUnitTest(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = RPCCache()
+        self.assertEqual(cache.get("a"), (False, None))
+        cache.put("a", "result a", ttl=None)
+        self.assertEqual(cache.get("a"), (True, "result a"))
+        self.assertEqual(cache.get("a"), (True, "result a"))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_entries_expire_after_their_ttl(self):
+        cache = RPCCache()
+        with mock.patch("wkwallet.electrum_client.monotonic", return_value=100):
+            cache.put("a", "result a", ttl=10)
+            cache.put("b", "result b", ttl=None)
+        with mock.patch("wkwallet.electrum_client.monotonic", return_value=109):
+            self.assertEqual(cache.get("a"), (True, "result a"))
+        with mock.patch("wkwallet.electrum_client.monotonic", return_value=110):
+            self.assertEqual(cache.get("a"), (False, None))
+            self.assertEqual(cache.get("b"), (True, "result b"))
+        self.assertEqual(len(cache), 1)
+
+    def test_least_recently_used_are_evicted(self):
+        cache = RPCCache()
+        for i in range(RPC_CACHE_MAX_SIZE):
+            cache.put(i, f"result {i}", ttl=None)
+        # Used, so the least recently used is now 1.
+        cache.get(0)
+        cache.put("new", "result new", ttl=None)
+
+        self.assertEqual(len(cache), RPC_CACHE_MAX_SIZE)
+        self.assertEqual(cache.get(1), (False, None))
+        self.assertEqual(cache.get(0), (True, "result 0"))
+        self.assertEqual(cache.get("new"), (True, "result new"))
+
+
+class FakeRPCConn:
+    """
+    Answers the RPCs with "<method> <params>" once `released` is set.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.released = asyncio.Event()
+
+    async def RPC(self, method, *params):
+        self.calls.append((method, *params))
+        await self.released.wait()
+        return f"{method} {params}"
+
+
+class RPCCoalescingUnitTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.electrum_client = ElectrumClient()
+        self.conn = FakeRPCConn()
+        self.electrum_client.conn = self.conn
+
+    def tearDown(self) -> None:
+        self.electrum_client.loop.call_soon_threadsafe(self.electrum_client.loop.stop)
+
+    async def test_identical_rpcs_in_flight_are_sent_once(self):
+        tasks = [
+            asyncio.ensure_future(self.electrum_client.rpc("server.ping"))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        self.conn.released.set()
+        results = await asyncio.gather(*tasks)
+
+        self.assertEqual(self.conn.calls, [("server.ping",)])
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(self.electrum_client.cache_stats()["coalesced"], 2)
+        # Not cached, sent again once completed.
+        await self.electrum_client.rpc("server.ping")
+        self.assertEqual(len(self.conn.calls), 2)
+
+    async def test_cached_results_expire_after_the_ttl_of_their_method(self):
+        self.conn.released.set()
+        with mock.patch("wkwallet.electrum_client.monotonic", return_value=100):
+            await self.electrum_client.rpc(GET_HEADER_RPC, ["10"])
+            await self.electrum_client.rpc(GET_HEADER_RPC, ["10"])
+        self.assertEqual(len(self.conn.calls), 1)
+        self.assertEqual(
+            self.electrum_client.cache_stats(),
+            {"hits": 1, "misses": 1, "coalesced": 0, "size": 1},
+        )
+
+        expire_time = 100 + CACHE_TTLS[GET_HEADER_RPC]
+        with mock.patch("wkwallet.electrum_client.monotonic", return_value=expire_time):
+            await self.electrum_client.rpc(GET_HEADER_RPC, ["10"])
+        self.assertEqual(len(self.conn.calls), 2)
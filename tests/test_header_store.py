@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+from wkwallet.model.header_store import (
+    HEADER_SIZE,
+    HeaderStore,
+    group_heights_into_ranges,
+)
+
+# The genesis block header.
+GENESIS_HEADER_HEX = (
+    "0100000000000000000000000000000000000000000000000000000000000000"
+    "000000003ba3edfd7a7b12b27ac72c3e67768f617fc81bc3888a51323a9fb8aa"
+    "4b1e5e4a29ab5f49ffff001d1dac2b7c"
+)
+GENESIS_TIMESTAMP = 1231006505
+
+
+def fake_header(timestamp):
+    return bytes(68) + timestamp.to_bytes(4, "little") + bytes(8)
+
+
+class HeaderStoreUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.test_dir.name, "headers.bin")
+        self.store = HeaderStore(self.path)
+
+    def tearDown(self) -> None:
+        self.store.close()
+        self.test_dir.cleanup()
+
+    def test_empty_store(self):
+        self.assertEqual(self.store.max_height, -1)
+        self.assertIsNone(self.store.get_header(0))
+        self.assertIsNone(self.store.get_timestamp(0))
+        self.assertFalse(self.store.has_header(100))
+
+    def test_put_and_get_header(self):
+        genesis_header = bytes.fromhex(GENESIS_HEADER_HEX)
+        self.store.put_headers(0, genesis_header)
+
+        self.assertEqual(self.store.get_header(0), genesis_header)
+        self.assertEqual(self.store.get_timestamp(0), GENESIS_TIMESTAMP)
+        self.assertEqual(self.store.max_height, 0)
+
+    def test_put_range_with_gaps(self):
+        self.store.put_headers(10, fake_header(1000) + fake_header(1001))
+        self.store.put_headers(5, fake_header(500))
+
+        self.assertEqual(self.store.max_height, 11)
+        self.assertEqual(self.store.get_timestamp(5), 500)
+        self.assertEqual(self.store.get_timestamp(10), 1000)
+        self.assertEqual(self.store.get_timestamp(11), 1001)
+        # Heights in between were never stored.
+        self.assertIsNone(self.store.get_header(7))
+        self.assertFalse(self.store.has_header(7))
+        self.assertIsNone(self.store.get_timestamp(12))
+
+    def test_headers_persist(self):
+        self.store.put_headers(3, fake_header(300))
+        self.store.close()
+
+        self.store = HeaderStore(self.path)
+        self.assertEqual(self.store.get_timestamp(3), 300)
+        self.assertEqual(os.path.getsize(self.path), 4 * HEADER_SIZE)
+
+    def test_invalid_headers_length(self):
+        with self.assertRaises(ValueError):
+            self.store.put_headers(0, bytes(79))
+
+
+class GroupHeightsIntoRangesUnitTest(unittest.TestCase):
+    def test_close_heights_share_a_range(self):
+        self.assertEqual(
+            group_heights_into_ranges([105, 100, 101, 100], max_gap=10, max_count=100),
+            [(100, 6)],
+        )
+
+    def test_far_heights_are_separate_ranges(self):
+        self.assertEqual(
+            group_heights_into_ranges([100, 200, 205], max_gap=10, max_count=100),
+            [(100, 1), (200, 6)],
+        )
+
+    def test_ranges_are_capped(self):
+        self.assertEqual(
+            group_heights_into_ranges(range(0, 10), max_gap=10, max_count=4),
+            [(0, 4), (4, 4), (8, 2)],
+        )
@@ -0,0 +1,74 @@
+import unittest
+
+from wkwallet.model.history_backfill import HistoryBackfill
+
+
+class HistoryBackfillUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.height_to_tx_ids = {
+            100: {"a", "b"},
+            99: {"c"},
+            98: {"d", "e"},
+        }
+        self.parsed_tx_ids = {"a", "b"}
+        # No bandwidth limit, unless set by the test.
+        self.backfill = HistoryBackfill(bytes_per_second=10**12)
+        self.backfill.start(self.height_to_tx_ids, self.is_parsed)
+
+    def is_parsed(self, tx_id):
+        return tx_id in self.parsed_tx_ids
+
+    def complete(self, batch, failed=()):
+        for _, tx_id in batch:
+            if tx_id not in failed:
+                self.parsed_tx_ids.add(tx_id)
+        return self.backfill.batch_completed(
+            batch, [item for item in batch if item[1] not in failed], 0
+        )
+
+    def test_newest_first(self):
+        self.assertEqual(self.backfill.progress(), (2, 5, 100))
+
+        batch = self.backfill.next_batch(2)
+        self.assertEqual(batch, [(99, "c"), (98, "d")])
+        # One batch at a time.
+        self.assertEqual(self.backfill.ready_count(), 0)
+
+        self.assertEqual(self.complete(batch), (4, 5, 98 + 1))
+        self.assertEqual(self.backfill.ready_count(), 1)
+        progress = self.complete(self.backfill.next_batch(2))
+        self.assertEqual(progress, (5, 5, 98))
+        self.assertTrue(progress.completed)
+
+    def test_failed_txs_hold_the_cursor(self):
+        batch = self.backfill.next_batch(10)
+        progress = self.complete(batch, failed={"c"})
+        self.assertEqual(progress, (4, 5, 100))
+        self.assertEqual(self.backfill.pending_count, 0)
+
+        # Parsed again when the backfill is started again.
+        self.backfill.start(self.height_to_tx_ids, self.is_parsed)
+        self.assertEqual(self.backfill.next_batch(10), [(99, "c")])
+
+    def test_restart_ignores_running_batch(self):
+        batch = self.backfill.next_batch(1)
+        self.backfill.start(self.height_to_tx_ids, self.is_parsed)
+        self.assertEqual(self.complete(batch), (2, 5, 100))
+        self.assertEqual(self.backfill.pending_count, 3)
+
+    def test_bandwidth_budget(self):
+        backfill = HistoryBackfill(bytes_per_second=1000)
+        backfill.start(self.height_to_tx_ids, self.is_parsed)
+        batch = backfill.next_batch(1)
+        backfill.batch_completed(batch, batch, 2000)
+        self.assertEqual(backfill.ready_count(), 0)
+        self.assertGreater(backfill.next_batch_delay(), 1.5)
+
+    def test_saved_cursor_until_started(self):
+        backfill = HistoryBackfill(cursor_height=99)
+        progress = backfill.progress()
+        self.assertEqual(progress, (0, 0, 99))
+        self.assertTrue(progress.completed)
+
+        backfill.start(self.height_to_tx_ids, self.is_parsed)
+        self.assertEqual(backfill.progress(), (2, 5, 100))
@@ -0,0 +1,61 @@
+import unittest
+
+from wkwallet.model.crypt_utils import mnemonic_to_root_key
+from wkwallet.model.key_cache import KeyCache
+from wkwallet.model.script_type import ScriptType
+
+MNEMONIC = "east vintage light claw survey snake dawn kiwi vacant wheat phrase flavor"
+
+
+class KeyCacheUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.key_cache = KeyCache()
+        self.mnemonic_loads = 0
+
+    def load_mnemonic(self):
+        self.mnemonic_loads += 1
+        return MNEMONIC
+
+    def test_root_key_is_derived_once(self):
+        root_key = self.key_cache.root_key(1, self.load_mnemonic)
+        self.assertIs(self.key_cache.root_key(1, self.load_mnemonic), root_key)
+        self.assertEqual(self.mnemonic_loads, 1)
+        self.assertEqual(
+            root_key.hwif(as_private=True),
+            mnemonic_to_root_key(MNEMONIC).hwif(as_private=True),
+        )
+
+    def test_account_key(self):
+        derivation_path = ScriptType.WPKH.derivation_path()
+        account_key = self.key_cache.account_key(
+            1, self.load_mnemonic, derivation_path, 0
+        )
+        expected_key = (
+            mnemonic_to_root_key(MNEMONIC)
+            .subkey_for_path(derivation_path)
+            .subkey_for_path("0p/1/5")
+        )
+        self.assertEqual(
+            account_key.subkey_for_path("1/5").hwif(as_private=True),
+            expected_key.hwif(as_private=True),
+        )
+        self.assertIs(
+            self.key_cache.account_key(1, self.load_mnemonic, derivation_path, 0),
+            account_key,
+        )
+        self.assertEqual(self.mnemonic_loads, 1)
+
+    def test_wipe(self):
+        derivation_path = ScriptType.WPKH.derivation_path()
+        self.key_cache.account_key(1, self.load_mnemonic, derivation_path, 0)
+        self.key_cache.set_root_key(2, mnemonic_to_root_key(MNEMONIC))
+
+        self.key_cache.wipe(1)
+        self.key_cache.root_key(2, self.load_mnemonic)
+        self.assertEqual(self.mnemonic_loads, 1)
+        self.key_cache.account_key(1, self.load_mnemonic, derivation_path, 0)
+        self.assertEqual(self.mnemonic_loads, 2)
+
+        self.key_cache.wipe()
+        self.key_cache.root_key(2, self.load_mnemonic)
+        self.assertEqual(self.mnemonic_loads, 3)
@@ -0,0 +1,77 @@
+import hashlib
+import unittest
+from collections import namedtuple
+
+from pycoin.symbols.btc import network as BTC
+from wkwallet.model.address_deriver import AddressDeriver
+from wkwallet.model.owned_script_index import BloomFilter, OwnedScriptIndex
+from wkwallet.model.script_type import ScriptType
+
+ZPUB = "zpub6qSqRUnhGDST2CweecVFEEfzHHFHPiKLqKg9iTtXsAk1AF7PyH75wgEGyxBRYicMhiBhpZPWR1fEShbnRhBbu8kiHrbZiv8n5qUQbd5T7km"
+
+FakeAddressData = namedtuple("FakeAddressData", ["address_str", "script_hash"])
+
+
+class BloomFilterUnitTest(unittest.TestCase):
+    def test_no_false_negatives(self):
+        bloom_filter = BloomFilter(1000, 0.01)
+        digests = [
+            hashlib.sha256(i.to_bytes(4, "little")).digest() for i in range(1000)
+        ]
+        for digest in digests:
+            bloom_filter.add(digest)
+        self.assertTrue(all(digest in bloom_filter for digest in digests))
+
+        false_positives = sum(
+            hashlib.sha256(b"other" + i.to_bytes(4, "little")).digest() in bloom_filter
+            for i in range(10000)
+        )
+        self.assertLess(false_positives, 300)
+
+
+class OwnedScriptIndexUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        deriver = AddressDeriver(BTC.parse(ZPUB), {0: ScriptType.WPKH})
+        self.derived_addresses = deriver.derive_range(0, 0, 20)
+        # The first 10 addresses are in the DB, the others are foreign.
+        self.db = {
+            derived.script_hash: FakeAddressData(
+                derived.address_str, derived.script_hash
+            )
+            for derived in self.derived_addresses[:10]
+        }
+        self.queried_script_hashes = []
+        self.index = OwnedScriptIndex(lambda: list(self.db), self.load_address_data)
+
+    def load_address_data(self, script_hash):
+        self.queried_script_hashes.append(script_hash)
+        return self.db.get(script_hash)
+
+    def test_lookup(self):
+        owned = self.derived_addresses[3]
+        self.assertEqual(self.index.lookup(owned.script).address_str, owned.address_str)
+        # Loaded once.
+        self.assertTrue(owned.script in self.index)
+        self.assertEqual(self.queried_script_hashes, [owned.script_hash])
+
+        for foreign in self.derived_addresses[10:]:
+            self.assertIsNone(self.index.lookup(foreign.script))
+        self.assertEqual(self.index.stats()["filter_rejects"], 10)
+        self.assertEqual(self.queried_script_hashes, [owned.script_hash])
+
+    def test_add(self):
+        new = self.derived_addresses[15]
+        address_data = FakeAddressData(new.address_str, new.script_hash)
+        self.index.add(address_data)
+        self.assertIs(self.index.lookup(new.script), address_data)
+        self.assertEqual(self.queried_script_hashes, [])
+
+    def test_filter_is_rebuilt_when_full(self):
+        capacity = self.index.stats()["filter_capacity"]
+        for i in range(capacity):
+            self.index.add(
+                FakeAddressData(str(i), hashlib.sha256(bytes(i)).hexdigest())
+            )
+        self.assertGreater(self.index.stats()["filter_capacity"], capacity)
+        for derived in self.derived_addresses[:10]:
+            self.assertTrue(derived.script in self.index)
@@ -0,0 +1,112 @@
+import asyncio
+import unittest
+
+from wkwallet.model.adaptive_window import AdaptiveRequestWindow
+from wkwallet.model.refresh_scheduler import RefreshPriority, RefreshScheduler
+
+
+class FakeWallet:
+    def __init__(self, name, started_batches):
+        self.name = name
+        self.pending = {priority: 0 for priority in RefreshPriority}
+        self.started_batches = started_batches
+        self.release = asyncio.Event()
+
+    def pending_update_addresses_count(self, priority):
+        return self.pending[priority]
+
+    def start_refresh_batch(self, priority, batch_size):
+        if not self.pending[priority]:
+            return None
+        self.pending[priority] = max(0, self.pending[priority] - batch_size)
+        self.started_batches.append((self.name, priority))
+        return asyncio.create_task(self.release.wait())
+
+
+class RefreshSchedulerUnitTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.window = AdaptiveRequestWindow(initial_batch_size=10, initial_in_flight=1)
+        self.scheduler = RefreshScheduler(self.window)
+        self.started_batches = []
+        self.wallet_a = FakeWallet("a", self.started_batches)
+        self.wallet_b = FakeWallet("b", self.started_batches)
+
+    async def complete_batches(self, count):
+        for _ in range(count):
+            for wallet in (self.wallet_a, self.wallet_b):
+                wallet.release.set()
+                wallet.release = asyncio.Event()
+            # Let the done callbacks run.
+            for _ in range(3):
+                await asyncio.sleep(0)
+
+    async def test_budget_is_shared(self):
+        self.wallet_a.pending[RefreshPriority.INTERNAL] = 30
+        self.wallet_b.pending[RefreshPriority.INTERNAL] = 30
+        self.scheduler.notify(self.wallet_a)
+        self.scheduler.notify(self.wallet_b)
+
+        # Only one batch in flight at a time.
+        self.assertEqual(self.scheduler.in_flight, 1)
+        self.assertEqual(len(self.started_batches), 1)
+
+        await self.complete_batches(5)
+        # Wallet a was queued again before b was notified, then they take turns.
+        self.assertEqual(
+            [name for name, _ in self.started_batches], ["a", "a", "b", "a", "b", "b"]
+        )
+
+        stats = self.scheduler.stats()
+        self.assertEqual(stats["priorities"]["INTERNAL"]["started_batches"], 6)
+        self.assertEqual(stats["priorities"]["INTERNAL"]["queue_depth"], 0)
+
+    async def test_priorities(self):
+        self.wallet_a.pending[RefreshPriority.INTERNAL] = 20
+        self.scheduler.notify(self.wallet_a)
+        self.wallet_b.pending[RefreshPriority.INTERNAL] = 10
+        self.wallet_b.pending[RefreshPriority.EXTERNAL] = 10
+        self.scheduler.notify(self.wallet_b)
+
+        stats = self.scheduler.stats()
+        self.assertEqual(stats["priorities"]["INTERNAL"]["queue_depth"], 20)
+        self.assertEqual(stats["priorities"]["EXTERNAL"]["queue_depth"], 10)
+
+        await self.complete_batches(3)
+        self.assertEqual(
+            self.started_batches,
+            [
+                ("a", RefreshPriority.INTERNAL),
+                ("b", RefreshPriority.EXTERNAL),
+                ("a", RefreshPriority.INTERNAL),
+                ("b", RefreshPriority.INTERNAL),
+            ],
+        )
+
+    async def test_foreground_wallet_first(self):
+        self.scheduler.set_foreground_wallet(self.wallet_b)
+        self.wallet_a.pending[RefreshPriority.EXTERNAL] = 20
+        self.wallet_b.pending[RefreshPriority.INTERNAL] = 20
+        self.scheduler.notify(self.wallet_a)
+        self.scheduler.notify(self.wallet_b)
+
+        await self.complete_batches(3)
+        self.assertEqual(
+            [name for name, _ in self.started_batches], ["a", "b", "b", "a"]
+        )
+
+    async def test_foreground_wallet_backfill_last(self):
+        self.scheduler.set_foreground_wallet(self.wallet_b)
+        self.wallet_a.pending[RefreshPriority.INTERNAL] = 20
+        self.scheduler.notify(self.wallet_a)
+        self.wallet_b.pending[RefreshPriority.BACKFILL] = 10
+        self.scheduler.notify(self.wallet_b)
+
+        await self.complete_batches(2)
+        self.assertEqual(
+            self.started_batches,
+            [
+                ("a", RefreshPriority.INTERNAL),
+                ("a", RefreshPriority.INTERNAL),
+                ("b", RefreshPriority.BACKFILL),
+            ],
+        )
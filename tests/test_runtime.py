@@ -0,0 +1,13 @@
+import unittest
+
+from wkwallet.model.runtime import BACKGROUND_WORKERS, background_executor, rss_bytes
+
+
+class RuntimeUnitTest(unittest.TestCase):
+    def test_background_executor_is_shared_and_bounded(self):
+        self.assertIs(background_executor(), background_executor())
+        self.assertEqual(background_executor()._max_workers, BACKGROUND_WORKERS)
+        self.assertEqual(background_executor().submit(sum, [1, 2]).result(), 3)
+
+    def test_rss(self):
+        self.assertGreater(rss_bytes(), 0)
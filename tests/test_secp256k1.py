@@ -0,0 +1,53 @@
+import unittest
+
+from pycoin.symbols.btc import network as BTC
+from wkwallet.model import secp256k1
+from wkwallet.model.address_deriver import AddressDeriver
+from wkwallet.model.script_type import ScriptType
+
+ZPUB = "zpub6qSqRUnhGDST2CweecVFEEfzHHFHPiKLqKg9iTtXsAk1AF7PyH75wgEGyxBRYicMhiBhpZPWR1fEShbnRhBbu8kiHrbZiv8n5qUQbd5T7km"
+
+
+@unittest.skipUnless(secp256k1.is_available(), "libsecp256k1 is not available")
+class Secp256k1UnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.master_key = BTC.parse(ZPUB)
+
+    def test_ckd_pub_matches_pycoin(self):
+        for chain_index in (0, 1):
+            chain_key = self.master_key.subkey(chain_index)
+            for address_index in list(range(100)) + [2**31 - 1]:
+                child_key = chain_key.subkey(address_index)
+                self.assertEqual(
+                    secp256k1.ckd_pub(
+                        chain_key.sec(), chain_key.chain_code(), address_index
+                    ),
+                    (child_key.sec(), child_key.chain_code()),
+                )
+
+    def test_ckd_pub_from_master_key(self):
+        child_key = self.master_key.subkey(7)
+        self.assertEqual(
+            secp256k1.ckd_pub(self.master_key.sec(), self.master_key.chain_code(), 7),
+            (child_key.sec(), child_key.chain_code()),
+        )
+
+    def test_hardened_index(self):
+        with self.assertRaises(ValueError):
+            secp256k1.ckd_pub(
+                self.master_key.sec(), self.master_key.chain_code(), 2**31
+            )
+
+    def test_deriver_matches_pycoin(self):
+        chains = {0: ScriptType.WPKH, 1: ScriptType.WPKH, 2: ScriptType.WSH_FB}
+        deriver = AddressDeriver(self.master_key, chains)
+        for chain_index, script_type in chains.items():
+            for derived in deriver.derive_range(chain_index, 0, 50):
+                script_object = script_type(
+                    self.master_key.subkey_for_path(
+                        f"{chain_index}/{derived.address_index}"
+                    ),
+                    derived.address_index,
+                )
+                self.assertEqual(derived.address_str, script_object.address())
+                self.assertEqual(derived.script, script_object.script())
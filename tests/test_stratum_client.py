@@ -0,0 +1,116 @@
+import asyncio
+import unittest
+
+from wkwallet.connectrum.connectrum.client import StratumClient
+from wkwallet.connectrum.connectrum.exc import (
+    ElectrumConnectionLost,
+    ElectrumErrorResponse,
+    ElectrumRequestTimeout,
+)
+
+
+class FakeProtocol:
+    def __init__(self):
+        self.sent = []
+
+    def send_data(self, msg):
+        self.sent.append(msg)
+
+    def close(self):
+        pass
+
+
+class StratumClientUnitTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.client = StratumClient(
+            loop=asyncio.get_running_loop(),
+            timeouts={"slow.method": 0.01},
+            default_timeout=None,
+        )
+        self.protocols = []
+
+        async def reconnect():
+            if self.client.protocol:
+                return
+            self.client.protocol = FakeProtocol()
+            self.protocols.append(self.client.protocol)
+
+        self.client.reconnect = reconnect
+        await reconnect()
+
+    def respond(self, protocol, result):
+        for msg in protocol.sent:
+            self.client._got_response({"id": msg["id"], "result": result})
+
+    async def test_response(self):
+        fut = self.client.RPC("server.ping")
+        self.respond(self.protocols[0], None)
+        self.assertIsNone(await fut)
+        self.assertFalse(self.client.inflight)
+        self.assertFalse(self.client.timeout_handles)
+
+    async def test_request_timeout(self):
+        fut = self.client.RPC("slow.method")
+        with self.assertRaises(ElectrumRequestTimeout):
+            await fut
+        self.assertFalse(self.client.inflight)
+
+        # A late response is ignored.
+        self.respond(self.protocols[0], None)
+
+    async def test_resend_on_reconnect(self):
+        fut = self.client.RPC("blockchain.transaction.get", "txid")
+        self.client._connection_lost(self.protocols[0])
+        await asyncio.sleep(0)
+
+        # The request is sent again on the new connection.
+        self.assertEqual(len(self.protocols), 2)
+        self.assertEqual(self.protocols[1].sent, self.protocols[0].sent)
+        self.respond(self.protocols[1], "hex")
+        self.assertEqual(await fut, "hex")
+
+    async def test_timeout_restarts_on_resend(self):
+        fut = self.client.RPC("slow.method")
+        self.client._connection_lost(self.protocols[0])
+        handle = self.client.timeout_handles[self.protocols[0].sent[0]["id"]]
+        await asyncio.sleep(0)
+
+        # The request is re-sent with a new timeout, which still fails it.
+        self.assertEqual(len(self.protocols), 2)
+        self.assertTrue(handle.cancelled())
+        with self.assertRaises(ElectrumRequestTimeout):
+            await fut
+        self.assertFalse(self.client.inflight)
+        self.assertFalse(self.client.timeout_handles)
+
+    async def test_broadcast_not_resent(self):
+        fut = self.client.RPC("blockchain.transaction.broadcast", "hex")
+        self.client._connection_lost(self.protocols[0])
+        with self.assertRaises(ElectrumConnectionLost):
+            await fut
+        self.assertFalse(self.client.inflight)
+
+    async def test_close_fails_inflight_requests(self):
+        fut = self.client.batch_rpc([("server.ping",), ("server.ping",)])
+        self.client.close()
+        with self.assertRaises(ElectrumConnectionLost):
+            await fut
+
+    async def test_batch_errors(self):
+        requests = [("server.ping",), ("server.ping",)]
+        fut = self.client.batch_rpc(requests)
+        fut_with_errors = self.client.batch_rpc(requests, return_exceptions=True)
+        for batch in self.protocols[0].sent:
+            self.client._got_response(
+                [
+                    {"id": batch[0]["id"], "result": None},
+                    {"id": batch[1]["id"], "error": "failed"},
+                ]
+            )
+
+        # Failures are raised, unless the caller asks for them.
+        with self.assertRaises(ElectrumErrorResponse):
+            await fut
+        results = await fut_with_errors
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], ElectrumErrorResponse)
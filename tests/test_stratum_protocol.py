@@ -0,0 +1,71 @@
+import json
+import unittest
+
+from wkwallet.connectrum.connectrum import protocol
+from wkwallet.connectrum.connectrum.protocol import StratumProtocol
+
+
+class FakeClient:
+    def __init__(self):
+        self.responses = []
+        self.lost = False
+
+    def _got_response(self, msg):
+        self.responses.append(msg)
+
+    def _connection_lost(self, protocol):
+        self.lost = True
+
+
+class FakeTransport:
+    def close(self):
+        pass
+
+
+class StratumProtocolUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.client = FakeClient()
+        self.protocol = StratumProtocol()
+        self.protocol.client = self.client
+        self.protocol.connection_made(FakeTransport())
+
+    def feed(self, data, chunk_size):
+        for i in range(0, len(data), chunk_size):
+            self.protocol.data_received(data[i : i + chunk_size])
+
+    def test_messages_split_across_chunks(self):
+        messages = [{"id": i, "result": "ab" * i} for i in range(50)]
+        data = b"".join(json.dumps(msg).encode() + b"\n" for msg in messages)
+
+        self.feed(data, chunk_size=7)
+        self.assertEqual(self.client.responses, messages)
+        self.assertEqual(len(self.protocol.buf), 0)
+
+    def test_partial_message_kept(self):
+        self.protocol.data_received(b'{"id": 1, "result": 1}\n\r\n{"id": 2,')
+        self.assertEqual(self.client.responses, [{"id": 1, "result": 1}])
+
+        self.protocol.data_received(b' "result": 2}\n')
+        self.assertEqual(self.client.responses[-1], {"id": 2, "result": 2})
+
+    def test_bad_json_drops_connection(self):
+        self.protocol.data_received(b"not json\n")
+        self.assertTrue(self.client.lost)
+        self.assertEqual(self.client.responses, [])
+
+    def test_custom_json_decoder(self):
+        decoded = []
+
+        def decoder(msg):
+            decoded.append(msg)
+            return json.loads(msg)
+
+        default_decoder = StratumProtocol.json_decoder
+        protocol.set_json_decoder(decoder)
+        try:
+            self.protocol.data_received(b'{"id": 1, "result": null}\n')
+        finally:
+            protocol.set_json_decoder(default_decoder)
+
+        self.assertEqual(decoded, ['{"id": 1, "result": null}'])
+        self.assertEqual(self.client.responses, [{"id": 1, "result": None}])
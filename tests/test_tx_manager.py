@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+from typing import Optional
+
+from db.database_repo import DB_LOCATION_MEMORY, DatabaseRepo
+from db.raw_tx_data import RawTxData
+from db.tx_data import TxData
+from db.wallet_data import WalletData
+from electrum_client import electrum_client
+from model.tx_manager import TxManager
+from tests.db.test_tx_data import TX_HEX
+from tests.test_electrum_client import FakeBatchClient
+
+TX_ID = "tx"
+
+
+class FakeTxClient(FakeBatchClient):
+    async def batch_rpc(self, requests, return_exceptions=False):
+        self.batches.append([params for _, *params in requests])
+        return [TX_HEX for _ in requests]
+
+
+class TxManagerUnitTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.test_repo: Optional[DatabaseRepo] = DatabaseRepo(DB_LOCATION_MEMORY)
+        self.tx_managers = []
+        for _ in range(3):
+            wallet_data = WalletData.create()
+            TxData.create(wallet=wallet_data, tx_id=TX_ID, height=10)
+            self.tx_managers.append(TxManager(wallet_data))
+
+        self.client = FakeTxClient()
+        self._conn, electrum_client.conn = electrum_client.conn, self.client
+
+    def tearDown(self) -> None:
+        electrum_client.conn = self._conn
+        self.test_repo = None
+
+    async def test_tx_shared_by_wallets_is_fetched_once(self):
+        # Requested by two wallets at once.
+        tx_datas = await asyncio.gather(
+            self.tx_managers[0].get_tx_with_data(TX_ID),
+            self.tx_managers[1].get_tx_with_data(TX_ID),
+        )
+        self.assertEqual(self.client.batches, [[[TX_ID]]])
+        # Then by a third one: the confirmed tx is in the raw tx store.
+        tx_datas.append(await self.tx_managers[2].get_tx_with_data(TX_ID))
+        self.assertEqual(len(self.client.batches), 1)
+
+        self.assertEqual(RawTxData.select().count(), 1)
+        self.assertEqual(
+            len({tx_data.wallet_id for tx_data in tx_datas}), len(self.tx_managers)
+        )
+        self.assertEqual(tx_datas[0].decoded_tx.vsize, 182)
@@ -0,0 +1,72 @@
+import unittest
+from typing import Optional
+
+from db.database_repo import DB_LOCATION_MEMORY, DatabaseRepo
+from db.tx_data import TxData
+from model.tx_timeline import TxCursor, timeline_page, tx_cursor
+
+
+class TxTimelineUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_repo: Optional[DatabaseRepo] = DatabaseRepo(DB_LOCATION_MEMORY)
+        self.wallets_data = [self.test_repo.add_wallet() for _ in range(3)]
+        self.test_repo.commit()
+
+        for i, wallet_data in enumerate(self.wallets_data):
+            TxData.insert_many(
+                [
+                    {
+                        "wallet": wallet_data,
+                        # Several txs per height, across the wallets.
+                        "height": 1 + j // 4,
+                        "tx_id": "%02d%04d" % (i, j),
+                        "is_processed": j % 10 != 0,
+                    }
+                    for j in range(100)
+                ]
+            ).execute()
+            TxData.create(wallet=wallet_data, height=0, tx_id="%02dpending" % i)
+
+    def tearDown(self) -> None:
+        self.test_repo = None
+
+    def expected_timeline(self):
+        txs = TxData.select().where((TxData.height <= 0) | TxData.is_processed)
+        return sorted((tx_cursor(tx) for tx in txs), reverse=True)
+
+    def test_pages_match_sorted_timeline(self):
+        timeline = []
+        cursor: Optional[TxCursor] = None
+        while True:
+            txs, cursor = timeline_page(self.wallets_data, cursor, 7)
+            self.assertLessEqual(len(txs), 7)
+            timeline += [tx_cursor(tx) for tx in txs]
+            if cursor is None:
+                break
+
+        self.assertEqual(timeline, self.expected_timeline())
+        # The pending txs come first.
+        self.assertEqual(
+            [tx_id for _, tx_id in timeline[:3]],
+            ["02pending", "01pending", "00pending"],
+        )
+
+    def test_unparsed_txs_are_skipped(self):
+        txs, _ = timeline_page(self.wallets_data, None, 1000)
+        self.assertTrue(all(tx.is_processed or tx.height <= 0 for tx in txs))
+
+    def test_page_uses_index(self):
+        query = TxData.select().where(
+            (TxData.wallet == self.wallets_data[0])
+            & (TxData.is_processed == True)
+            & (TxData.height > 0)
+        )
+        sql, params = query.order_by(TxData.height.desc(), TxData.tx_id.desc()).sql()
+        plan = " ".join(
+            str(row[-1])
+            for row in self.test_repo.db.execute_sql(
+                "EXPLAIN QUERY PLAN " + sql, params
+            )
+        )
+        self.assertIn("INDEX", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import wallet as wallet_module
+from db.account_data import AccountData
+from db.address_data import AddressData
+from db.chain_data import ChainData
+from db.database_repo import DatabaseRepo
+from db.tx_data import TxData
+from db.wallet_data import WalletData
+from model.tx_manager import TxManager
+from tests.helpers import ZPUB, QueryCounter
+from wallet import Wallet
+
+
+class WalletLoadingUnitTest(unittest.TestCase):
+    def setUp(self) -> None:
+        # A file, so that the wallet can be loaded from other threads.
+        self.db_path = os.path.join(tempfile.gettempdir(), "unit_test_wallet.db")
+        if os.path.isfile(self.db_path):
+            os.remove(self.db_path)
+        self.test_repo: Optional[DatabaseRepo] = DatabaseRepo(self.db_path)
+        self.wallet_data = WalletData.create()
+        account_data = AccountData.create(
+            wallet=self.wallet_data, account_index=0, xpub=ZPUB
+        )
+        for chain_index in (0, 1):
+            ChainData.create(
+                account=account_data, chain_index=chain_index, script_type_name="WPKH"
+            )
+        AddressData.create(
+            wallet=self.wallet_data,
+            account=account_data,
+            address_str="addr",
+            script_hash="00" * 32,
+            account_index=0,
+            chain_index=0,
+            address_index=0,
+            path="0/0",
+            is_active=True,
+            confirmed_balance=1000,
+        )
+        TxData.create(wallet=self.wallet_data, tx_id="tx", height=10)
+
+        self.built_tx_managers = []
+        self.tx_manager_released = threading.Event()
+        self.tx_manager_released.set()
+        test = self
+
+        class RecordedTxManager(TxManager):
+            def __init__(self, *args, **kwargs):
+                test.built_tx_managers.append(self)
+                test.tx_manager_released.wait(1)
+                super().__init__(*args, **kwargs)
+
+        wallet_module.TxManager = RecordedTxManager
+
+    def tearDown(self) -> None:
+        wallet_module.TxManager = TxManager
+        self.test_repo.db.close()
+        self.test_repo = None
+        if os.path.isfile(self.db_path):
+            os.remove(self.db_path)
+
+    def test_wallet_is_loaded_on_first_use(self):
+        with QueryCounter(self.test_repo.db) as counter:
+            wallet = Wallet(self.wallet_data)
+            self.assertEqual(wallet.wallet_title(), ZPUB[:10])
+        self.assertFalse(wallet.is_loaded)
+        self.assertFalse(
+            [sql for sql in counter.sql if '"addressdata"' in sql or '"txdata"' in sql]
+        )
+
+        self.assertEqual(wallet.total_balance, 1000)
+        self.assertTrue(wallet.is_loaded)
+        self.assertEqual(self.built_tx_managers, [])
+
+    def test_tx_manager_is_built_once(self):
+        wallet = Wallet(self.wallet_data)
+        barrier = threading.Barrier(4)
+
+        def get_tx_manager():
+            barrier.wait()
+            return wallet.tx_manager
+
+        with ThreadPoolExecutor(4) as executor:
+            tx_managers = list(executor.map(lambda _: get_tx_manager(), range(4)))
+        self.assertEqual(len(self.built_tx_managers), 1)
+        self.assertEqual(set(tx_managers), set(self.built_tx_managers))
+        self.assertTrue(wallet.tx_manager.contains_tx("tx"))
+
+    def test_loaded_wallet_is_used_while_its_txs_load(self):
+        wallet = Wallet(self.wallet_data)
+        wallet.load()
+        self.tx_manager_released.clear()
+        with ThreadPoolExecutor(1) as executor:
+            tx_manager = executor.submit(lambda: wallet.tx_manager)
+            while not self.built_tx_managers:
+                pass
+            # Not blocked by the load of the txs.
+            self.assertEqual(wallet.total_balance, 1000)
+            self.assertEqual(len(wallet.accounts), 1)
+            self.tx_manager_released.set()
+            self.assertIs(tx_manager.result(), self.built_tx_managers[0])
+
+    def test_load_in_background(self):
+        wallet = Wallet(self.wallet_data)
+        loaded = threading.Event()
+        loaded_wallets = []
+
+        def loaded_callback(loaded_wallet):
+            loaded_wallets.append(loaded_wallet)
+            loaded.set()
+
+        wallet.load_in_background(loaded_callback)
+        wallet.load_in_background(loaded_callback)
+        self.assertTrue(loaded.wait(1))
+        self.assertTrue(wallet.is_loaded)
+        self.assertEqual(loaded_wallets, [wallet])
@@ -0,0 +1,123 @@
+import asyncio
+import datetime
+import unittest
+from typing import Optional
+
+from db.account_data import AccountData
+from db.address_data import AddressData
+from db.chain_data import ChainData
+from db.database_repo import DB_LOCATION_MEMORY, DatabaseRepo
+from db.tx_data import TxData
+from db.wallet_data import WalletData
+from electrum_client import electrum_client
+from model.block_manager import block_manager
+from model.refresh_scheduler import RefreshPriority
+from tests.helpers import ZPUB
+from tests.test_electrum_client import FakeSubscriptionConn
+from wallet import Wallet
+
+TIMESTAMP = datetime.datetime(2024, 5, 1, 12, 30)
+
+
+class WalletRefreshUnitTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.test_repo: Optional[DatabaseRepo] = DatabaseRepo(DB_LOCATION_MEMORY)
+        wallet_data = WalletData.create()
+        self.account_data = AccountData.create(
+            wallet=wallet_data, account_index=0, xpub=ZPUB
+        )
+        for chain_index in (0, 1):
+            ChainData.create(
+                account=self.account_data,
+                chain_index=chain_index,
+                script_type_name="WPKH",
+            )
+        self.wallet = Wallet(wallet_data)
+
+        self.conn = FakeSubscriptionConn({})
+        self._conn, electrum_client.conn = electrum_client.conn, self.conn
+
+    def tearDown(self) -> None:
+        electrum_client._on_disconnected(self.conn)
+        electrum_client._script_hash_notifications = None
+        electrum_client.conn = self._conn
+        self.test_repo = None
+
+    def address_data(self, address_index, status_hash, update_time=TIMESTAMP):
+        return AddressData(
+            wallet=self.wallet.data,
+            account=self.account_data,
+            address_str=f"addr{address_index}",
+            script_hash=f"script_hash{address_index}",
+            account_index=0,
+            chain_index=0,
+            address_index=address_index,
+            path=f"0/{address_index}",
+            status_hash=status_hash,
+            update_time=update_time,
+        )
+
+    async def test_unchanged_addresses_are_filtered(self):
+        self.conn.statuses = {f"script_hash{i}": "status" for i in range(3)}
+        unchanged = self.address_data(0, "status")
+        changed = self.address_data(1, "old status")
+        never_fetched = self.address_data(2, "status", update_time=None)
+        address_data_list = [unchanged, changed, never_fetched]
+
+        self.assertEqual(
+            await self.wallet.filter_changed_addresses(address_data_list),
+            [changed, never_fetched],
+        )
+        self.assertEqual(
+            self.conn.batches, [["script_hash0", "script_hash1", "script_hash2"]]
+        )
+
+        # The statuses pushed by the server are used, without subscribing again.
+        self.conn.queue.put_nowait(["script_hash0", "new status"])
+        self.assertEqual(
+            await self.wallet.filter_changed_addresses(address_data_list),
+            address_data_list,
+        )
+        self.assertEqual(len(self.conn.batches), 1)
+
+    async def test_refresh_waits_for_the_backfill_batch(self):
+        TxData.create(wallet=self.wallet.data, tx_id="tx", height=10)
+        parsed_tx_ids = []
+        backfill_parsed = asyncio.Event()
+
+        async def parse_transaction(tx_id):
+            parsed_tx_ids.append(tx_id)
+            await backfill_parsed.wait()
+            return 1000
+
+        async def update_block_headers(heights):
+            pass
+
+        # The refresh has no address to update.
+        self.wallet.update_addresses_info = lambda *args, **kwargs: None
+        self.wallet.parse_transaction = parse_transaction
+        block_manager().update_block_headers = update_block_headers
+        self.addCleanup(delattr, block_manager(), "update_block_headers")
+
+        self.wallet._history_backfill.start({10: ["tx"]}, lambda tx_id: False)
+        backfill_task = self.wallet.start_refresh_batch(RefreshPriority.BACKFILL, 10)
+        await asyncio.sleep(0)
+        refresh_task = asyncio.ensure_future(self.wallet.refresh_async(None))
+        await asyncio.sleep(0.05)
+        self.assertFalse(refresh_task.done())
+
+        backfill_parsed.set()
+        await asyncio.wait_for(refresh_task, 1)
+        self.assertTrue(backfill_task.done())
+        # The tx is parsed once, by the backfill, its balance change is counted once.
+        self.assertEqual(parsed_tx_ids, ["tx"])
+        tx_data = TxData.get(TxData.tx_id == "tx")
+        self.assertEqual((tx_data.is_processed, tx_data.balance_change), (True, 1000))
+
+    async def test_created_addresses_are_not_derived(self):
+        self.wallet.load()
+        self.address_data(0, None).save()
+
+        await self.wallet.derive_addresses([(0, 0, 0), (0, 0, 1)])
+        self.assertEqual(list(self.wallet._derived_addresses), [(0, 0, 1)])
+        self.assertEqual(self.wallet._derivation_tasks, {})
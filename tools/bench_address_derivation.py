@@ -0,0 +1,68 @@
+"""
+Benchmark of the address derivation of a gap scan.
+
+Compares deriving address, script and Electrum script hash with the per path approach,
+where AccountData and WalletAccount each derive every address from their own parsed
+xpub, to AddressDeriver.derive_range, which derives each address key once from the
+cached chain node.
+
+    python tools/bench_address_derivation.py
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../wkwallet"))
+
+from model import secp256k1  # noqa: E402
+from model.address_deriver import AddressDeriver  # noqa: E402
+from model.script_type import ScriptType  # noqa: E402
+from pycoin.symbols.btc import network as BTC  # noqa: E402
+
+ZPUB = "zpub6qSqRUnhGDST2CweecVFEEfzHHFHPiKLqKg9iTtXsAk1AF7PyH75wgEGyxBRYicMhiBhpZPWR1fEShbnRhBbu8kiHrbZiv8n5qUQbd5T7km"
+CHAINS = {0: ScriptType.WPKH, 1: ScriptType.WPKH, 2: ScriptType.WSH_FB}
+
+
+def per_path(chain_index, count):
+    # AccountData and WalletAccount each parse the xpub, and derive the address from it.
+    account_data_key, wallet_account_key = BTC.parse(ZPUB), BTC.parse(ZPUB)
+    script_type = CHAINS[chain_index]
+    results = []
+    for address_index in range(count):
+        path = f"{chain_index}/{address_index}"
+        # Same as AccountData.addr_str and WalletAccount.ES_hash_for_path.
+        address_str = script_type(
+            account_data_key.subkey_for_path(path), address_index
+        ).address()
+        script_object = script_type(
+            wallet_account_key.subkey_for_path(path), address_index
+        )
+        results.append((address_str, script_object.script(), script_object.ES_hash()))
+    return results
+
+
+def derive_range(chain_index, count):
+    return AddressDeriver(BTC.parse(ZPUB), CHAINS).derive_range(chain_index, 0, count)
+
+
+def bench(function, chain_index, count):
+    start = time.perf_counter()
+    function(chain_index, count)
+    return time.perf_counter() - start
+
+
+def main():
+    backend = "libsecp256k1" if secp256k1.is_available() else "pycoin"
+    print(f"derive_range backend: {backend}")
+    # A deep internal chain scan, and the fidelity bond addresses.
+    for chain_index, count in ((1, 200), (1, 1000), (2, 132)):
+        legacy = bench(per_path, chain_index, count)
+        current = bench(derive_range, chain_index, count)
+        print(
+            f"chain {chain_index}, {count:4} addresses: per path {legacy * 1000:8.1f} ms, "
+            f"derive_range {current * 1000:8.1f} ms ({legacy / current:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
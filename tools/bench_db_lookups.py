@@ -0,0 +1,164 @@
+"""
+Benchmark of the lookups of the refresh on a database of 200k addresses.
+
+Measures the AddressData, TxData and UTXOData lookups of the refresh hot paths without
+the composite indexes, as in a database of the first released version, then with the
+indexes added by the migrations.
+
+    python tools/bench_db_lookups.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../wkwallet"))
+
+from db.account_data import AccountData  # noqa: E402
+from db.address_data import AddressData  # noqa: E402
+from db.database_repo import DatabaseRepo  # noqa: E402
+from db.tx_data import TxData  # noqa: E402
+from db.utxo_data import UTXOData  # noqa: E402
+from db.wallet_data import WalletData  # noqa: E402
+from peewee import chunked  # noqa: E402
+
+ZPUB = "zpub6qSqRUnhGDST2CweecVFEEfzHHFHPiKLqKg9iTtXsAk1AF7PyH75wgEGyxBRYicMhiBhpZPWR1fEShbnRhBbu8kiHrbZiv8n5qUQbd5T7km"
+WALLET_COUNT = 4
+ADDRESSES_PER_WALLET = 50_000
+TXS_PER_WALLET = 10_000
+LOOKUP_COUNT = 500
+INDEXED_MODELS = (AddressData, TxData, UTXOData)
+
+
+def insert(model, rows):
+    for batch in chunked(rows, 1000):
+        model.insert_many(batch).execute()
+
+
+def populate(test_repo):
+    with test_repo.db.atomic():
+        for wallet_index in range(WALLET_COUNT):
+            wallet_data = WalletData.create()
+            account_data = AccountData.create(
+                wallet=wallet_data, account_index=0, xpub=ZPUB
+            )
+            insert(
+                AddressData,
+                (
+                    {
+                        "wallet": wallet_data,
+                        "account": account_data,
+                        "address_str": f"addr{wallet_index}-{i}",
+                        "script_hash": f"{wallet_index}-{i}",
+                        "account_index": 0,
+                        "chain_index": i % 2,
+                        "address_index": i // 2,
+                        "path": f"{i % 2}/{i // 2}",
+                    }
+                    for i in range(ADDRESSES_PER_WALLET)
+                ),
+            )
+            insert(
+                TxData,
+                (
+                    {
+                        "wallet": wallet_data,
+                        "height": 1 + i // 3,
+                        "tx_id": f"tx{wallet_index}-{i}",
+                        "is_processed": True,
+                    }
+                    for i in range(TXS_PER_WALLET)
+                ),
+            )
+        insert(
+            UTXOData,
+            (
+                {
+                    "account": 1 + i % WALLET_COUNT,
+                    "address": 1 + i * 7 % (WALLET_COUNT * ADDRESSES_PER_WALLET),
+                    "tx": 1 + i,
+                    "tx_index": 0,
+                    "balance": 1000,
+                }
+                for i in range(WALLET_COUNT * TXS_PER_WALLET)
+            ),
+        )
+
+
+def drop_composite_indexes(db):
+    for model in INDEXED_MODELS:
+        table_name = model._meta.table_name
+        for index in db.get_indexes(table_name):
+            if len(index.columns) > 1:
+                db.execute_sql(f'DROP INDEX "{index.name}"')
+
+
+def lookups(rng):
+    wallet_id = rng.randint(1, WALLET_COUNT)
+    i = rng.randrange(ADDRESSES_PER_WALLET)
+    yield "address by address_str", lambda: AddressData.get_or_none(
+        AddressData.wallet == wallet_id,
+        AddressData.address_str == f"addr{wallet_id - 1}-{i}",
+    )
+    yield "address by path", lambda: AddressData.get_or_none(
+        AddressData.wallet == wallet_id,
+        AddressData.account_index == 0,
+        AddressData.chain_index == i % 2,
+        AddressData.address_index == i // 2,
+    )
+    j = rng.randrange(TXS_PER_WALLET)
+    yield "tx by tx_id", lambda: TxData.get_or_none(
+        TxData.wallet == wallet_id, TxData.tx_id == f"tx{wallet_id - 1}-{j}"
+    )
+    yield "txs by height", lambda: list(
+        TxData.select().where((TxData.wallet == wallet_id) & (TxData.height == j // 3))
+    )
+    k = rng.randrange(WALLET_COUNT * TXS_PER_WALLET)
+    yield "utxo by (tx, address)", lambda: UTXOData.get_or_none(
+        UTXOData.tx == 1 + k,
+        UTXOData.address == 1 + k * 7 % (WALLET_COUNT * ADDRESSES_PER_WALLET),
+    )
+
+
+def bench():
+    rng = random.Random(0)
+    durations = {}
+    for _ in range(LOOKUP_COUNT):
+        for name, lookup in lookups(rng):
+            start = time.perf_counter()
+            lookup()
+            durations[name] = durations.get(name, 0.0) + time.perf_counter() - start
+    return {name: duration / LOOKUP_COUNT for name, duration in durations.items()}
+
+
+def main():
+    db_path = os.path.join(tempfile.gettempdir(), "bench_db_lookups.db")
+    if os.path.isfile(db_path):
+        os.remove(db_path)
+    test_repo = DatabaseRepo(db_path)
+    populate(test_repo)
+
+    drop_composite_indexes(test_repo.db)
+    test_repo.db.execute_sql("ANALYZE")
+    before = bench()
+    for model in INDEXED_MODELS:
+        model._schema.create_indexes()
+    test_repo.db.execute_sql("ANALYZE")
+    after = bench()
+
+    print(
+        f"{WALLET_COUNT * ADDRESSES_PER_WALLET} addresses, "
+        f"{WALLET_COUNT * TXS_PER_WALLET} txs, mean of {LOOKUP_COUNT} lookups"
+    )
+    for name in before:
+        print(
+            f"{name:24} before {before[name] * 1e6:9.1f} us, "
+            f"after {after[name] * 1e6:7.1f} us ({before[name] / after[name]:.0f}x)"
+        )
+    test_repo.db.close()
+    os.remove(db_path)
+
+
+if __name__ == "__main__":
+    main()
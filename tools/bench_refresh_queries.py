@@ -0,0 +1,139 @@
+"""
+Regression benchmark of the queries and xpub parses of the database work of a refresh.
+
+Replays, on a wallet of one account, what a refresh does with the rows it loads: the
+UTXOs created for the received outputs (parse_transaction), the balance of the UTXOs
+by account, and the label import of the addresses and txs (import_label_jsonl). Each
+of them dereferences the account or the wallet of a row.
+
+Without the identity map of db.identity_map, each dereference of an account selected
+the account, its chains and its wallet, and parsed its xpub.
+
+    python tools/bench_refresh_queries.py
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../wkwallet"))
+
+from db.account_data import AccountData  # noqa: E402
+from db.address_data import AddressData  # noqa: E402
+from db.chain_data import ChainData  # noqa: E402
+from db.database_repo import DB_LOCATION_MEMORY, DatabaseRepo  # noqa: E402
+from db.tx_data import TxData  # noqa: E402
+from db.utxo_data import UTXOData  # noqa: E402
+from db.wallet_data import WalletData  # noqa: E402
+from pycoin.symbols.btc import network as BTC  # noqa: E402
+
+ZPUB = "zpub6qSqRUnhGDST2CweecVFEEfzHHFHPiKLqKg9iTtXsAk1AF7PyH75wgEGyxBRYicMhiBhpZPWR1fEShbnRhBbu8kiHrbZiv8n5qUQbd5T7km"
+ADDRESS_COUNT = 200
+TXS_PER_ADDRESS = 5
+
+
+class Counters:
+    """
+    Counts the SELECTs run on db and the calls of BTC.parse.
+    """
+
+    def __init__(self, db) -> None:
+        self.selects = 0
+        self.parses = 0
+        self._db = db
+
+    def __enter__(self):
+        execute_sql = self._db.execute_sql
+        parse = BTC.parse
+
+        def counted_execute_sql(sql, *args, **kwargs):
+            if sql.startswith("SELECT"):
+                self.selects += 1
+            return execute_sql(sql, *args, **kwargs)
+
+        def counted_parse(*args, **kwargs):
+            self.parses += 1
+            return parse(*args, **kwargs)
+
+        self._db.execute_sql = counted_execute_sql
+        BTC.parse = counted_parse
+        return self
+
+    def __exit__(self, *args):
+        del self._db.execute_sql
+        del BTC.parse
+
+
+def populate():
+    wallet_data = WalletData.create()
+    account_data = AccountData.create(wallet=wallet_data, account_index=0, xpub=ZPUB)
+    for chain_index in (0, 1):
+        ChainData.create(
+            account=account_data, chain_index=chain_index, script_type_name="WPKH"
+        )
+    AddressData.insert_many(
+        {
+            "wallet": wallet_data,
+            "account": account_data,
+            "address_str": f"addr{i}",
+            "script_hash": f"{i}",
+            "account_index": 0,
+            "chain_index": 0,
+            "address_index": i,
+            "path": f"0/{i}",
+        }
+        for i in range(ADDRESS_COUNT)
+    ).execute()
+    TxData.insert_many(
+        {"wallet": wallet_data, "tx_id": f"tx{i}", "height": 1 + i}
+        for i in range(ADDRESS_COUNT * TXS_PER_ADDRESS)
+    ).execute()
+    return wallet_data
+
+
+def refresh(wallet_data):
+    # parse_transaction: a UTXO for each output received.
+    for tx_data in TxData.select().where(TxData.wallet == wallet_data):
+        i = tx_data.id - 1
+        address_data = AddressData.get(
+            AddressData.wallet == wallet_data,
+            AddressData.script_hash == str(i // TXS_PER_ADDRESS),
+        )
+        UTXOData.create(
+            account=address_data.account,
+            address=address_data,
+            tx=tx_data,
+            tx_index=0,
+            balance=1000,
+        )
+
+    # The balance by account.
+    balances = {}
+    for utxo_data in UTXOData.select().join(TxData).where(TxData.wallet == wallet_data):
+        account_index = utxo_data.account.account_index
+        balances[account_index] = balances.get(account_index, 0) + utxo_data.balance
+
+    # import_label_jsonl
+    for addr_data in AddressData.select():
+        assert addr_data.account.wallet == wallet_data
+    for tx_data in TxData.select():
+        assert tx_data.wallet == wallet_data
+
+
+def main():
+    test_repo = DatabaseRepo(DB_LOCATION_MEMORY)
+    wallet_data = populate()
+
+    with Counters(test_repo.db) as counters:
+        start = time.perf_counter()
+        refresh(wallet_data)
+        duration = time.perf_counter() - start
+
+    print(
+        f"{ADDRESS_COUNT} addresses, {ADDRESS_COUNT * TXS_PER_ADDRESS} txs: "
+        f"{counters.selects} SELECTs, {counters.parses} xpub parses, "
+        f"{duration * 1e3:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Micro-benchmark of the unframing of Electrum server responses.
+
+Feeds multi-megabyte batch responses through StratumProtocol.data_received in TCP sized
+chunks, and compares it with the previous implementation that re-split the whole buffer
+on every chunk.
+
+    python tools/bench_stratum_framer.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../wkwallet/connectrum"))
+
+from connectrum.protocol import StratumProtocol  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+
+
+class CountingClient:
+    def __init__(self):
+        self.count = 0
+
+    def _got_response(self, msg):
+        self.count += 1
+
+
+class LegacyStratumProtocol(StratumProtocol):
+    """The data_received of connectrum 0.8.1."""
+
+    legacy_buf = b""
+
+    def data_received(self, data):
+        self.legacy_buf += data
+        *lines, self.legacy_buf = self.legacy_buf.split(b"\n")
+        for line in lines:
+            if not line:
+                continue
+            self.client._got_response(json.loads(line.decode("utf-8").strip()))
+
+
+def batch_response(requests_count, result_size):
+    """A batch response of `requests_count` history results, on one line."""
+    history = [
+        {"tx_hash": os.urandom(32).hex(), "height": 700000 + i}
+        for i in range(result_size // 100)
+    ]
+    return (
+        json.dumps([{"id": i, "result": history} for i in range(requests_count)]) + "\n"
+    ).encode()
+
+
+def bench(protocol_class, data, repeat=3):
+    best = None
+    for _ in range(repeat):
+        protocol = protocol_class()
+        protocol.client = CountingClient()
+        start = time.perf_counter()
+        for i in range(0, len(data), CHUNK_SIZE):
+            protocol.data_received(data[i : i + CHUNK_SIZE])
+        elapsed = time.perf_counter() - start
+        assert protocol.client.count == 1
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    for requests_count, result_size in ((40, 50_000), (40, 200_000), (80, 400_000)):
+        data = batch_response(requests_count, result_size)
+        legacy = bench(LegacyStratumProtocol, data)
+        current = bench(StratumProtocol, data)
+        print(
+            f"{len(data) / 1e6:6.1f} MB: legacy {legacy * 1000:8.1f} ms, "
+            f"current {current * 1000:8.1f} ms ({legacy / current:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
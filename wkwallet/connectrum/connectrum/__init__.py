@@ -1,4 +1,4 @@
 
-from .exc import ElectrumErrorResponse
+from .exc import ElectrumErrorResponse, ElectrumConnectionLost, ElectrumRequestTimeout
 
 __version__ = '0.8.1'
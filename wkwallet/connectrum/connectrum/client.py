@@ -16,18 +16,33 @@ else:
     have_aiosocks = False
 
 from collections import defaultdict
-from .exc import ElectrumErrorResponse
+from .exc import ElectrumErrorResponse, ElectrumConnectionLost, ElectrumRequestTimeout
 import logging
 
 logger = logging.getLogger('connectrum')
 
+# Requests of these methods must not be sent twice. If the connection is lost
+# before their response arrives, they fail instead of being re-sent.
+NON_IDEMPOTENT_METHODS = {'blockchain.transaction.broadcast', 'server.version'}
+
+# Seconds to wait for a response, unless configured for the method.
+DEFAULT_REQUEST_TIMEOUT = 60
+
+# Seconds to wait before each attempt to reconnect to the server.
+RECONNECT_DELAYS = (0, 1, 2, 4, 8)
+
 class StratumClient:
 
 
-    def __init__(self, loop=None):
+    def __init__(self, loop=None, timeouts=None,
+                        default_timeout=DEFAULT_REQUEST_TIMEOUT):
         '''
             Setup state needed to handle req/resp from a single Stratum server.
             Requires a transport (TransportABC) object to do the communication.
+
+            timeouts: optional dict of method name => seconds to wait for
+            its response, overriding default_timeout. A timeout of None
+            waits forever.
         '''
         self.protocol = None
 
@@ -35,6 +50,15 @@ class StratumClient:
         self.inflight = {}
         self.subscriptions = defaultdict(list)
 
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+
+        # req id => the protocol the request was sent on, None if not sent yet
+        self.sent_on = {}
+        self.timeout_handles = {}
+        self.reconnect_task = None
+        self.disconnect_callback = None
+
         # report our version, honestly; and indicate we only understand 1.4
         self.my_version_args = (f'Connectrum/{__version__}', '1.4')
 
@@ -66,6 +90,21 @@ class StratumClient:
             self.ka_task.cancel()
             self.ka_task = None
 
+        # the requests sent on the lost connection will never be answered:
+        # re-send the idempotent ones after reconnecting, fail the others.
+        for req_id, sent_protocol in list(self.sent_on.items()):
+            if sent_protocol is not protocol:
+                continue
+            msg, _ = self.inflight[req_id]
+            if self.is_idempotent(msg):
+                self.sent_on[req_id] = None
+            else:
+                self._fail_request(req_id, ElectrumConnectionLost(
+                                        "Connection lost before the response", msg))
+
+        if self.inflight:
+            self._start_reconnect()
+
     def close(self):
         if self.protocol:
             self.protocol.close()
@@ -73,6 +112,12 @@ class StratumClient:
         if self.ka_task:
             self.ka_task.cancel()
             self.ka_task = None
+        if self.reconnect_task:
+            self.reconnect_task.cancel()
+            self.reconnect_task = None
+
+        for req_id in list(self.inflight):
+            self._fail_request(req_id, ElectrumConnectionLost("Connection closed"))
 
 
     async def connect(self, server_info, proto_code=None, *,
@@ -173,6 +218,108 @@ class StratumClient:
         self.reconnect = _reconnect
         await self.reconnect()
 
+        # requests of the previous connection
+        self._resend_inflight()
+
+    def is_idempotent(self, msg):
+        '''
+            Whether a request (or a batch of them) can be safely sent again.
+        '''
+        msgs = msg if isinstance(msg, list) else [msg]
+        return all(m['method'] not in NON_IDEMPOTENT_METHODS for m in msgs)
+
+    def request_timeout(self, method):
+        return self.timeouts.get(method, self.default_timeout)
+
+    def _start_reconnect(self):
+        if self.reconnect is None:
+            # connect() was never called, nothing to reconnect to
+            return
+        if self.reconnect_task is None or self.reconnect_task.done():
+            self.reconnect_task = self.loop.create_task(self._reconnect_and_resend())
+
+    async def _reconnect_and_resend(self):
+        error = None
+        for delay in RECONNECT_DELAYS:
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                await self.reconnect()
+            except Exception as e:
+                logger.warning("Unable to reconnect to server: %s" % e)
+                error = e
+                continue
+            if self.protocol:
+                self._resend_inflight()
+                return
+
+        for req_id in list(self.inflight):
+            if self.sent_on.get(req_id) is None:
+                self._fail_request(req_id, ElectrumConnectionLost(
+                                        "Unable to reconnect to server: %s" % error))
+
+    def _resend_inflight(self):
+        for req_id, (msg, _) in list(self.inflight.items()):
+            if self.sent_on.get(req_id) is not self.protocol:
+                logger.debug("Re-sending request: %r" % msg)
+                # the server gets the full timeout to answer the new request
+                self._start_timeout(req_id)
+                self._send_msg(req_id, msg)
+
+    def _send_msg(self, req_id, msg):
+        '''
+            Send an in-flight request (or batch), reconnecting first if needed.
+        '''
+        if not self.protocol:
+            logger.debug("Need to reconnect to server")
+            self.sent_on[req_id] = None
+            self._start_reconnect()
+        else:
+            self.protocol.send_data(msg)
+            self.sent_on[req_id] = self.protocol
+
+    def _track_request(self, req_id, msg, fut):
+        '''
+            Remember an in-flight request until its response, or its timeout.
+        '''
+        self.inflight[req_id] = (msg, fut)
+        self._start_timeout(req_id)
+
+    def _start_timeout(self, req_id):
+        '''
+            (Re)start the timeout of an in-flight request.
+        '''
+        handle = self.timeout_handles.pop(req_id, None)
+        if handle:
+            handle.cancel()
+
+        msg, _ = self.inflight[req_id]
+        msgs = msg if isinstance(msg, list) else [msg]
+        timeouts = [self.request_timeout(m['method']) for m in msgs]
+        if None not in timeouts:
+            self.timeout_handles[req_id] = self.loop.call_later(
+                                    max(timeouts), self._request_timed_out, req_id)
+
+    def _pop_inflight(self, req_id):
+        inf = self.inflight.pop(req_id, None)
+        self.sent_on.pop(req_id, None)
+        handle = self.timeout_handles.pop(req_id, None)
+        if handle:
+            handle.cancel()
+        return inf
+
+    def _fail_request(self, req_id, exc):
+        inf = self._pop_inflight(req_id)
+        if inf:
+            _, fut = inf
+            if not fut.done():
+                fut.set_exception(exc)
+
+    def _request_timed_out(self, req_id):
+        msg, _ = self.inflight[req_id]
+        logger.warning("Request timed out: %r" % msg)
+        self._fail_request(req_id, ElectrumRequestTimeout("Request timed out", msg))
+
     async def get_server_version(self):
         # fetch version strings, save them
         # - can only be done once in v1.4
@@ -185,7 +332,10 @@ class StratumClient:
             pointless traffic.
         '''
         while self.protocol:
-            await self.RPC('server.ping')
+            try:
+                await self.RPC('server.ping')
+            except Exception as e:
+                logger.warning("Keepalive ping failed: %s" % e)
 
             # Docs now say "The server may disconnect clients that have sent
             # no requests for roughly 10 minutes" ... so use 5 minutes here
@@ -216,22 +366,13 @@ class StratumClient:
 
         fut = asyncio.Future(loop=self.loop)
 
-        self.inflight[req_id] = (msg, fut)
+        self._track_request(req_id, msg, fut)
 
         logger.debug(" REQ: %r" % msg)
 
-        # send it via the transport, which serializes it
-        if not self.protocol:
-            logger.debug("Need to reconnect to server")
-
-            async def connect_first():
-                await self.reconnect()
-                self.protocol.send_data(msg)
-
-            self.loop.create_task(connect_first())
-        else:
-            # typical case, send request immediatedly, response is a future
-            self.protocol.send_data(msg)
+        # send it via the transport, which serializes it. Typical case, send
+        # request immediately, response is a future
+        self._send_msg(req_id, msg)
 
         return fut if not is_subscribe else (fut, waitQ)
 
@@ -260,22 +401,13 @@ class StratumClient:
         fut = asyncio.Future(loop=self.loop)
         first_msg = full_msg[0]
 
-        self.inflight[first_msg['id']] = (full_msg, fut)
+        self._track_request(first_msg['id'], full_msg, fut)
 
         logger.debug(" REQ: %r" % full_msg)
 
-        # send it via the transport, which serializes it
-        if not self.protocol:
-            logger.debug("Need to reconnect to server")
-
-            async def connect_first():
-                await self.reconnect()
-                self.protocol.send_data(full_msg)
-
-            self.loop.create_task(connect_first())
-        else:
-            # typical case, send request immediately, response is a future
-            self.protocol.send_data(full_msg)
+        # send it via the transport, which serializes it. Typical case, send
+        # request immediately, response is a future
+        self._send_msg(first_msg['id'], full_msg)
 
         return fut
 
@@ -294,7 +426,7 @@ class StratumClient:
             inf = None
             for response in msg:
                 resp_id = response.get('id', None)
-                inf = self.inflight.pop(resp_id, None)
+                inf = self._pop_inflight(resp_id)
                 if inf:
                     break
 
@@ -314,16 +446,22 @@ class StratumClient:
                 response = response_map.get(req_id, None)
                 if not response:
                     logger.error("Incoming server message had missing ID: %s" % req_id)
+                    results.append(ElectrumErrorResponse('missing response', request))
+                    continue
 
+                # failures are returned in place of their results, batch_rpc()
+                # raises them unless the caller asked for them
                 error = response.get('error', None)
                 if error:
                     logger.info("Error response: '%s'" % error)
-                    rv.set_exception(ElectrumErrorResponse(error, request))
+                    results.append(ElectrumErrorResponse(error, request))
+                    continue
 
                 result = response.get('result')
                 results.append(result)
 
-            rv.set_result(results)
+            if not rv.done():
+                rv.set_result(results)
             return
 
         resp_id = msg.get('id', None)
@@ -350,13 +488,15 @@ class StratumClient:
         result = msg.get('result')
 
         # fetch and forget about the request
-        inf = self.inflight.pop(resp_id)
+        inf = self._pop_inflight(resp_id)
         if not inf:
             logger.error("Incoming server message had unknown ID in it: %s" % resp_id)
             return
 
-        # it's a future which is done now
+        # it's a future which is done now, unless the caller gave up on it
         req, rv = inf
+        if rv.done():
+            return
 
         if 'error' in msg:
             err = msg['error']
@@ -385,7 +525,7 @@ class StratumClient:
 
         return self._send_request(method, params)
 
-    def batch_rpc(self, requests):
+    def batch_rpc(self, requests, return_exceptions=False):
         '''
             Perform a batch of remote commands.
 
@@ -397,14 +537,26 @@ class StratumClient:
             .. and sometimes take arguments, all of which are positional.
 
             Returns a future which will you should await for the list of results for each command
-            from the server. Failures are returned as exceptions.
+            from the server. Failures are returned as exceptions, unless return_exceptions is
+            True, in which case they are returned as ElectrumErrorResponse instances in place
+            of their results.
         '''
         for request in requests:
             assert isinstance(request, tuple)
             method, *params = request
             assert '.' in method
 
-        return self._send_batch_requests(requests)
+        fut = self._send_batch_requests(requests)
+        if return_exceptions:
+            return fut
+        return self.loop.create_task(self._raise_batch_errors(fut))
+
+    async def _raise_batch_errors(self, fut):
+        results = await fut
+        for result in results:
+            if isinstance(result, ElectrumErrorResponse):
+                raise result
+        return results
 
     def patch_addr_methods(self, method, params):
         # blockchain.address.get_balance(addr) => blockchain.scripthash.get_balance(sh)
@@ -439,6 +591,25 @@ class StratumClient:
         assert method.endswith('subscribe')
         return self._send_request(method, params, is_subscribe=True)
 
+    def subscription_queue(self, method):
+        '''
+            Listen to the notifications of a subscription method without
+            sending any request.
+
+            Useful when the subscriptions themselves are sent in batches
+            with batch_rpc(), since the server sends all the notifications
+            of a method (ie. blockchain.scripthash.subscribe) on the same
+            channel.
+
+            Returns an asyncio.Queue which will receive the params of each
+            notification.
+        '''
+        assert '.' in method
+        assert method.endswith('subscribe')
+        waitQ = asyncio.Queue()
+        self.subscriptions[method].append(waitQ)
+        return waitQ
+
 
 if __name__ == '__main__':
     from transport import SocketTransport
@@ -5,3 +5,15 @@
 
 class ElectrumErrorResponse(RuntimeError):
     pass
+
+
+class ElectrumConnectionLost(ConnectionError):
+    '''
+        The connection was lost before the response of a request which
+        can not be safely re-sent was received.
+    '''
+    pass
+
+
+class ElectrumRequestTimeout(TimeoutError):
+    pass
@@ -3,15 +3,41 @@
 #
 #
 import asyncio, json
+from importlib import util as importutil
 import logging
 
 logger = logging.getLogger('connectrum')
 
+# Use orjson to decode responses if it's present, it's several times faster
+# than the json module on large batch responses.
+if importutil.find_spec("orjson") is not None:
+    import orjson
+    default_json_decoder = orjson.loads
+else:
+    default_json_decoder = json.loads
+
+
+def set_json_decoder(decoder):
+    '''
+        Replace the function decoding each JSON message received from the
+        server. It's given the message as a str, and returns the object.
+    '''
+    StratumProtocol.json_decoder = staticmethod(decoder)
+
+
 class StratumProtocol(asyncio.Protocol):
     client = None
     closed = False
     transport = None
-    buf = b""
+
+    json_decoder = staticmethod(default_json_decoder)
+
+    def __init__(self):
+        # Received data not unframed yet. Everything before scan_pos is known
+        # not to contain a newline, so it's not scanned again when a large
+        # message arrives in many chunks.
+        self.buf = bytearray()
+        self.scan_pos = 0
 
     def connection_made(self, transport):
         self.transport = transport
@@ -24,35 +50,54 @@ class StratumProtocol(asyncio.Protocol):
             self.client._connection_lost(self)
 
     def data_received(self, data):
-        self.buf += data
+        buf = self.buf
+        buf += data
 
-        # Unframe the mesage. Expecting JSON.
-        *lines, self.buf = self.buf.split(b'\n')
+        # Unframe the mesages. Expecting JSON, one per line.
+        start = 0
+        with memoryview(buf) as view:
+            while True:
+                end = buf.find(b'\n', self.scan_pos)
+                if end < 0:
+                    break
+                with view[start:end] as line:
+                    start = self.scan_pos = end + 1
+                    if not self.handle_line(line):
+                        return
 
-        for line in lines:
-            if not line: continue
+        # Drop the consumed lines, the rest has been scanned already.
+        del buf[:start]
+        self.scan_pos = len(buf)
 
-            try:
-                msg = line.decode('utf-8', "error").strip()
-            except UnicodeError as exc:
-                logger.exception("Encoding issue on %r" % line)
-                self.connection_lost(exc)
-                return
+    def handle_line(self, line):
+        '''
+            Decode and dispatch one framed message. Returns False if the
+            connection had to be dropped.
+        '''
+        try:
+            msg = str(line, 'utf-8')
+        except UnicodeError as exc:
+            logger.exception("Encoding issue on %r" % bytes(line))
+            self.connection_lost(exc)
+            return False
 
-            try:
-                msg = json.loads(msg)
-            except ValueError as exc:
-                logger.exception("Bad JSON received from server: %r" % msg)
-                self.connection_lost(exc)
-                return
+        if not msg or msg.isspace():
+            return True
 
-            #logger.debug("RX:\n%s", json.dumps(msg, indent=2))
+        try:
+            msg = self.json_decoder(msg)
+        except ValueError as exc:
+            logger.exception("Bad JSON received from server: %r" % msg)
+            self.connection_lost(exc)
+            return False
 
-            try:
-                self.client._got_response(msg)
-            except Exception as e:
-                logger.exception("Trouble handling response! (%s)" % e)
-                continue
+        #logger.debug("RX:\n%s", json.dumps(msg, indent=2))
+
+        try:
+            self.client._got_response(msg)
+        except Exception as e:
+            logger.exception("Trouble handling response! (%s)" % e)
+        return True
 
     def send_data(self, message):
         '''
@@ -1,45 +1,60 @@
+from functools import cached_property
 from typing import Dict
 
 from kivy.logger import Logger
+from model.address_deriver import AddressDeriver
 from model.script_type import ScriptType, script_types
-from peewee import BlobField, CharField, ForeignKeyField, IntegerField
+from peewee import BlobField, CharField, IntegerField
 from pycoin.symbols.btc import network as BTC
 
 from .base_model import BaseModel
+from .identity_map import IdentityMapForeignKeyField
 from .wallet_data import WalletData
 
 
 class AccountData(BaseModel):
-    wallet = ForeignKeyField(WalletData, backref="accounts")
+    wallet = IdentityMapForeignKeyField(WalletData, backref="accounts")
 
     account_index = IntegerField()
     xpub = CharField()
     master_fingerprint = BlobField(default=b"\x00\x00\x00\x00")
     origin_path = CharField(default="84p/0p/0p")
 
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
+    # The parsed xpub, its script types and its deriver are built on their first use:
+    # an account is instantiated for every row selected, see db.identity_map.
+    @cached_property
+    def master_pub_key(self):
+        return BTC.parse(self.xpub)
 
-        self.master_pub_key = BTC.parse(self.xpub)
-        self.chain_script_type: Dict[int, ScriptType] = {}
+    @cached_property
+    def chain_script_type(self) -> Dict[int, ScriptType]:
+        chain_script_type = {}
         for chain_data in self.chains:
-            self.chain_script_type[chain_data.chain_index] = script_types[
+            chain_script_type[chain_data.chain_index] = script_types[
                 chain_data.script_type_name
             ]
             if self.wallet.has_fidelity_bonds:
-                self.chain_script_type[2] = ScriptType.WSH_FB
+                chain_script_type[2] = ScriptType.WSH_FB
+        return chain_script_type
+
+    @cached_property
+    def address_deriver(self) -> AddressDeriver:
+        return AddressDeriver(self.master_pub_key, self.chain_script_type)
+
+    def reset_chain_script_types(self) -> None:
+        """
+        Build the script types and the deriver again, once the chains or the fidelity
+        bonds of the wallet changed.
+        """
+        self.__dict__.pop("chain_script_type", None)
+        self.__dict__.pop("address_deriver", None)
 
     def script_object(
         self,
         chain_index: int,
         addr_index: int,
     ) -> ScriptType.BaseScriptType:
-        if not chain_index in self.chain_script_type:
-            return None
-
-        script_type = self.chain_script_type[chain_index]
-        key = self.master_pub_key.subkey_for_path(f"{chain_index}/{addr_index}")
-        return script_type(key, addr_index)
+        return self.address_deriver.script_object(chain_index, addr_index)
 
     def addr_str(self, chain_index: int, addr_index: int) -> str:
         script_object = self.script_object(chain_index, addr_index)
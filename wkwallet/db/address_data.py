@@ -1,13 +1,26 @@
-from peewee import BooleanField, CharField, DateTimeField, ForeignKeyField, IntegerField
+from model.key_cache import key_cache
+from peewee import BooleanField, CharField, DateTimeField, IntegerField
 
 from .account_data import AccountData
 from .base_model import BaseModel
+from .identity_map import IdentityMapForeignKeyField
 from .wallet_data import WalletData
 
 
 class AddressData(BaseModel):
-    wallet = ForeignKeyField(WalletData, backref="addresses", on_delete="CASCADE")
-    account = ForeignKeyField(AccountData, backref="addresses", on_delete="CASCADE")
+    class Meta:
+        indexes = (
+            (("wallet", "address_str"), False),
+            (("wallet", "script_hash"), False),
+            (("wallet", "account_index", "chain_index", "address_index"), False),
+        )
+
+    wallet = IdentityMapForeignKeyField(
+        WalletData, backref="addresses", on_delete="CASCADE"
+    )
+    account = IdentityMapForeignKeyField(
+        AccountData, backref="addresses", on_delete="CASCADE"
+    )
     address_str = CharField()
     script_hash = CharField()
 
@@ -19,6 +32,8 @@ class AddressData(BaseModel):
 
     label = CharField(default="")
     status = CharField(default="")
+    # The Electrum status hash of the address history when it was last fetched.
+    status_hash = CharField(null=True)
 
     is_active = BooleanField(default=False)
 
@@ -38,10 +53,19 @@ class AddressData(BaseModel):
 
     @property
     def private_key(self):
-        if self.account.wallet.seed_data is None:
+        wallet_data = self.account.wallet
+        if wallet_data.seed_data_id is None:
             return None
 
+        # The SeedData row is only loaded if the keys of the seed aren't cached.
         script_type = self.account.chain_script_type[self.chain_index]
-        return self.account.wallet.seed_data.root_key.subkey_for_path(
-            script_type.derivation_path()
-        ).subkey_for_path(f"{self.account_index}p/{self.path}")
+        return (
+            key_cache()
+            .account_key(
+                wallet_data.seed_data_id,
+                lambda: wallet_data.seed_data.mnemonic,
+                script_type.derivation_path(),
+                self.account_index,
+            )
+            .subkey_for_path(self.path)
+        )
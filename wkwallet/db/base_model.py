@@ -1,6 +1,30 @@
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
 from peewee import Database, DatabaseProxy, Model
 
-_main_database_proxy = DatabaseProxy()
+
+class ReadRoutingDatabaseProxy(DatabaseProxy):
+    """
+    The database of the models. In the threads running pooled_reads(), the queries go
+    to read_obj, the read-only connection pool, instead of obj.
+    """
+
+    __slots__ = ("obj", "_callbacks", "read_obj", "_local")
+
+    def __init__(self):
+        self.read_obj = None
+        self._local = threading.local()
+        super().__init__()
+
+    def __getattr__(self, attr):
+        if self.read_obj is not None and getattr(self._local, "reading", False):
+            return getattr(self.read_obj, attr)
+        return super().__getattr__(attr)
+
+
+_main_database_proxy = ReadRoutingDatabaseProxy()
 
 
 class BaseModel(Model):
@@ -8,5 +32,32 @@ class BaseModel(Model):
         database = _main_database_proxy
 
 
-def setup_database_proxy(database: Database):
+def setup_database_proxy(database: Database, read_database: Optional[Database] = None):
+    _main_database_proxy.read_obj = read_database
     _main_database_proxy.initialize(database)
+
+
+@contextmanager
+def pooled_reads():
+    """
+    Run the queries of the calling thread on a connection of the read pool, so that
+    the UI isn't blocked by the writes of the refreshes. The connection is returned to
+    the pool at the end.
+
+    The queries only see the committed rows, and can't write. Without read pool (an
+    in-memory database), they run on the main database.
+    """
+    local = _main_database_proxy._local
+    read_database = _main_database_proxy.read_obj
+    if read_database is None or getattr(local, "reading", False):
+        yield
+        return
+
+    connected = read_database.connect(reuse_if_open=True)
+    local.reading = True
+    try:
+        yield
+    finally:
+        local.reading = False
+        if connected:
+            read_database.close()
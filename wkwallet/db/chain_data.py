@@ -1,11 +1,14 @@
-from peewee import CharField, ForeignKeyField, IntegerField
+from peewee import CharField, IntegerField
 
 from .account_data import AccountData
 from .base_model import BaseModel
+from .identity_map import IdentityMapForeignKeyField
 
 
 class ChainData(BaseModel):
-    account = ForeignKeyField(AccountData, backref="chains", on_delete="CASCADE")
+    account = IdentityMapForeignKeyField(
+        AccountData, backref="chains", on_delete="CASCADE"
+    )
 
     chain_index = IntegerField()
     script_type_name = CharField()
@@ -1,31 +1,70 @@
-from typing import List, Set
+from pathlib import Path
+from typing import List
 
 from peewee import Model, SqliteDatabase
-from playhouse.sqliteq import SqliteQueueDatabase
-
+from playhouse.pool import PooledSqliteDatabase
 
 from .account_data import AccountData
 from .address_data import AddressData
 from .base_model import setup_database_proxy
 from .block_data import BlockData
 from .chain_data import ChainData
+from .identity_map import identity_map
+from .migrations import migrate_database
+from .raw_tx_data import RawTxData
+from .raw_tx_store import RawTxStore, setup_raw_tx_store
 from .seed_data import SeedData
 from .tx_data import TxData
 from .utxo_data import UTXOData
 from .wallet_data import WalletData
+from .wallet_snapshot import WalletGenerationData, WalletSnapshotData
+from .write_behind_buffer import (
+    FLUSH_INTERVAL,
+    WriteBehindBuffer,
+    setup_write_behind_buffer,
+)
 
 DB_LOCATION_MEMORY = ":memory:"
 
+# With the WAL journal, the readers don't wait for the writer, nor the writer for the
+# readers. synchronous=normal only syncs the WAL at the checkpoints, it can't corrupt
+# the database.
+DB_PRAGMAS = (
+    ("journal_mode", "wal"),
+    ("synchronous", "normal"),
+    ("cache_size", -8000),  # KiB
+    ("mmap_size", 64 * 1024 * 1024),
+)
+READ_PRAGMAS = (
+    ("cache_size", -4000),  # KiB
+    ("mmap_size", 64 * 1024 * 1024),
+)
+# The read-only connections of the UI queries, see base_model.pooled_reads.
+READ_POOL_SIZE = 4
+# Seconds to wait for a free read connection.
+READ_POOL_TIMEOUT = 10
+
 
 class DatabaseRepo:
-    def __init__(self, path_to_db, use_queued_db=False) -> None:
-        if use_queued_db:
-            self.db = SqliteQueueDatabase(path_to_db)
-        else:
+    def __init__(self, path_to_db) -> None:
+        if path_to_db == DB_LOCATION_MEMORY:
             self.db = SqliteDatabase(path_to_db)
-        setup_database_proxy(self.db)
-
-        self.db.create_tables(
+            self.read_db = None
+        else:
+            self.db = SqliteDatabase(path_to_db, pragmas=DB_PRAGMAS)
+            self.read_db = PooledSqliteDatabase(
+                f"{Path(path_to_db).resolve().as_uri()}?mode=ro",
+                uri=True,
+                pragmas=READ_PRAGMAS,
+                max_connections=READ_POOL_SIZE,
+                timeout=READ_POOL_TIMEOUT,
+                check_same_thread=False,
+            )
+        setup_database_proxy(self.db, self.read_db)
+        # The objects of the previous database.
+        identity_map().clear()
+        migrate_database(
+            self.db,
             [
                 BlockData,
                 UTXOData,
@@ -35,10 +74,21 @@ class DatabaseRepo:
                 ChainData,
                 AddressData,
                 TxData,
-            ]
+                RawTxData,
+                WalletGenerationData,
+                WalletSnapshotData,
+            ],
+        )
+        # The saves of the refreshes are batched by the write behind buffer, whose
+        # thread is the writer of the refreshes. An in-memory database is only visible
+        # to the thread that created it.
+        self.write_behind_buffer = WriteBehindBuffer(
+            self.db,
+            flush_interval=None if path_to_db == DB_LOCATION_MEMORY else FLUSH_INTERVAL,
         )
-        self.pending_objects_to_save: Set[Model] = set()
-        self.pending_objects_to_delete: Set[Model] = set()
+        setup_write_behind_buffer(self.write_behind_buffer)
+        self.raw_tx_store = RawTxStore()
+        setup_raw_tx_store(self.raw_tx_store)
 
     def is_connected(self) -> bool:
         return self.db.is_connection_usable()
@@ -51,7 +101,7 @@ class DatabaseRepo:
 
     def add_wallet(self) -> WalletData:
         wallet_data = WalletData()
-        self.pending_objects_to_save.add(wallet_data)
+        self.write_behind_buffer.save(wallet_data)
         return wallet_data
 
     def add_account(self, wallet_data, account_index, xpub) -> AccountData:
@@ -61,21 +111,14 @@ class DatabaseRepo:
         account_data = AccountData(
             wallet=wallet_data, account_index=account_index, xpub=xpub
         )
-        self.pending_objects_to_save.add(account_data)
+        self.write_behind_buffer.save(account_data)
         return account_data
 
     def update(self, data_to_update: Model):
-        self.pending_objects_to_save.add(data_to_update)
+        self.write_behind_buffer.save(data_to_update)
 
     def delete(self, data_to_delete: Model):
-        self.pending_objects_to_delete.add(data_to_delete)
+        self.write_behind_buffer.delete(data_to_delete)
 
     def commit(self):
-        with self.db.atomic():
-            for pending_object in self.pending_objects_to_save:
-                pending_object.save()
-            self.pending_objects_to_save.clear()
-
-            for pending_object in self.pending_objects_to_delete:
-                pending_object.delete_instance(recursive=True, delete_nullable=True)
-            self.pending_objects_to_delete.clear()
+        self.write_behind_buffer.flush()
@@ -0,0 +1,101 @@
+import math
+import struct
+from collections import namedtuple
+from typing import List, Optional, Tuple
+
+# previous_hash is the tx_id of the spent tx.
+DecodedTxIn = namedtuple("DecodedTxIn", ["previous_hash", "previous_index"])
+
+_OUTPOINT = struct.Struct("<32sI")
+_TX_OUT_HEADER = struct.Struct("<QI")
+
+
+class DecodedTxOut(namedtuple("DecodedTxOut", ["coin_value", "script"])):
+    __slots__ = ()
+
+    def puzzle_script(self) -> bytes:
+        return self.script
+
+
+class DecodedTx:
+    """
+    The parts of a tx used to list and classify it: the outpoints it spends, its
+    outputs, its vsize, its size in bytes and its fee when known. `txs_in` and `txs_out`
+    can be used in place of the ones of a pycoin Tx. It's stored along with the raw tx,
+    see db.raw_tx_store.
+    """
+
+    __slots__ = ("txs_in", "txs_out", "vsize", "fee", "size")
+
+    def __init__(
+        self,
+        txs_in: List[DecodedTxIn],
+        txs_out: List[DecodedTxOut],
+        vsize: int,
+        fee: Optional[int] = None,
+        size: Optional[int] = None,
+    ) -> None:
+        self.txs_in = txs_in
+        self.txs_out = txs_out
+        self.vsize = vsize
+        self.fee = fee
+        self.size = size
+
+    @classmethod
+    def from_tx(cls, tx) -> "DecodedTx":
+        """
+        Decode a pycoin Tx.
+        """
+        txs_in = [
+            DecodedTxIn(str(tx_in.previous_hash), tx_in.previous_index)
+            for tx_in in tx.txs_in
+        ]
+        txs_out = [
+            DecodedTxOut(tx_out.coin_value, tx_out.puzzle_script())
+            for tx_out in tx.txs_out
+        ]
+        size = len(tx.as_bin())
+        weight = 3 * len(tx.as_bin(include_witness_data=False)) + size
+        return cls(txs_in, txs_out, math.ceil(weight / 4), size=size)
+
+    def pack(self) -> Tuple[bytes, bytes]:
+        inputs = b"".join(
+            _OUTPOINT.pack(
+                bytes.fromhex(tx_in.previous_hash)[::-1], tx_in.previous_index
+            )
+            for tx_in in self.txs_in
+        )
+        outputs = b"".join(
+            _TX_OUT_HEADER.pack(tx_out.coin_value, len(tx_out.script)) + tx_out.script
+            for tx_out in self.txs_out
+        )
+        return inputs, outputs
+
+    @classmethod
+    def unpack(
+        cls,
+        inputs: bytes,
+        outputs: bytes,
+        vsize: int,
+        fee: Optional[int] = None,
+        size: Optional[int] = None,
+    ) -> "DecodedTx":
+        txs_in = [
+            DecodedTxIn(previous_hash[::-1].hex(), previous_index)
+            for previous_hash, previous_index in _OUTPOINT.iter_unpack(inputs)
+        ]
+        txs_out = []
+        offset = 0
+        while offset < len(outputs):
+            coin_value, script_length = _TX_OUT_HEADER.unpack_from(outputs, offset)
+            offset += _TX_OUT_HEADER.size
+            txs_out.append(
+                DecodedTxOut(
+                    coin_value, bytes(outputs[offset : offset + script_length])
+                )
+            )
+            offset += script_length
+        return cls(txs_in, txs_out, vsize, fee, size)
+
+    def total_out(self) -> int:
+        return sum(tx_out.coin_value for tx_out in self.txs_out)
@@ -0,0 +1,80 @@
+import threading
+from typing import Dict, Optional, Tuple, Type
+
+from peewee import ForeignKeyAccessor, ForeignKeyField, Model
+
+
+class IdentityMap:
+    """
+    The model objects of the session, one per row, indexed by model and primary key.
+
+    The foreign keys declared with IdentityMapForeignKeyField return the object of the
+    map instead of selecting a new one on their first access: the account of an address
+    is the AccountData with its parsed xpub, the wallet of a tx is the WalletData of
+    the opened Wallet. A row not in the map is selected once, then added.
+
+    The map is cleared with the database (DatabaseRepo). The objects of the deleted
+    rows must be removed.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._objs: Dict[Tuple[Type[Model], int], Model] = {}
+
+    def get(self, model: Type[Model], pk: int) -> Optional[Model]:
+        with self._lock:
+            return self._objs.get((model, pk))
+
+    def add(self, obj: Model) -> Model:
+        """
+        Add obj, unless the map has an object for its row already. Return the object of
+        the map.
+        """
+        if obj._pk is None:
+            raise ValueError(f"{obj!r} isn't saved")
+        with self._lock:
+            return self._objs.setdefault((type(obj), obj._pk), obj)
+
+    def get_or_select(self, model: Type[Model], pk: int) -> Model:
+        obj = self.get(model, pk)
+        if obj is None:
+            obj = self.add(model.get_by_id(pk))
+        return obj
+
+    def remove(self, obj: Model) -> None:
+        with self._lock:
+            if self._objs.get((type(obj), obj._pk)) is obj:
+                del self._objs[(type(obj), obj._pk)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._objs.clear()
+
+
+class IdentityMapForeignKeyAccessor(ForeignKeyAccessor):
+    def get_rel_instance(self, instance):
+        value = instance.__data__.get(self.name)
+        if value is not None and self.name not in instance.__rel__:
+            instance.__rel__[self.name] = identity_map().get_or_select(
+                self.rel_model, value
+            )
+        return super().get_rel_instance(instance)
+
+
+class IdentityMapForeignKeyField(ForeignKeyField):
+    """
+    A foreign key to the primary key of rel_model, dereferenced through the identity
+    map.
+    """
+
+    accessor_class = IdentityMapForeignKeyAccessor
+
+
+_identity_map = None
+
+
+def identity_map() -> IdentityMap:
+    global _identity_map
+    if not _identity_map:
+        _identity_map = IdentityMap()
+    return _identity_map
@@ -0,0 +1,180 @@
+from typing import Callable, List
+
+from kivy.logger import Logger
+from peewee import BlobField, CharField, Database, Field, Model, ModelIndex
+from playhouse.migrate import SqliteMigrator, migrate
+from pycoin.symbols.btc import network as BTC
+
+from .address_data import AddressData
+from .decoded_tx_data import DecodedTx
+from .raw_tx_data import RawTxData
+from .tx_data import TxData
+from .utxo_data import UTXOData
+from .wallet_data import WalletData
+from .wallet_snapshot import create_generation_triggers
+
+# A migration brings the schema of a database to the next version. The version of a
+# database is stored in its user_version pragma.
+#
+# A new database gets the current schema from create_tables, so a migration doesn't
+# run on it: every column and index it adds is declared on the models too, and its
+# triggers are created along with the tables, see migrate_database.
+Migration = Callable[[Database], None]
+
+
+def add_columns(db: Database, *fields: Field) -> None:
+    """
+    Add the columns of `fields`, skipping the ones that exist. The development versions
+    of the app added the new columns on each start, before the migrations.
+    """
+    migrator = SqliteMigrator(db)
+    operations = []
+    for field in fields:
+        table_name = field.model._meta.table_name
+        existing_columns = {column.name for column in db.get_columns(table_name)}
+        if field.column_name not in existing_columns:
+            operations.append(migrator.add_column(table_name, field.column_name, field))
+    migrate(*operations)
+
+
+def add_index(db: Database, *fields: Field) -> None:
+    """
+    Add a non-unique index on `fields`, named like the ones of the models Meta.indexes.
+    """
+    db.execute(ModelIndex(fields[0].model, fields, safe=True))
+
+
+def dropped_field(model: Model, name: str, field: Field) -> Field:
+    """
+    The field of a column dropped from `model` by a migration, for the migrations
+    before it.
+    """
+    field.bind(model, name, set_attribute=False)
+    return field
+
+
+# The raw tx of the TxData, as hex then as bytes. Moved to RawTxData.
+_TX_HEX = dropped_field(TxData, "hex", CharField(null=True))
+_TX_RAW = dropped_field(TxData, "raw", BlobField(null=True))
+
+
+def _add_status_hash_and_coinjoin_columns(db: Database) -> None:
+    add_columns(db, AddressData.status_hash, TxData.cj_value, TxData.cj_count)
+
+
+def _store_raw_txs_as_blobs(db: Database) -> None:
+    add_columns(db, _TX_RAW)
+    for tx_data_id, tx_hex in (
+        TxData.select(TxData.id, _TX_HEX)
+        .where(_TX_RAW.is_null() & _TX_HEX.is_null(False))
+        .tuples()
+    ):
+        TxData.update({_TX_RAW: bytes.fromhex(tx_hex), _TX_HEX: None}).where(
+            TxData.id == tx_data_id
+        ).execute()
+
+
+def _add_history_backfill_height(db: Database) -> None:
+    add_columns(db, WalletData.history_backfill_height)
+
+
+def _add_lookup_indexes(db: Database) -> None:
+    add_index(db, AddressData.wallet, AddressData.address_str)
+    add_index(db, AddressData.wallet, AddressData.script_hash)
+    add_index(
+        db,
+        AddressData.wallet,
+        AddressData.account_index,
+        AddressData.chain_index,
+        AddressData.address_index,
+    )
+    add_index(db, TxData.wallet, TxData.tx_id)
+    add_index(db, TxData.wallet, TxData.height)
+    add_index(db, TxData.wallet, TxData.is_processed, TxData.height, TxData.tx_id)
+    add_index(db, UTXOData.tx, UTXOData.address)
+
+
+def _move_raw_txs_to_raw_tx_data(db: Database) -> None:
+    """
+    Store the raw txs of the wallets once by tx_id in RawTxData, along with their
+    decoded txs, which were in the DecodedTxData table. The txs without decoded tx
+    are decoded here, so that reading a tx never writes it.
+    """
+    RawTxData.insert_from(
+        TxData.select(TxData.tx_id, _TX_RAW).where(_TX_RAW.is_null(False)),
+        [RawTxData.tx_id, RawTxData.raw],
+    ).on_conflict_ignore().execute()
+    if db.table_exists("decodedtxdata"):
+        db.execute_sql(
+            'UPDATE "rawtxdata" SET ("inputs", "outputs", "vsize", "fee") = ('
+            'SELECT "d"."inputs", "d"."outputs", "d"."vsize", "d"."fee" '
+            'FROM "decodedtxdata" AS "d" JOIN "txdata" AS "t" ON "d"."tx_id" = "t"."id" '
+            'WHERE "t"."tx_id" = "rawtxdata"."tx_id" ORDER BY "d"."fee" IS NULL LIMIT 1)'
+        )
+        db.execute_sql('DROP TABLE "decodedtxdata"')
+    for tx_id, raw in (
+        RawTxData.select(RawTxData.tx_id, RawTxData.raw)
+        .where(RawTxData.inputs.is_null())
+        .tuples()
+        .iterator()
+    ):
+        decoded_tx = DecodedTx.from_tx(BTC.tx.from_bin(raw))
+        inputs, outputs = decoded_tx.pack()
+        RawTxData.update(inputs=inputs, outputs=outputs, vsize=decoded_tx.vsize).where(
+            RawTxData.tx_id == tx_id
+        ).execute()
+
+    migrator = SqliteMigrator(db)
+    migrate(
+        migrator.drop_column(TxData._meta.table_name, _TX_RAW.column_name),
+        migrator.drop_column(TxData._meta.table_name, _TX_HEX.column_name),
+    )
+
+
+def _add_generation_triggers(db: Database) -> None:
+    # The development versions of the app created them on each start, they may exist.
+    create_generation_triggers(db)
+
+
+# Append only: the version of a database is the count of migrations applied to it.
+MIGRATIONS: List[Migration] = [
+    _add_status_hash_and_coinjoin_columns,
+    _store_raw_txs_as_blobs,
+    _add_history_backfill_height,
+    _add_lookup_indexes,
+    _move_raw_txs_to_raw_tx_data,
+    _add_generation_triggers,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(db: Database) -> int:
+    return db.pragma("user_version")
+
+
+def migrate_database(db: Database, models: List[Model]) -> None:
+    """
+    Create the tables of `models` and apply the migrations missing from the database,
+    each in a transaction.
+    """
+    if not db.get_tables():
+        with db.atomic():
+            db.create_tables(models)
+            create_generation_triggers(db)
+            db.pragma("user_version", SCHEMA_VERSION)
+        return
+
+    # The tables introduced after the database was created, with their indexes.
+    db.create_tables([model for model in models if not model.table_exists()])
+
+    version = schema_version(db)
+    if version > SCHEMA_VERSION:
+        raise ValueError(
+            f"The database schema version {version} is newer than the app's "
+            f"{SCHEMA_VERSION}"
+        )
+    for version, migration in enumerate(MIGRATIONS[version:], version + 1):
+        Logger.info(f"DB: Migrating to schema version {version}")
+        with db.atomic():
+            migration(db)
+            db.pragma("user_version", version)
@@ -0,0 +1,21 @@
+from peewee import BlobField, CharField, IntegerField
+
+from .base_model import BaseModel
+
+
+class RawTxData(BaseModel):
+    """
+    A tx fetched by any of the wallets, stored once however many wallets it belongs
+    to, with its DecodedTx. The wallet specific data of the tx is in TxData. See
+    db.raw_tx_store.
+    """
+
+    tx_id = CharField(primary_key=True)
+    raw = BlobField()
+
+    # The DecodedTx, see DecodedTx.pack. The txs stored by the older versions without it
+    # are decoded by the migrations.
+    inputs = BlobField(null=True)
+    outputs = BlobField(null=True)
+    vsize = IntegerField(null=True)
+    fee = IntegerField(null=True)
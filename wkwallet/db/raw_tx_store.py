@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from peewee import fn
+from pycoin.symbols.btc import network as BTC
+
+from .decoded_tx_data import DecodedTx
+from .raw_tx_data import RawTxData
+
+# The decoded txs kept in memory, for all the wallets.
+MAX_DECODED_TXS = 5000
+
+
+class RawTxStore:
+    """
+    The raw txs of all the wallets, stored once by tx_id in RawTxData, and an LRU cache
+    of their DecodedTx shared by the tx managers of the wallets. A tx is fetched and
+    decoded once however many wallets it belongs to: its tx_id identifies it, it's
+    never stored again.
+    """
+
+    def __init__(self, max_decoded_txs: int = MAX_DECODED_TXS) -> None:
+        self._max_decoded_txs = max_decoded_txs
+        self._lock = threading.Lock()
+        # tx_id => DecodedTx, from the least recently used.
+        self._decoded_txs: "OrderedDict[str, DecodedTx]" = OrderedDict()
+
+    def contains(self, tx_id: str) -> bool:
+        return (
+            self._cached_decoded_tx(tx_id) is not None
+            or RawTxData.select().where(RawTxData.tx_id == tx_id).exists()
+        )
+
+    def add(self, tx_id: str, raw: bytes) -> DecodedTx:
+        """
+        Store the tx tx_id fetched as raw, unless it's stored already. Return its
+        DecodedTx.
+        """
+        decoded_tx = self.decoded_tx(tx_id)
+        if decoded_tx is not None:
+            return decoded_tx
+
+        decoded_tx = DecodedTx.from_tx(BTC.tx.from_bin(raw))
+        inputs, outputs = decoded_tx.pack()
+        RawTxData.insert(
+            tx_id=tx_id,
+            raw=raw,
+            inputs=inputs,
+            outputs=outputs,
+            vsize=decoded_tx.vsize,
+        ).on_conflict_ignore().execute()
+        self._cache_decoded_tx(tx_id, decoded_tx)
+        return decoded_tx
+
+    def raw(self, tx_id: str) -> Optional[bytes]:
+        return RawTxData.select(RawTxData.raw).where(RawTxData.tx_id == tx_id).scalar()
+
+    def decoded_tx(self, tx_id: str) -> Optional[DecodedTx]:
+        decoded_tx = self._cached_decoded_tx(tx_id)
+        if decoded_tx is None:
+            raw_tx_data = self._select_decoded().where(RawTxData.tx_id == tx_id).first()
+            if raw_tx_data is not None:
+                decoded_tx = self._decoded_tx_of(raw_tx_data)
+        return decoded_tx
+
+    def prefetch(self, tx_ids: Iterable[str]) -> None:
+        """
+        Load the decoded txs of tx_ids, a query of tx ids, in one query.
+        """
+        for raw_tx_data in self._select_decoded().where(RawTxData.tx_id.in_(tx_ids)):
+            self._decoded_tx_of(raw_tx_data)
+
+    def set_fee(self, tx_id: str, fee: int) -> None:
+        decoded_tx = self.decoded_tx(tx_id)
+        if decoded_tx is not None and decoded_tx.fee != fee:
+            decoded_tx.fee = fee
+            RawTxData.update(fee=fee).where(RawTxData.tx_id == tx_id).execute()
+
+    def delete_unreferenced(self, tx_ids: Iterable[str]) -> None:
+        """
+        Delete the txs not in tx_ids, the query of the tx ids of all the wallets.
+        """
+        RawTxData.delete().where(RawTxData.tx_id.not_in(tx_ids)).execute()
+        with self._lock:
+            self._decoded_txs.clear()
+
+    def _select_decoded(self):
+        return RawTxData.select(
+            RawTxData.tx_id,
+            RawTxData.inputs,
+            RawTxData.outputs,
+            RawTxData.vsize,
+            RawTxData.fee,
+            fn.LENGTH(RawTxData.raw).alias("size"),
+        )
+
+    def _decoded_tx_of(self, raw_tx_data: RawTxData) -> DecodedTx:
+        # The txs stored by older versions without DecodedTx are decoded by the
+        # migrations, see db.migrations.
+        decoded_tx = DecodedTx.unpack(
+            raw_tx_data.inputs,
+            raw_tx_data.outputs,
+            raw_tx_data.vsize,
+            raw_tx_data.fee,
+            raw_tx_data.size,
+        )
+        self._cache_decoded_tx(raw_tx_data.tx_id, decoded_tx)
+        return decoded_tx
+
+    def _cached_decoded_tx(self, tx_id: str) -> Optional[DecodedTx]:
+        with self._lock:
+            decoded_tx = self._decoded_txs.get(tx_id)
+            if decoded_tx is not None:
+                self._decoded_txs.move_to_end(tx_id)
+            return decoded_tx
+
+    def _cache_decoded_tx(self, tx_id: str, decoded_tx: DecodedTx) -> None:
+        with self._lock:
+            self._decoded_txs[tx_id] = decoded_tx
+            self._decoded_txs.move_to_end(tx_id)
+            while len(self._decoded_txs) > self._max_decoded_txs:
+                self._decoded_txs.popitem(last=False)
+
+
+_raw_tx_store: Optional[RawTxStore] = None
+
+
+def setup_raw_tx_store(store: RawTxStore) -> None:
+    global _raw_tx_store
+    _raw_tx_store = store
+
+
+def raw_tx_store() -> RawTxStore:
+    return _raw_tx_store
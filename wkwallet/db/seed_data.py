@@ -1,4 +1,4 @@
-from model.crypt_utils import mnemonic_to_root_key
+from model.key_cache import key_cache
 from peewee import CharField
 
 from .base_model import BaseModel
@@ -9,10 +9,10 @@ class SeedData(BaseModel):
     mnemonic = CharField()
     passphrase = CharField(null=True)
 
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self.__root_key = mnemonic_to_root_key(self.mnemonic)
-
     @property
     def root_key(self):
-        return self.__root_key
+        """
+        The root key, derived from the mnemonic the first time it's used in the
+        session, see model.key_cache.
+        """
+        return key_cache().root_key(self.id, lambda: self.mnemonic)
@@ -1,36 +1,67 @@
-from peewee import BooleanField, CharField, DateTimeField, ForeignKeyField, IntegerField
+from typing import Optional
+
+from peewee import BooleanField, CharField, DateTimeField, IntegerField
 from pycoin.symbols.btc import network as BTC
 
 from .base_model import BaseModel
+from .identity_map import IdentityMapForeignKeyField
+from .raw_tx_store import raw_tx_store
 from .wallet_data import WalletData
 
 
 class TxData(BaseModel):
-    wallet = ForeignKeyField(WalletData, backref="txs", on_delete="CASCADE")
+    class Meta:
+        indexes = (
+            (("wallet", "tx_id"), False),
+            (("wallet", "height"), False),
+            # The tx history pages, see model.tx_timeline.
+            (("wallet", "is_processed", "height", "tx_id"), False),
+        )
+
+    wallet = IdentityMapForeignKeyField(WalletData, backref="txs", on_delete="CASCADE")
     height = IntegerField(default=0)
     timestamp = DateTimeField(null=True)
+    # The raw tx and its DecodedTx are stored once for all the wallets, see
+    # db.raw_tx_store.
     tx_id = CharField()
 
-    hex = CharField(null=True)
-
     balance_change = IntegerField(default=0)
     is_processed = BooleanField(default=False)
 
     label = CharField(default="")
 
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self._tx_object = None
+    # The most common output value and its count, see model.coinjoin. cj_count is None
+    # until they are computed.
+    cj_value = IntegerField(null=True)
+    cj_count = IntegerField(null=True)
+
+    @property
+    def raw(self) -> Optional[bytes]:
+        return raw_tx_store().raw(self.tx_id)
 
     @property
     def tx_object(self):
-        if self.hex is None:
-            return None
+        """
+        The pycoin Tx, deserialized from the raw tx. Use `decoded_tx` when possible.
+        """
+        raw = self.raw
+        return BTC.tx.from_bin(raw) if raw is not None else None
+
+    @property
+    def decoded_tx(self):
+        """
+        The DecodedTx of the tx, None until the tx is fetched. The tx is only
+        deserialized once, when it's fetched.
+        """
+        return raw_tx_store().decoded_tx(self.tx_id)
+
+    @property
+    def fee(self) -> Optional[int]:
+        decoded_tx = self.decoded_tx
+        return decoded_tx.fee if decoded_tx else None
 
-        if self._tx_object is None:
-            Tx = BTC.tx
-            self._tx_object = Tx.from_hex(self.hex)
-        return self._tx_object
+    def set_fee(self, fee: int) -> None:
+        raw_tx_store().set_fee(self.tx_id, fee)
 
     def __gt__(self, other):
         return self.timestamp is None or (
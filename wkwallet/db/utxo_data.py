@@ -3,11 +3,15 @@ from peewee import ForeignKeyField, IntegerField
 from .account_data import AccountData
 from .address_data import AddressData
 from .base_model import BaseModel
+from .identity_map import IdentityMapForeignKeyField
 from .tx_data import TxData
 
 
 class UTXOData(BaseModel):
-    account = ForeignKeyField(AccountData, backref="utxos")
+    class Meta:
+        indexes = ((("tx", "address"), False),)
+
+    account = IdentityMapForeignKeyField(AccountData, backref="utxos")
     address = ForeignKeyField(AddressData, backref="utxos")
     tx = ForeignKeyField(TxData, backref="tx_outs", on_delete="CASCADE")
     tx_index = IntegerField()
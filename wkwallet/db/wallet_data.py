@@ -14,3 +14,6 @@ class WalletData(BaseModel):
     gap_limit = IntegerField(default=DEFAULT_GAP_LIMIT)
     completed_initial_sync = BooleanField(default=False)
     currency = CharField(default="sat")
+    # The height from which all the txs are parsed by the history backfill, see
+    # model.history_backfill. None until the first backfill.
+    history_backfill_height = IntegerField(null=True)
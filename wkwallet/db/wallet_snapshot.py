@@ -0,0 +1,254 @@
+import datetime
+import json
+import zlib
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+)
+
+from peewee import BlobField, Database, DateTimeField, Field, IntegerField, Model
+
+from .address_data import AddressData
+from .base_model import BaseModel
+from .identity_map import IdentityMapForeignKeyField
+from .tx_data import TxData
+from .wallet_data import WalletData
+
+# The version of the format of the snapshots. The snapshots of another version are
+# ignored.
+SNAPSHOT_VERSION = 1
+
+# The tables whose rows are in the snapshots. A write to a row of a wallet increments
+# its generation.
+_SNAPSHOT_TABLES = (AddressData, TxData)
+
+# The values of the fields of these classes are encoded in the JSON of the snapshots
+# by (encode, decode). The values of the other fields must be JSON values.
+_FIELD_CODECS: Dict[Type[Field], Tuple[Callable[[Any], Any], Callable[[Any], Any]]] = {
+    DateTimeField: (datetime.datetime.isoformat, datetime.datetime.fromisoformat),
+}
+_JSON_TYPES = (str, int, float, bool, type(None))
+
+
+class WalletGenerationData(BaseModel):
+    """
+    The count of the writes to the rows of a wallet in the snapshot tables since its
+    first snapshot, incremented by triggers, see create_generation_triggers.
+    """
+
+    wallet = IdentityMapForeignKeyField(
+        WalletData, primary_key=True, backref="generation", on_delete="CASCADE"
+    )
+    generation = IntegerField(default=0)
+
+
+class WalletSnapshotData(BaseModel):
+    """
+    The state loaded by a wallet on start, as of the generation of the wallet when it
+    was taken. See load_wallet_snapshot.
+    """
+
+    wallet = IdentityMapForeignKeyField(
+        WalletData, primary_key=True, backref="snapshot", on_delete="CASCADE"
+    )
+    version = IntegerField()
+    generation = IntegerField()
+    # The compressed JSON of the rows, see save_wallet_snapshot. The tx heights, whose
+    # size is the count of txs, are loaded separately by the tx manager.
+    data = BlobField()
+    tx_heights = BlobField()
+
+
+class WalletSnapshot(NamedTuple):
+    # The addresses loaded on start, with their balances.
+    addresses: List[AddressData]
+    # The first page of the tx history.
+    recent_txs: List[TxData]
+    generation: int
+
+
+def create_generation_triggers(db: Database) -> None:
+    """
+    Create the triggers incrementing the generation of a wallet on the writes to its
+    rows. They only update a generation row, which is created by the first snapshot of
+    the wallet, so they cost nothing to the wallets without snapshot.
+
+    They are part of the schema, created with the tables or by a migration, see
+    db.migrations.
+    """
+    for model in _SNAPSHOT_TABLES:
+        table_name = model._meta.table_name
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            trigger_name = f"{table_name}_{event.lower()}_generation"
+            db.execute_sql(
+                f'CREATE TRIGGER IF NOT EXISTS "{trigger_name}" '
+                f'AFTER {event} ON "{table_name}" BEGIN '
+                f'UPDATE "{WalletGenerationData._meta.table_name}" '
+                f'SET "generation" = "generation" + 1 '
+                f'WHERE "wallet_id" = {row}."wallet_id"; END'
+            )
+
+
+def wallet_generation(wallet_data: WalletData) -> Optional[int]:
+    return (
+        WalletGenerationData.select(WalletGenerationData.generation)
+        .where(WalletGenerationData.wallet == wallet_data)
+        .scalar()
+    )
+
+
+def save_wallet_snapshot(
+    wallet_data: WalletData,
+    addresses: Iterable[AddressData],
+    recent_txs: Iterable[TxData],
+) -> None:
+    """
+    Save the snapshot of the wallet, as of its current generation. Call it in a
+    transaction begun before `addresses` and `recent_txs` were read, so that no write
+    happens in between.
+    """
+    WalletGenerationData.insert(wallet=wallet_data).on_conflict_ignore().execute()
+    data = {
+        "addresses": _pack_rows(AddressData, addresses),
+        "recent_txs": _pack_rows(TxData, recent_txs),
+    }
+    tx_heights = list(
+        TxData.select(TxData.tx_id, TxData.height, TxData.is_processed)
+        .where(TxData.wallet == wallet_data)
+        .tuples()
+    )
+    WalletSnapshotData.replace(
+        wallet=wallet_data,
+        version=SNAPSHOT_VERSION,
+        generation=wallet_generation(wallet_data),
+        data=_compress(data),
+        tx_heights=_compress(tx_heights),
+    ).execute()
+
+
+def load_wallet_snapshot(wallet_data: WalletData) -> Optional[WalletSnapshot]:
+    """
+    The snapshot of the wallet, None if there is none, or if it's out of date: the rows
+    of the wallet have been written since it was taken, or its format or the columns
+    of its rows have changed.
+    """
+    snapshot_data = (
+        _select_current_snapshot(wallet_data, WalletSnapshotData.data)
+        .where(WalletSnapshotData.version == SNAPSHOT_VERSION)
+        .first()
+    )
+    if snapshot_data is None:
+        return None
+
+    data = _decompress(snapshot_data.data)
+    addresses = _unpack_rows(AddressData, data["addresses"])
+    recent_txs = _unpack_rows(TxData, data["recent_txs"])
+    if addresses is None or recent_txs is None:
+        return None
+    return WalletSnapshot(
+        addresses=addresses,
+        recent_txs=recent_txs,
+        generation=snapshot_data.generation,
+    )
+
+
+def load_snapshot_tx_heights(
+    wallet_data: WalletData, generation: int
+) -> Optional[List[Tuple[str, int, bool]]]:
+    """
+    (tx_id, height, is_processed) of all the txs of the wallet, from its snapshot of
+    `generation`. None if the wallet has been written since.
+    """
+    snapshot_data = (
+        _select_current_snapshot(wallet_data, WalletSnapshotData.tx_heights)
+        .where(WalletSnapshotData.generation == generation)
+        .first()
+    )
+    if snapshot_data is None:
+        return None
+    return [tuple(tx_height) for tx_height in _decompress(snapshot_data.tx_heights)]
+
+
+def _select_current_snapshot(wallet_data: WalletData, *fields):
+    return (
+        WalletSnapshotData.select(WalletSnapshotData.generation, *fields)
+        .join(
+            WalletGenerationData,
+            on=(WalletGenerationData.wallet == WalletSnapshotData.wallet),
+        )
+        .where(
+            (WalletSnapshotData.wallet == wallet_data)
+            & (WalletSnapshotData.generation == WalletGenerationData.generation)
+        )
+    )
+
+
+def _compress(data) -> bytes:
+    return zlib.compress(json.dumps(data).encode())
+
+
+def _decompress(data: bytes):
+    return json.loads(zlib.decompress(data))
+
+
+def _field_codec(field: Field):
+    for field_class, codec in _FIELD_CODECS.items():
+        if isinstance(field, field_class):
+            return codec
+    return None
+
+
+def _encode_value(field: Field, value):
+    codec = _field_codec(field)
+    if value is not None and codec is not None:
+        value = codec[0](value)
+    if not isinstance(value, _JSON_TYPES):
+        raise TypeError(
+            f"Unable to encode {field.model.__name__}.{field.name} in a snapshot: "
+            f"{type(value).__name__}"
+        )
+    return value
+
+
+def _decode_value(field: Field, value):
+    codec = _field_codec(field)
+    if value is not None and codec is not None:
+        value = codec[1](value)
+    return field.python_value(value)
+
+
+def _pack_rows(model: Type[Model], objs: Iterable[Model]) -> dict:
+    fields = model._meta.sorted_fields
+    return {
+        "columns": [field.column_name for field in fields],
+        "rows": [
+            [_encode_value(field, obj.__data__.get(field.name)) for field in fields]
+            for obj in objs
+        ],
+    }
+
+
+def _unpack_rows(model: Type[Model], packed: dict) -> Optional[List[Model]]:
+    # Like the rows of a select, see peewee.ModelObjectCursorWrapper.
+    fields = model._meta.sorted_fields
+    if packed["columns"] != [field.column_name for field in fields]:
+        return None
+    objs = []
+    for row in packed["rows"]:
+        obj = model(
+            __no_default__=1,
+            **{
+                field.name: _decode_value(field, value)
+                for field, value in zip(fields, row)
+            },
+        )
+        obj._dirty.clear()
+        objs.append(obj)
+    return objs
@@ -0,0 +1,274 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type
+
+from kivy.logger import Logger
+from peewee import Database, Model, chunked, fn, sort_models
+
+# Flush when this many objects are waiting to be saved, or when the oldest of them has
+# waited FLUSH_INTERVAL seconds.
+MAX_PENDING_SAVES = 500
+FLUSH_INTERVAL = 1.0
+# The rows per INSERT or UPDATE statement.
+BULK_BATCH_SIZE = 100
+
+
+def bulk_insert(model: Type[Model], objs: List[Model]) -> None:
+    """
+    Insert the new objects objs of model with insert_many, set their ids and clear their
+    dirty fields. The ids are assigned before the insert, following the largest id of
+    the table: run it in a transaction of the writer. A row inserted by another
+    connection meanwhile makes the insert fail, its id isn't reused.
+    """
+    if not objs:
+        return
+    pk_field = model._meta.primary_key
+    fields = model._meta.sorted_fields
+    next_id = (model.select(fn.MAX(pk_field)).scalar() or 0) + 1
+    for batch in chunked(objs, BULK_BATCH_SIZE):
+        rows = []
+        for obj in batch:
+            field_dict = obj.__data__.copy()
+            obj._populate_unsaved_relations(field_dict)
+            field_dict[pk_field.name] = next_id
+            next_id += 1
+            rows.append({field: field_dict.get(field.name) for field in fields})
+        model.insert_many(rows).execute()
+        for obj, row in zip(batch, rows):
+            obj._pk = row[pk_field]
+            obj._dirty.clear()
+
+
+class WriteBehindBuffer:
+    """
+    The unit of work of the model saves. The objects to save are kept until the buffer
+    is flushed, each once however many times it's saved, then written in a single
+    transaction: the new objects with insert_many and the others with bulk_update of
+    their dirty fields. The buffer is flushed by a background thread, after
+    FLUSH_INTERVAL seconds or when MAX_PENDING_SAVES objects are waiting, and by
+    flush(), which returns once everything saved before the call is written.
+
+    The writes that can't wait in the buffer, e.g. the inserts whose ids are needed
+    right away, are submitted with submit() to run on the same thread, so that the
+    network loop doesn't wait for the database. The thread is the single writer of the
+    app: the network loop and the UI save their objects or submit their writes.
+
+    With flush_interval None, there is no background thread: the buffer is only
+    flushed by flush(). An in-memory database is only visible to the thread that
+    created it.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        flush_interval: Optional[float] = FLUSH_INTERVAL,
+        max_pending_saves: int = MAX_PENDING_SAVES,
+    ) -> None:
+        self.db = db
+        self._flush_interval = flush_interval
+        self._max_pending_saves = max_pending_saves
+
+        # Guards the pending objects, and _flush_lock the writes.
+        self._lock = threading.Lock()
+        self._flush_lock = threading.RLock()
+        # id(obj) => obj, in the order they were first saved.
+        self._pending_saves: Dict[int, Model] = {}
+        self._pending_deletes: Dict[int, Model] = {}
+        self._pending_writes: List[Tuple[Callable[[], Any], Future]] = []
+
+        self._flush_requested = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending_saves) + len(self._pending_deletes)
+
+    def save(self, obj: Model) -> None:
+        with self._lock:
+            self._pending_deletes.pop(id(obj), None)
+            self._pending_saves[id(obj)] = obj
+            pending_count = len(self._pending_saves)
+        self._start_thread()
+        if pending_count >= self._max_pending_saves:
+            self._flush_requested.set()
+
+    def save_now(self, obj: Model) -> None:
+        """
+        Save obj in the calling thread, for the callers that need its id or its row
+        right away. An insert of obj can't be waiting in the buffer meanwhile.
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._pending_saves.pop(id(obj), None)
+            obj.save()
+
+    def submit(self, write: Callable[[], Any]) -> Future:
+        """
+        Run write() on the thread of the buffer, once the objects saved before the call
+        are written, and return the future of its result. Without background thread,
+        once the buffer is closed, or when called by a write, it runs in the calling
+        thread.
+        """
+        future = Future()
+        with self._lock:
+            self._pending_writes.append((write, future))
+        self._start_thread()
+        if (
+            self._thread is None
+            or self._closed
+            or threading.current_thread() is self._thread
+        ):
+            self._run_writes()
+        else:
+            self._flush_requested.set()
+        return future
+
+    def delete(self, obj: Model) -> None:
+        """
+        Delete obj and the rows referencing it, on the next flush.
+        """
+        with self._lock:
+            self._pending_saves.pop(id(obj), None)
+            self._pending_deletes[id(obj)] = obj
+        self._start_thread()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                saves = list(self._pending_saves.values())
+                deletes = list(self._pending_deletes.values())
+                self._pending_saves.clear()
+                self._pending_deletes.clear()
+                # The changes made from now on are saved by the next flush.
+                dirty_fields = {id(obj): set(obj._dirty) for obj in saves}
+                for obj in saves:
+                    obj._dirty.clear()
+            if not saves and not deletes:
+                return
+
+            inserted: List[Model] = []
+            try:
+                with self.db.atomic():
+                    self._write(saves, dirty_fields, inserted)
+                    for obj in deletes:
+                        obj.delete_instance(recursive=True, delete_nullable=True)
+            except Exception as e:
+                Logger.error(f"DB: Bulk save of {len(saves)} objects failed: {e}")
+                for obj in inserted:
+                    obj._pk = None
+                for obj in saves:
+                    obj._dirty |= dirty_fields[id(obj)]
+                self._save_one_by_one(saves, deletes)
+
+    def close(self) -> None:
+        self._closed = True
+        self._flush_requested.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        self._run_writes()
+
+    def _write(
+        self,
+        saves: List[Model],
+        dirty_fields: Dict[int, Set[str]],
+        inserted: List[Model],
+    ) -> None:
+        """
+        inserted: the objects given an id, to reset if the transaction is rolled back.
+        """
+        model_to_objs: Dict[Type[Model], List[Model]] = {}
+        for obj in saves:
+            model_to_objs.setdefault(type(obj), []).append(obj)
+
+        # The referenced rows first, so that the foreign keys of the objects inserted
+        # along with them are known.
+        for model in sort_models(model_to_objs):
+            objs = model_to_objs[model]
+            new_objs = [obj for obj in objs if obj._pk is None]
+            saved_objs = [obj for obj in objs if obj._pk is not None]
+            inserted += new_objs
+            bulk_insert(model, new_objs)
+            self._update(model, saved_objs, dirty_fields)
+
+    def _update(
+        self,
+        model: Type[Model],
+        objs: List[Model],
+        dirty_fields: Dict[int, Set[str]],
+    ) -> None:
+        # Group the objects by dirty fields, a bulk update sets the same fields.
+        fields_to_objs: Dict[frozenset, List[Model]] = {}
+        for obj in objs:
+            fields = frozenset(dirty_fields[id(obj)])
+            if fields:
+                fields_to_objs.setdefault(fields, []).append(obj)
+        for fields, fields_objs in fields_to_objs.items():
+            if len(fields_objs) == 1:
+                fields_objs[0].save(only=list(fields))
+            else:
+                model.bulk_update(
+                    fields_objs, fields=list(fields), batch_size=BULK_BATCH_SIZE
+                )
+
+    def _run_writes(self) -> None:
+        with self._lock:
+            writes, self._pending_writes = self._pending_writes, []
+        if not writes:
+            return
+        with self._flush_lock:
+            # The objects saved before the writes were submitted.
+            try:
+                self.flush()
+            except Exception as e:
+                Logger.error(f"DB: Flush failed: {e}")
+            for write, future in writes:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(write())
+                except Exception as e:
+                    future.set_exception(e)
+
+    def _save_one_by_one(self, saves: List[Model], deletes: List[Model]) -> None:
+        for obj in saves:
+            try:
+                obj.save()
+            except Exception as e:
+                Logger.error(f"DB: Unable to save {obj!r}: {e}")
+        for obj in deletes:
+            try:
+                obj.delete_instance(recursive=True, delete_nullable=True)
+            except Exception as e:
+                Logger.error(f"DB: Unable to delete {obj!r}: {e}")
+
+    def _start_thread(self) -> None:
+        if self._thread is not None or self._flush_interval is None or self._closed:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._flush_requested.wait(self._flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+                self._run_writes()
+            except Exception as e:
+                Logger.error(f"DB: Flush failed: {e}")
+
+
+_write_behind_buffer: Optional[WriteBehindBuffer] = None
+
+
+def setup_write_behind_buffer(buffer: WriteBehindBuffer) -> None:
+    global _write_behind_buffer
+    _write_behind_buffer = buffer
+
+
+def write_behind_buffer() -> WriteBehindBuffer:
+    return _write_behind_buffer
@@ -4,11 +4,14 @@
 """
 import asyncio
 import logging
-from time import sleep
+from collections import OrderedDict
+from time import monotonic, sleep
+from typing import Any, Dict, List, Optional, Tuple
 
 from connectrum.client import StratumClient, ElectrumErrorResponse
 from connectrum.svr_info import ServerInfo
 from kivy.logger import Logger
+from model.adaptive_window import AdaptiveRequestWindow
 from utils import create_async_io_background_loop
 
 # logging.getLogger("connectrum").setLevel("INFO")
@@ -22,6 +25,146 @@ HEADER_SUBSCRIBE_RPC = "blockchain.headers.subscribe"
 
 GET_BALANCE_RPC = "blockchain.scripthash.get_balance"
 GET_HISTORY_RPC = "blockchain.scripthash.get_history"
+SUBSCRIBE_SCRIPT_HASH_RPC = "blockchain.scripthash.subscribe"
+
+GET_TRANSACTION_RPC = "blockchain.transaction.get"
+GET_HEADER_RPC = "blockchain.block.header"
+GET_HEADERS_RPC = "blockchain.block.headers"
+SERVER_FEATURES_RPC = "server.features"
+
+# Seconds to wait for the response of a request before giving up on it. Requests
+# lost with the connection are re-sent on reconnect, so these only bound how long
+# a caller waits on an unresponsive server.
+DEFAULT_REQUEST_TIMEOUT = 30
+REQUEST_TIMEOUTS = {
+    "server.ping": 10,
+    "server.version": 10,
+    GET_HISTORY_RPC: 60,
+    # Up to 2016 headers per request.
+    GET_HEADERS_RPC: 60,
+}
+
+
+# Seconds the results of these methods are cached, None for as long as they're used.
+# Their results are small, the cache is bounded by its count of entries. The raw txs
+# and the header ranges aren't cached: they are stored by the raw tx store and the
+# header store. server.version isn't cached, it's the handshake sent on every new
+# connection.
+CACHE_TTLS = {
+    # Short, so that a reorg is picked up.
+    GET_HEADER_RPC: 600,
+    SERVER_FEATURES_RPC: 3600,
+}
+RPC_CACHE_MAX_SIZE = 1000
+
+
+#########################################################################
+# RPCCache
+#########################################################################
+class RPCCache:
+    """
+    A bounded LRU cache of RPC results keyed by (method, params), whose entries expire
+    after a TTL.
+    """
+
+    def __init__(self, max_size=RPC_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        # (method, params) => (expire time or None, result)
+        self._entries: OrderedDict = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Tuple[bool, Any]:
+        """
+        Return (True, result) if the key is cached, (False, None) otherwise.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expire_time, result = entry
+            if expire_time is None or expire_time > monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, result
+            del self._entries[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key, result, ttl: Optional[float]) -> None:
+        expire_time = None if ttl is None else monotonic() + ttl
+        self._entries[key] = (expire_time, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+#########################################################################
+# BatchedRPC
+#########################################################################
+class BatchedRPC:
+    """
+    Collects the calls of one RPC method made within a short window, and sends them to
+    the server with batch_rpc in chunks of at most `max_batch_size` requests.
+    """
+
+    def __init__(self, client, method, window=0.05, max_batch_size=50):
+        self._client = client
+        self.method = method
+        self.window = window
+        self.max_batch_size = max_batch_size
+
+        self._pending: List[Tuple[tuple, asyncio.Future]] = []
+        self._flush_handle = None
+
+    async def call(self, *params):
+        """
+        Same as `ElectrumClient.rpc`, a failed call returns None.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((params, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending, self._pending = self._pending, []
+        for i in range(0, len(pending), self.max_batch_size):
+            asyncio.ensure_future(self._send(pending[i : i + self.max_batch_size]))
+
+    async def _send(self, calls):
+        Logger.debug(f"Sending {len(calls)} batched {self.method} requests")
+        try:
+            results = await self._client.batch_rpc(
+                [(self.method, *params) for params, _ in calls],
+                return_exceptions=True,
+            )
+        except Exception as e:
+            for _, future in calls:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (params, future), result in zip(calls, results):
+            if future.done():
+                continue
+            if isinstance(result, ElectrumErrorResponse):
+                Logger.warning(f"RPC call {self.method}{params} failed: {result}")
+                result = None
+            future.set_result(result)
 
 
 #########################################################################
@@ -33,7 +176,33 @@ class ElectrumClient:
     def __init__(self):
         self.server_info = None
         self.loop = create_async_io_background_loop()
-        self.conn = StratumClient(loop=self.loop)
+        self.conn = StratumClient(
+            loop=self.loop,
+            timeouts=REQUEST_TIMEOUTS,
+            default_timeout=DEFAULT_REQUEST_TIMEOUT,
+        )
+
+        # When enabled, wallets subscribe to their script hashes and only fetch the
+        # balance and history of the addresses whose status has changed.
+        self.use_subscriptions = True
+        # The latest known status of every script hash subscribed on the current
+        # connection. It's cleared whenever the connection is lost, since the server
+        # drops all the subscriptions of a closed connection.
+        self._script_hash_status: Dict[str, Optional[str]] = {}
+        self._script_hash_notifications = None
+
+        # Transactions requested around the same time are fetched in batches.
+        self._transaction_rpc = BatchedRPC(self, GET_TRANSACTION_RPC)
+
+        # Identical requests are sent once while in flight, and the results of the
+        # immutable ones are cached.
+        self._in_flight_requests: Dict[tuple, asyncio.Future] = {}
+        self.coalesced_count = 0
+        self.cache = RPCCache()
+
+        # Batch size and number of batches in flight of the address refreshes, tuned
+        # to the server of the current connection.
+        self.request_window = AdaptiveRequestWindow()
 
     def has_server_config(self):
         return self.server_info is not None
@@ -57,34 +226,95 @@ class ElectrumClient:
     async def connect_async(self):
         try:
             await self.conn.connect(
-                self.server_info, self.protocol, disable_cert_verify=True
+                self.server_info,
+                self.protocol,
+                disable_cert_verify=True,
+                disconnect_callback=self._on_disconnected,
             )
         except Exception as e:
             Logger.warning("Unable to connect to server: %s" % e)
             return -1
+        self.request_window.reset()
         return 0
 
+    def _on_disconnected(self, conn):
+        self._script_hash_status.clear()
+
+    def cache_stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "coalesced": self.coalesced_count,
+            "size": len(self.cache),
+        }
+
+    async def _coalesced(self, key, fetch):
+        """
+        Await the request already in flight for key if any, otherwise start `fetch()`.
+        """
+        future = self._in_flight_requests.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fetch())
+            self._in_flight_requests[key] = future
+            future.add_done_callback(lambda _: self._in_flight_requests.pop(key, None))
+        else:
+            self.coalesced_count += 1
+        # Shielded, so that a caller giving up doesn't cancel the others' request.
+        return await asyncio.shield(future)
+
+    async def _cached(self, key, fetch, ttl):
+        """
+        The cached result of key if any, otherwise fetch and cache it. None results,
+        i.e. failed calls, aren't cached.
+        """
+        found, result = self.cache.get(key)
+        if found:
+            return result
+        result = await self._coalesced(key, fetch)
+        if result is not None:
+            self.cache.put(key, result, ttl)
+        return result
+
     # Electrum protocol methods:
     # https://electrumx-spesmilo.readthedocs.io/en/latest/protocol-methods.html
     async def rpc(self, method, args=[]):
         args = [(int(i) if i.isdigit() else i) for i in args]
-        try:
-            rpc_result = await self.conn.RPC(method, *args)
-        except ElectrumErrorResponse as e:
-            Logger.warning("RPC call failed: %s" % e)
-            return None
-        return rpc_result
 
-    async def batch_rpc(self, requests):
+        async def fetch():
+            try:
+                return await self.conn.RPC(method, *args)
+            except ElectrumErrorResponse as e:
+                Logger.warning("RPC call failed: %s" % e)
+                return None
+
+        key = (method, tuple(args))
+        if method in CACHE_TTLS:
+            return await self._cached(key, fetch, CACHE_TTLS[method])
+        return await self._coalesced(key, fetch)
+
+    async def batch_rpc(self, requests, return_exceptions=False):
         """
         Perform a batch of remote commands.
         Expects a list of ("method name", params...) tuples, where the method name should look
         like:
             blockchain.address.get_balance
         .. and sometimes take arguments, all of which are positional.
-        Returns a list of results for each command from the server. Failures are returned as exceptions.
+        Returns a list of results for each command from the server. Failures are raised,
+        unless `return_exceptions` is True, in which case they are returned as exceptions
+        in place of their results.
         """
-        return await self.conn.batch_rpc(requests)
+        return await self.conn.batch_rpc(requests, return_exceptions=return_exceptions)
+
+    async def get_transaction(self, tx_id):
+        """
+        Return the raw tx hex of tx_id, or None if the server doesn't know the tx. The
+        same tx requested by several wallets at once is only fetched once, and the
+        confirmed txs fetched already are in the raw tx store, see db.raw_tx_store.
+        """
+        return await self._coalesced(
+            (GET_TRANSACTION_RPC, (tx_id,)),
+            lambda: self._transaction_rpc.call(tx_id),
+        )
 
     async def get_script_hash_balance(self, script_hash):
         try:
@@ -104,6 +334,45 @@ class ElectrumClient:
             )
             raise e
 
+    def is_script_hash_subscribed(self, script_hash) -> bool:
+        return script_hash in self._script_hash_status
+
+    def script_hash_status(self, script_hash) -> Optional[str]:
+        """
+        Return the latest status of a subscribed script hash, which is None if the
+        script hash has no history.
+        """
+        self._process_script_hash_notifications()
+        return self._script_hash_status.get(script_hash)
+
+    async def subscribe_script_hashes(self, script_hashes) -> List[Optional[str]]:
+        """
+        Subscribe to a list of script hashes in one batch, and return their current
+        statuses. Later status changes are pushed by the server and picked up by
+        `script_hash_status`.
+        """
+        if self._script_hash_notifications is None:
+            self._script_hash_notifications = self.conn.subscription_queue(
+                SUBSCRIBE_SCRIPT_HASH_RPC
+            )
+
+        statuses = await self.batch_rpc(
+            [(SUBSCRIBE_SCRIPT_HASH_RPC, script_hash) for script_hash in script_hashes]
+        )
+        for script_hash, status in zip(script_hashes, statuses):
+            self._script_hash_status[script_hash] = status
+        return statuses
+
+    def _process_script_hash_notifications(self):
+        if self._script_hash_notifications is None:
+            return
+
+        while not self._script_hash_notifications.empty():
+            script_hash, status = self._script_hash_notifications.get_nowait()
+            # Ignore the notifications of subscriptions from a closed connection.
+            if script_hash in self._script_hash_status:
+                self._script_hash_status[script_hash] = status
+
 
 #########################################################################
 # ElectrumClient singleton
@@ -33,7 +33,7 @@ def initialize():
 
     # Initialize DB
     db_file_path = settings_manager.app_storage_directory_path + "/wk_wallet.db"
-    main_db_repo = DatabaseRepo(db_file_path, use_queued_db=True)
+    main_db_repo = DatabaseRepo(db_file_path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+import time
+from collections import deque, namedtuple
+from typing import Any, Dict, Optional
+
+WindowChange = namedtuple(
+    "WindowChange", ["time", "reason", "batch_size", "max_in_flight", "rtt"]
+)
+
+
+class AdaptiveRequestWindow:
+    """
+    Tunes the size of the batches sent to an Electrum server and the number of batches
+    in flight, with AIMD on the measured round-trip time and server errors.
+
+    It starts in slow start, doubling the batch size after every fast batch, until the
+    first slow batch or error. From then on, the window grows additively while batches
+    are faster than `target_rtt`, shrinks multiplicatively when they are more than twice
+    slower, and is halved on errors. A fast LAN server ends up with large batches and many
+    in flight, and a slow Tor link with small ones.
+    """
+
+    def __init__(
+        self,
+        initial_batch_size: int = 40,
+        min_batch_size: int = 5,
+        max_batch_size: int = 150,
+        batch_size_step: int = 10,
+        initial_in_flight: int = 5,
+        max_in_flight_limit: int = 32,
+        target_rtt: float = 1.0,
+        history_size: int = 100,
+    ) -> None:
+        self.initial_batch_size = initial_batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.batch_size_step = batch_size_step
+        self.initial_in_flight = initial_in_flight
+        self.max_in_flight_limit = max_in_flight_limit
+        self.target_rtt = target_rtt
+
+        # The recent changes of the window, for inspecting what it chose and why.
+        self.history = deque(maxlen=history_size)
+        # Number of batches currently sent and not completed.
+        self.in_flight = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Start over, e.g. on a new connection that may be to a different server.
+        """
+        self.batch_size = self.initial_batch_size
+        self.max_in_flight = self.initial_in_flight
+        self.smoothed_rtt: Optional[float] = None
+        self.success_count = 0
+        self.error_count = 0
+        self._slow_start = True
+        # Completed batches since max_in_flight was last increased.
+        self._in_flight_credit = 0
+        self._record("reset")
+
+    def has_capacity(self) -> bool:
+        return self.in_flight < self.max_in_flight
+
+    def acquire(self) -> None:
+        """
+        A batch is about to be sent, `release` it once it's completed.
+        """
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+
+    def on_success(self, rtt: float) -> None:
+        """
+        A batch completed in `rtt` seconds.
+        """
+        self.success_count += 1
+        if self.smoothed_rtt is None:
+            self.smoothed_rtt = rtt
+        else:
+            self.smoothed_rtt = 0.875 * self.smoothed_rtt + 0.125 * rtt
+
+        if rtt <= self.target_rtt:
+            if self._slow_start:
+                self._set_window(self.batch_size * 2, self.max_in_flight + 1)
+                self._record("slow start", rtt)
+                return
+
+            batch_size = self.batch_size + self.batch_size_step
+            # Grow the number of batches in flight by one per round of batches.
+            max_in_flight = self.max_in_flight
+            self._in_flight_credit += 1
+            if self._in_flight_credit >= self.max_in_flight:
+                self._in_flight_credit = 0
+                max_in_flight += 1
+            if self._set_window(batch_size, max_in_flight):
+                self._record("increase", rtt)
+        elif rtt > 2 * self.target_rtt:
+            self._slow_start = False
+            if self._set_window(int(self.batch_size * 0.75), self.max_in_flight):
+                self._record("slow", rtt)
+        else:
+            self._slow_start = False
+
+    def on_error(self, error: Any = None) -> None:
+        """
+        A batch failed, e.g. timed out or was rejected by the server.
+        """
+        self.error_count += 1
+        self._slow_start = False
+        self._in_flight_credit = 0
+        self._set_window(self.batch_size // 2, self.max_in_flight // 2)
+        self._record(f"error: {error}" if error is not None else "error")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batch_size": self.batch_size,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "smoothed_rtt": self.smoothed_rtt,
+            "success_count": self.success_count,
+            "error_count": self.error_count,
+            "slow_start": self._slow_start,
+            "history": list(self.history),
+        }
+
+    def _set_window(self, batch_size: int, max_in_flight: int) -> bool:
+        batch_size = min(self.max_batch_size, max(self.min_batch_size, batch_size))
+        max_in_flight = min(self.max_in_flight_limit, max(1, max_in_flight))
+        changed = (batch_size, max_in_flight) != (self.batch_size, self.max_in_flight)
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        if self.batch_size == self.max_batch_size:
+            self._slow_start = False
+        return changed
+
+    def _record(self, reason: str, rtt: Optional[float] = None) -> None:
+        self.history.append(
+            WindowChange(time.time(), reason, self.batch_size, self.max_in_flight, rtt)
+        )
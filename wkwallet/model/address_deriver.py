@@ -0,0 +1,121 @@
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple, Type
+
+import pycoin
+from pycoin.ecdsa.secp256k1 import secp256k1_generator
+from pycoin.encoding.hash import hash160
+from pycoin.encoding.sec import public_pair_to_sec
+from pycoin.key.bip32 import subkey_public_pair_chain_code_pair
+
+from . import secp256k1
+from .crypt_utils import script_to_ES_hash
+from .script_type import ScriptType
+
+DerivedAddress = namedtuple(
+    "DerivedAddress", ["address_index", "address_str", "script", "script_hash"]
+)
+
+
+class AddressPublicKey:
+    """
+    The public key of an address, with only what the script types use. Unlike a pycoin
+    BIP32 node, it has no chain code nor fingerprint to compute, and isn't kept in the
+    subkey cache of its parent.
+    """
+
+    __slots__ = ("_sec", "_hash160")
+
+    def __init__(self, sec: bytes) -> None:
+        self._sec = sec
+        self._hash160 = None
+
+    def sec(self) -> bytes:
+        return self._sec
+
+    def hash160(self) -> bytes:
+        if self._hash160 is None:
+            self._hash160 = hash160(self._sec)
+        return self._hash160
+
+
+class AddressDeriver:
+    """
+    Derives the addresses of an account from its xpub.
+
+    The chain-level public nodes (xpub/chain) are derived once and cached, and the
+    address keys are derived from them directly, so contiguous ranges of addresses are
+    derived in one call without creating a BIP32 node per address. The derivation uses
+    libsecp256k1 when it's available, pycoin otherwise.
+    """
+
+    def __init__(
+        self,
+        master_pub_key: pycoin.key.Key.Key,
+        chain_script_types: Dict[int, Type[ScriptType.BaseScriptType]],
+    ) -> None:
+        self._master_pub_key = master_pub_key
+        self._chain_script_types = chain_script_types
+        # chain_index => the chain node, as (public pair, sec, chain code)
+        self._chain_nodes: Dict[int, Tuple[Tuple[int, int], bytes, bytes]] = {}
+
+    def _chain_node(self, chain_index: int) -> Tuple[Tuple[int, int], bytes, bytes]:
+        chain_node = self._chain_nodes.get(chain_index)
+        if chain_node is None:
+            chain_key = self._master_pub_key.subkey(chain_index)
+            chain_node = (
+                chain_key.public_pair(),
+                chain_key.sec(is_compressed=True),
+                chain_key.chain_code(),
+            )
+            self._chain_nodes[chain_index] = chain_node
+        return chain_node
+
+    def address_key(self, chain_index: int, address_index: int) -> AddressPublicKey:
+        public_pair, sec, chain_code = self._chain_node(chain_index)
+        if secp256k1.is_available():
+            address_sec, _ = secp256k1.ckd_pub(sec, chain_code, address_index)
+            return AddressPublicKey(address_sec)
+
+        address_public_pair, _ = subkey_public_pair_chain_code_pair(
+            secp256k1_generator, public_pair, chain_code, address_index
+        )
+        return AddressPublicKey(public_pair_to_sec(address_public_pair))
+
+    def script_object(
+        self, chain_index: int, address_index: int
+    ) -> Optional[ScriptType.BaseScriptType]:
+        script_type = self._chain_script_types.get(chain_index)
+        if script_type is None:
+            return None
+        return script_type(self.address_key(chain_index, address_index), address_index)
+
+    def derive(self, chain_index: int, address_index: int) -> Optional[DerivedAddress]:
+        if chain_index not in self._chain_script_types:
+            return None
+        return self.derive_range(chain_index, address_index, address_index + 1)[0]
+
+    def derive_range(
+        self, chain_index: int, start: int, stop: int
+    ) -> List[DerivedAddress]:
+        """
+        Derive the addresses of chain_index from index `start` to `stop` (exclusive).
+        """
+        script_type = self._chain_script_types.get(chain_index)
+        if script_type is None:
+            raise ValueError(f"Invalid chain_index {chain_index}")
+
+        derived_addresses = []
+        for address_index in range(start, stop):
+            script_object = script_type(
+                self.address_key(chain_index, address_index), address_index
+            )
+            script = script_object.script()
+            derived_addresses.append(
+                DerivedAddress(
+                    address_index,
+                    script_object.address(),
+                    script,
+                    script_to_ES_hash(script),
+                )
+            )
+        return derived_addresses
@@ -0,0 +1,134 @@
+import operator
+from functools import reduce
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from db.address_data import AddressData
+from db.wallet_data import WalletData
+from db.write_behind_buffer import bulk_insert
+from peewee import Expression, chunked
+
+from .address_deriver import DerivedAddress
+from .derivation_pool import address_index_ranges
+from .wallet_account import WalletAccount
+
+# (account_index, chain_index, address_index)
+AddressIndexTuple = Tuple[int, int, int]
+
+# The ranges of indexes selected by a query.
+MAX_RANGES_PER_QUERY = 100
+
+
+def _any(conditions: List[Expression]) -> Expression:
+    # The conditions are ORed as a balanced tree: the parser stack of SQLite overflows
+    # on a chain of a hundred ORs.
+    while len(conditions) > 1:
+        conditions = [
+            reduce(operator.or_, conditions[i : i + 2])
+            for i in range(0, len(conditions), 2)
+        ]
+    return conditions[0]
+
+
+def select_address_ranges(
+    wallet_data: WalletData,
+    address_index_tuples: Iterable[AddressIndexTuple],
+    *fields,
+) -> Iterator[AddressData]:
+    """
+    The address data of the wallet in the ranges of consecutive indexes of
+    address_index_tuples, selected with one query per MAX_RANGES_PER_QUERY ranges from
+    the (wallet, account_index, chain_index, address_index) index. The rows in a range
+    but not in address_index_tuples are not skipped.
+    """
+    ranges = address_index_ranges(address_index_tuples)
+    for ranges_batch in chunked(ranges, MAX_RANGES_PER_QUERY):
+        ranges_condition = _any(
+            [
+                (AddressData.account_index == account_index)
+                & (AddressData.chain_index == chain_index)
+                & (AddressData.address_index.between(start, stop - 1))
+                for account_index, chain_index, start, stop in ranges_batch
+            ]
+        )
+        yield from AddressData.select(*fields).where(
+            (AddressData.wallet == wallet_data) & ranges_condition
+        )
+
+
+def materialize_addresses(
+    wallet_data: WalletData,
+    accounts: Dict[int, WalletAccount],
+    address_index_tuples: Iterable[AddressIndexTuple],
+    derived_addresses: Optional[Dict[AddressIndexTuple, DerivedAddress]] = None,
+) -> Dict[AddressIndexTuple, AddressData]:
+    """
+    The address data of address_index_tuples, created if they don't exist yet.
+
+    The existing rows are selected by ranges, see select_address_ranges. The missing
+    addresses are taken from derived_addresses, the addresses already derived by the
+    derivation pool, or derived by ranges. The addresses of the selected and inserted
+    rows are removed from derived_addresses. They are inserted
+    with insert_many in one transaction.
+    """
+    address_index_tuples = set(address_index_tuples)
+    if derived_addresses is None:
+        derived_addresses = {}
+
+    tuple_to_data: Dict[AddressIndexTuple, AddressData] = {}
+    for address_data in select_address_ranges(wallet_data, address_index_tuples):
+        # The address is created, its derivation is of no use anymore.
+        derived_addresses.pop(address_data.indexes_tuple(), None)
+        if address_data.indexes_tuple() in address_index_tuples:
+            tuple_to_data[address_data.indexes_tuple()] = address_data
+
+    new_addresses_data = []
+    underived_tuples = []
+    for address_index_tuple in sorted(address_index_tuples - tuple_to_data.keys()):
+        derived_address = derived_addresses.pop(address_index_tuple, None)
+        if derived_address is None:
+            underived_tuples.append(address_index_tuple)
+        else:
+            new_addresses_data.append(
+                _new_address_data(
+                    wallet_data, accounts, address_index_tuple, derived_address
+                )
+            )
+    for account_index, chain_index, start, stop in address_index_ranges(
+        underived_tuples
+    ):
+        address_deriver = accounts[account_index].address_deriver
+        for derived_address in address_deriver.derive_range(chain_index, start, stop):
+            new_addresses_data.append(
+                _new_address_data(
+                    wallet_data,
+                    accounts,
+                    (account_index, chain_index, derived_address.address_index),
+                    derived_address,
+                )
+            )
+
+    if new_addresses_data:
+        with AddressData._meta.database.atomic():
+            bulk_insert(AddressData, new_addresses_data)
+        for address_data in new_addresses_data:
+            tuple_to_data[address_data.indexes_tuple()] = address_data
+    return tuple_to_data
+
+
+def _new_address_data(
+    wallet_data: WalletData,
+    accounts: Dict[int, WalletAccount],
+    address_index_tuple: AddressIndexTuple,
+    derived_address: DerivedAddress,
+) -> AddressData:
+    account_index, chain_index, address_index = address_index_tuple
+    return AddressData(
+        wallet=wallet_data,
+        account=accounts[account_index].data,
+        address_str=derived_address.address_str,
+        script_hash=derived_address.script_hash,
+        account_index=account_index,
+        chain_index=chain_index,
+        address_index=address_index,
+        path=f"{chain_index}/{address_index}",
+    )
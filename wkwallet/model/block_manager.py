@@ -1,62 +1,95 @@
 import asyncio
+import os
 from datetime import datetime
-from typing import Dict, List
+from typing import Iterable, List, Optional, Tuple
 
 from db.block_data import BlockData
-from electrum_client import electrum_client
+from db.write_behind_buffer import write_behind_buffer
+from electrum_client import GET_HEADERS_RPC, electrum_client
 from kivy.logger import Logger
+from settings_manager import settings_manager
+
+from .header_store import HeaderStore, group_heights_into_ranges
+
+# Electrum servers return at most 2016 headers per request.
+MAX_HEADERS_PER_REQUEST = 2016
+# Max number of headers requested in one batch.
+MAX_HEADERS_PER_BATCH = 2 * MAX_HEADERS_PER_REQUEST
+# Heights closer than this are fetched in one range instead of separate requests.
+HEADER_RANGE_MAX_GAP = 32
 
 
 class BlockManager:
-    def __init__(self) -> None:
-        self.height_to_block: Dict[int, BlockData] = {}
-        for block_data in BlockData.select():
-            self.height_to_block[block_data.height] = block_data
+    def __init__(self, header_store_path: str) -> None:
+        self._header_store = HeaderStore(header_store_path)
+        self._import_block_data()
+
+    def _import_block_data(self) -> None:
+        """
+        Move the headers stored in the database by older versions to the header store.
+        """
+        block_data: BlockData
+        for block_data in BlockData.select().where(BlockData.header_hex.is_null(False)):
+            if not self._header_store.has_header(block_data.height):
+                self._header_store.put_headers(
+                    block_data.height, bytes.fromhex(block_data.header_hex)
+                )
+        write_behind_buffer().submit(lambda: BlockData.delete().execute())
 
-    async def get_block(self, height: int) -> BlockData:
+    def get_blocktime(self, height) -> Optional[datetime]:
         if height <= 0:
             return None
+        return self._header_store.get_blocktime(height)
 
-        if height not in self.height_to_block:
-            self.height_to_block[height] = BlockData.create(height=height)
-            await self.update_block_header(height)
-        return self.height_to_block[height]
-
-    async def update_block_header(self, height: int):
-        if height not in self.height_to_block:
-            self.height_to_block[height] = BlockData.create(height=height)
-        if self.height_to_block[height].header_hex is not None:
+    async def update_block_headers(self, relevant_block_heights: Iterable[int]):
+        missing_heights = [
+            height
+            for height in relevant_block_heights
+            if height > 0 and not self._header_store.has_header(height)
+        ]
+        if not missing_heights:
             return
 
-        Logger.debug(f"Updating header for: {height}")
-        header_hex = await electrum_client.rpc("blockchain.block.header", [str(height)])
-        Logger.debug(f"Block header updated: {height}")
-
-        blocktime = self.parse_blocktime(header_hex)
-        self.height_to_block[height].header_hex = header_hex
-        self.height_to_block[height].timestamp = blocktime
-        self.height_to_block[height].save()
-
-    def parse_blocktime(
-        self,
-        header_hex,
-    ):
-        return datetime.fromtimestamp(
-            int.from_bytes(bytes.fromhex(header_hex)[68:72], "little")
+        header_ranges = group_heights_into_ranges(
+            missing_heights,
+            max_gap=HEADER_RANGE_MAX_GAP,
+            max_count=MAX_HEADERS_PER_REQUEST,
+        )
+        Logger.debug(
+            f"Updating {len(missing_heights)} headers in {len(header_ranges)} ranges"
         )
 
-    def get_blocktime(self, height):
-        if height in self.height_to_block:
-            return self.height_to_block[height].timestamp
-        else:
-            return None
+        batches: List[List[Tuple[int, int]]] = [[]]
+        batch_headers_count = 0
+        for start_height, count in header_ranges:
+            if batches[-1] and batch_headers_count + count > MAX_HEADERS_PER_BATCH:
+                batches.append([])
+                batch_headers_count = 0
+            batches[-1].append((start_height, count))
+            batch_headers_count += count
+        await asyncio.gather(*(self._fetch_header_ranges(batch) for batch in batches))
 
-    async def update_block_headers(self, relevant_block_heights: List[int]):
-        Logger.debug(f"Updating header for: {relevant_block_heights}")
-        pending_tasks = []
-        for height in relevant_block_heights:
-            pending_tasks.append(asyncio.create_task(self.update_block_header(height)))
-        await asyncio.gather(*pending_tasks)
+    async def _fetch_header_ranges(self, header_ranges: List[Tuple[int, int]]):
+        try:
+            results = await electrum_client.batch_rpc(
+                [
+                    (GET_HEADERS_RPC, start_height, count)
+                    for start_height, count in header_ranges
+                ],
+                return_exceptions=True,
+            )
+        except Exception as e:
+            # The missing headers are fetched again on the next refresh.
+            Logger.error(f"Unable to fetch headers {header_ranges}, error: {e}")
+            return
+        for (start_height, count), result in zip(header_ranges, results):
+            if isinstance(result, Exception):
+                Logger.error(
+                    f"Unable to fetch headers {start_height}+{count}, error: {result}"
+                )
+                continue
+            self._header_store.put_headers(start_height, bytes.fromhex(result["hex"]))
+        Logger.debug(f"Block headers updated: {header_ranges}")
 
 
 _block_manager = None
@@ -65,5 +98,7 @@ _block_manager = None
 def block_manager() -> BlockManager:
     global _block_manager
     if not _block_manager:
-        _block_manager = BlockManager()
+        _block_manager = BlockManager(
+            os.path.join(settings_manager.app_storage_directory_path, "headers.bin")
+        )
     return _block_manager
@@ -0,0 +1,114 @@
+import asyncio
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from db.tx_data import TxData
+
+
+def equal_output_value_and_count(
+    output_values: Iterable[int],
+) -> Tuple[Optional[int], int]:
+    """
+    Return (cj_value, cj_count): the most common output value and its count. On a tie,
+    the value of the first of these outputs. (None, 1) if all the values differ.
+    """
+    output_values = list(output_values)
+    value_counts = Counter(output_values)
+    cj_value, cj_count = None, 1
+    for value in output_values:
+        if value_counts[value] > cj_count:
+            cj_value, cj_count = value, value_counts[value]
+    return cj_value, cj_count
+
+
+def tx_cj_value_and_count(tx_data: TxData) -> Tuple[Optional[int], int]:
+    """
+    Same as `equal_output_value_and_count` for the outputs of tx_data. The result is
+    kept in the cj_value and cj_count fields of tx_data, it's up to the caller to save
+    it.
+    """
+    if tx_data.cj_count is None:
+        tx_data.cj_value, tx_data.cj_count = equal_output_value_and_count(
+            tx_out.coin_value for tx_out in tx_data.decoded_tx.txs_out
+        )
+    return tx_data.cj_value, tx_data.cj_count
+
+
+class AnonSetCalculator:
+    """
+    Computes how many coinjoin counterparties the ancestors of a tx add to the
+    anonymity set of its outputs.
+
+    An input adds to it when it spends an output of the wallet of at least the value
+    of the output, which is the coinjoin output of its tx: it adds the counterparties
+    of that coinjoin, then those of its own ancestors, recursively. The counts are the
+    sums over all the paths of the tx graph, but the count of each (tx, value) is
+    memoized so that each edge of the graph is walked once.
+
+    get_tx: async, returns the TxData of a tx_id of the wallet.
+    contains_tx: whether a tx_id is a tx of the wallet.
+    owns_script: whether an output script belongs to the wallet.
+    on_cj_computed: called with a TxData whose cj_value and cj_count were computed.
+    """
+
+    def __init__(
+        self,
+        get_tx: Callable[[str], Awaitable[Optional[TxData]]],
+        contains_tx: Callable[[str], bool],
+        owns_script: Callable[[bytes], bool],
+        on_cj_computed: Optional[Callable[[TxData], None]] = None,
+    ) -> None:
+        self._get_tx = get_tx
+        self._contains_tx = contains_tx
+        self._owns_script = owns_script
+        self._on_cj_computed = on_cj_computed
+        # (tx_id, min_value) => count
+        self._ancestors_counts: Dict[Tuple[str, int], int] = {}
+
+    def reset(self) -> None:
+        """
+        Forget the memoized counts, the addresses of the wallet may have changed.
+        """
+        self._ancestors_counts.clear()
+
+    def cj_value_and_count(self, tx_data: TxData) -> Tuple[Optional[int], int]:
+        is_computed = tx_data.cj_count is not None
+        cj_value_and_count = tx_cj_value_and_count(tx_data)
+        if not is_computed and self._on_cj_computed:
+            self._on_cj_computed(tx_data)
+        return cj_value_and_count
+
+    async def ancestors_anon_set_count(self, tx_data: TxData, min_value: int) -> int:
+        """
+        The count the ancestors of tx_data add to the anon set of one of its outputs of
+        value min_value.
+        """
+        key = (tx_data.tx_id, min_value)
+        if key in self._ancestors_counts:
+            return self._ancestors_counts[key]
+
+        pre_tx_outs = [
+            (str(tx_in.previous_hash), tx_in.previous_index)
+            for tx_in in tx_data.decoded_tx.txs_in
+            if self._contains_tx(str(tx_in.previous_hash))
+        ]
+        pre_txs_data = await asyncio.gather(
+            *(self._get_tx(pre_tx_id) for pre_tx_id, _ in pre_tx_outs)
+        )
+
+        count = 0
+        for (_, pre_tx_out_index), pre_tx_data in zip(pre_tx_outs, pre_txs_data):
+            if pre_tx_data is None:
+                continue
+            pre_tx_out = pre_tx_data.decoded_tx.txs_out[pre_tx_out_index]
+            if pre_tx_out.coin_value < min_value:
+                continue
+            if not self._owns_script(pre_tx_out.puzzle_script()):
+                continue
+            cj_value, cj_count = self.cj_value_and_count(pre_tx_data)
+            if pre_tx_out.coin_value == cj_value:
+                count += cj_count - 1
+                count += await self.ancestors_anon_set_count(pre_tx_data, min_value)
+
+        self._ancestors_counts[key] = count
+        return count
@@ -0,0 +1,92 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from kivy.logger import Logger
+
+from .address_deriver import AddressDeriver, DerivedAddress
+
+# The number of addresses derived by a job of the pool.
+DERIVATION_BATCH_SIZE = 50
+MAX_DERIVATION_WORKERS = 4
+
+
+def address_index_ranges(
+    address_index_tuples, max_length: Optional[int] = None
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Group address index tuples into ranges of consecutive indexes of a chain, of at most
+    max_length addresses, as (account_index, chain_index, start, stop).
+    """
+    ranges = []
+    for account_index, chain_index, address_index in sorted(set(address_index_tuples)):
+        if ranges:
+            last_account_index, last_chain_index, start, stop = ranges[-1]
+            if (
+                (last_account_index, last_chain_index) == (account_index, chain_index)
+                and stop == address_index
+                and (max_length is None or stop - start < max_length)
+            ):
+                ranges[-1] = (account_index, chain_index, start, address_index + 1)
+                continue
+        ranges.append((account_index, chain_index, address_index, address_index + 1))
+    return ranges
+
+
+class DerivationPool:
+    """
+    Derives addresses off the asyncio loops, so that the refresh of a wallet sends its
+    requests while the next addresses are being derived.
+
+    The workers are threads. They only derive in parallel when libsecp256k1 is
+    available, as its calls through ctypes release the GIL. The pycoin fallback is pure
+    Python, so its derivations are serialized by the GIL: they still run off the loops,
+    but don't get faster with more workers.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None) -> None:
+        self.max_workers = max_workers or min(
+            MAX_DERIVATION_WORKERS, os.cpu_count() or 1
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix="derivation"
+            )
+            Logger.info(
+                f"WKWallet: Started the derivation pool with {self.max_workers} threads"
+            )
+        return self._executor
+
+    async def derive_range(
+        self, address_deriver: AddressDeriver, chain_index: int, start: int, stop: int
+    ) -> List[DerivedAddress]:
+        """
+        Same as `address_deriver.derive_range`, run in the pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(),
+            address_deriver.derive_range,
+            chain_index,
+            start,
+            stop,
+        )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_derivation_pool = None
+
+
+def derivation_pool() -> DerivationPool:
+    global _derivation_pool
+    if not _derivation_pool:
+        _derivation_pool = DerivationPool()
+    return _derivation_pool
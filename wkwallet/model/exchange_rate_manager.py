@@ -4,6 +4,8 @@ import requests
 from electrum_client import electrum_client
 from kivy.logger import Logger
 
+from .runtime import background_executor
+
 SATS_PER_COIN = 100000000
 
 
@@ -35,7 +37,9 @@ class ExchangeRateManager:
     async def update_exchange_rate_async(self):
         loop = asyncio.get_event_loop()
         response = await loop.run_in_executor(
-            None, requests.get, "https://api.coindesk.com/v1/bpi/currentprice/USD.json"
+            background_executor(),
+            requests.get,
+            "https://api.coindesk.com/v1/bpi/currentprice/USD.json",
         )
         self.__usd_rate = response.json()["bpi"]["USD"]["rate_float"]
         Logger.info(f"WKWallet: USD exchange rate updated: {self.__usd_rate}")
@@ -0,0 +1,119 @@
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+HEADER_SIZE = 80
+_EMPTY_HEADER = bytes(HEADER_SIZE)
+# Offset of the little endian uint32 timestamp inside a block header.
+_TIMESTAMP_OFFSET = 68
+
+
+class HeaderStore:
+    """
+    Block headers stored in a flat binary file, the header of height h being the 80 bytes
+    at offset h * 80. The file is read through mmap, so looking up a header is O(1) and
+    doesn't touch the database. Heights whose header hasn't been stored read as zeros,
+    and the file is sparse on the file systems supporting it.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+
+        # Create the file if it doesn't exist yet.
+        open(path, "ab").close()
+        self._file = open(path, "r+b")
+        self._mmap: Optional[mmap.mmap] = None
+        self._remap()
+
+    def _remap(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+        size = os.fstat(self._file.fileno()).st_size
+        if size > 0:
+            self._mmap = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def max_height(self) -> int:
+        """
+        The highest height the file has room for, -1 if it's empty.
+        """
+        with self._lock:
+            return (len(self._mmap) if self._mmap else 0) // HEADER_SIZE - 1
+
+    def get_header(self, height: int) -> Optional[bytes]:
+        offset = height * HEADER_SIZE
+        with self._lock:
+            if height < 0 or not self._mmap or offset + HEADER_SIZE > len(self._mmap):
+                return None
+            header = self._mmap[offset : offset + HEADER_SIZE]
+        return None if header == _EMPTY_HEADER else header
+
+    def has_header(self, height: int) -> bool:
+        return self.get_timestamp(height) is not None
+
+    def get_timestamp(self, height: int) -> Optional[int]:
+        offset = height * HEADER_SIZE
+        with self._lock:
+            if height < 0 or not self._mmap or offset + HEADER_SIZE > len(self._mmap):
+                return None
+            (timestamp,) = struct.unpack_from(
+                "<I", self._mmap, offset + _TIMESTAMP_OFFSET
+            )
+        # No block has a zero timestamp, it's a header that hasn't been stored.
+        return timestamp or None
+
+    def get_blocktime(self, height: int) -> Optional[datetime]:
+        timestamp = self.get_timestamp(height)
+        return datetime.fromtimestamp(timestamp) if timestamp else None
+
+    def put_headers(self, start_height: int, raw_headers: bytes) -> None:
+        """
+        Store the consecutive headers starting at `start_height`.
+        """
+        if len(raw_headers) % HEADER_SIZE != 0:
+            raise ValueError(f"Invalid headers length: {len(raw_headers)}")
+        if not raw_headers:
+            return
+
+        with self._lock:
+            self._file.seek(start_height * HEADER_SIZE)
+            self._file.write(raw_headers)
+            self._file.flush()
+            self._remap()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._file.close()
+
+
+def group_heights_into_ranges(
+    heights: Iterable[int], max_gap: int, max_count: int
+) -> List[Tuple[int, int]]:
+    """
+    Group heights into (start_height, count) ranges covering all of them. Heights closer
+    than `max_gap` share a range, as fetching the few headers in between is cheaper than
+    another request, and no range is longer than `max_count`.
+    """
+    ranges: List[Tuple[int, int]] = []
+    for height in sorted(set(heights)):
+        if ranges:
+            start_height, count = ranges[-1]
+            end_height = start_height + count
+            if height - end_height < max_gap and height - start_height < max_count:
+                ranges[-1] = (start_height, height - start_height + 1)
+                continue
+        ranges.append((height, 1))
+    return ranges
@@ -0,0 +1,142 @@
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# The bandwidth of the raw txs fetched by the backfill of a wallet.
+BACKFILL_BYTES_PER_SECOND = 100_000
+MAX_BACKFILL_BATCH_SIZE = 10
+
+
+class BackfillProgress(NamedTuple):
+    parsed_count: int
+    total_count: int
+    # All the txs at this height and above are parsed.
+    cursor_height: Optional[int]
+
+    @property
+    def completed(self) -> bool:
+        return self.parsed_count >= self.total_count
+
+
+class HistoryBackfill:
+    """
+    The queue of the confirmed txs of a wallet not parsed yet, newest first.
+
+    A refresh only parses the most recent txs, the backfill parses the others in the
+    background, one batch at a time, when the refresh scheduler has nothing more
+    urgent. Fetching the txs is limited to BACKFILL_BYTES_PER_SECOND.
+
+    The cursor is the height from which all the txs are parsed. It's saved, so that
+    the progress of the last backfill is known until the next one is started, and the
+    txs to parse are counted again.
+    """
+
+    def __init__(
+        self,
+        cursor_height: Optional[int] = None,
+        bytes_per_second: int = BACKFILL_BYTES_PER_SECOND,
+    ) -> None:
+        self.cursor_height = cursor_height
+        self._bytes_per_second = bytes_per_second
+
+        self._queue: Deque[Tuple[int, str]] = deque()
+        # height => the count of txs at this height not parsed yet
+        self._remaining_counts: Dict[int, int] = {}
+        self._lowest_height = 0
+        self._in_flight_batch: Optional[List[Tuple[int, str]]] = None
+        self._next_batch_time = 0.0
+        self._parsed_count = 0
+        self._total_count = 0
+
+    def start(
+        self,
+        height_to_tx_ids: Dict[int, Iterable[str]],
+        is_parsed: Callable[[str], bool],
+    ) -> None:
+        """
+        Queue the txs of height_to_tx_ids not parsed yet.
+        """
+        self._queue.clear()
+        self._remaining_counts.clear()
+        # The batch running, if any, is ignored: its txs are queued again. The saved
+        # cursor is replaced by the one of the current txs, the txs received since it
+        # was saved may be above it and not parsed.
+        self._in_flight_batch = None
+        self._parsed_count, self._total_count = 0, 0
+        for height in sorted(height_to_tx_ids, reverse=True):
+            for tx_id in sorted(height_to_tx_ids[height]):
+                self._total_count += 1
+                if is_parsed(tx_id):
+                    self._parsed_count += 1
+                    continue
+                self._queue.append((height, tx_id))
+                self._remaining_counts[height] = (
+                    self._remaining_counts.get(height, 0) + 1
+                )
+        self._lowest_height = min(height_to_tx_ids, default=0)
+        self._update_cursor_height()
+
+    def stop(self) -> None:
+        self._queue.clear()
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._queue)
+
+    def ready_count(self) -> int:
+        """
+        The count of txs that can be fetched now: none while a batch is running or the
+        bandwidth budget is spent.
+        """
+        if (
+            self._in_flight_batch is not None
+            or time.monotonic() < self._next_batch_time
+        ):
+            return 0
+        return len(self._queue)
+
+    def next_batch_delay(self) -> float:
+        return max(0.0, self._next_batch_time - time.monotonic())
+
+    def next_batch(self, batch_size: int) -> List[Tuple[int, str]]:
+        batch = []
+        while self._queue and len(batch) < min(batch_size, MAX_BACKFILL_BATCH_SIZE):
+            batch.append(self._queue.popleft())
+        self._in_flight_batch = batch or None
+        return batch
+
+    def batch_completed(
+        self,
+        batch: List[Tuple[int, str]],
+        parsed: List[Tuple[int, str]],
+        fetched_bytes: int,
+    ) -> BackfillProgress:
+        """
+        parsed: the (height, tx_id) of the batch that are parsed. The others are parsed
+        on the next backfill.
+        """
+        self._next_batch_time = (
+            max(time.monotonic(), self._next_batch_time)
+            + fetched_bytes / self._bytes_per_second
+        )
+        if batch is not self._in_flight_batch:
+            return self.progress()
+        self._in_flight_batch = None
+        for height, _ in parsed:
+            self._parsed_count += 1
+            self._remaining_counts[height] -= 1
+            if not self._remaining_counts[height]:
+                del self._remaining_counts[height]
+        self._update_cursor_height()
+        return self.progress()
+
+    def _update_cursor_height(self) -> None:
+        if self._remaining_counts:
+            self.cursor_height = max(self._remaining_counts) + 1
+        else:
+            self.cursor_height = self._lowest_height
+
+    def progress(self) -> BackfillProgress:
+        return BackfillProgress(
+            self._parsed_count, self._total_count, self.cursor_height
+        )
@@ -0,0 +1,86 @@
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from .crypt_utils import mnemonic_to_root_key
+
+
+class KeyCache:
+    """
+    The private key material of the wallets with a seed, derived once per session.
+
+    The root key of a seed takes 2048 rounds of PBKDF2-HMAC-SHA512, it's derived the
+    first time it's needed. The account nodes, derived from it by hardened paths, are
+    kept too, so that a private key only takes the derivation of its unhardened
+    chain/index path.
+
+    The keys are indexed by the id of the SeedData. wipe() drops them: the keys are
+    derived again on the next use. Python can't overwrite the secret exponents in
+    memory, wipe only releases the references held by the cache.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._root_keys: Dict[int, object] = {}
+        # (seed_data_id, derivation_path, account_index) => the account node
+        self._account_keys: Dict[Tuple[int, str, int], object] = {}
+
+    def set_root_key(self, seed_data_id: int, root_key) -> None:
+        """
+        Cache a root key already derived, when the seed is created.
+        """
+        with self._lock:
+            self._root_keys[seed_data_id] = root_key
+
+    def root_key(self, seed_data_id: int, load_mnemonic: Callable[[], str]):
+        with self._lock:
+            root_key = self._root_keys.get(seed_data_id)
+            if root_key is None:
+                root_key = mnemonic_to_root_key(load_mnemonic())
+                self._root_keys[seed_data_id] = root_key
+            return root_key
+
+    def account_key(
+        self,
+        seed_data_id: int,
+        load_mnemonic: Callable[[], str],
+        derivation_path: str,
+        account_index: int,
+    ):
+        """
+        The private node of the account: root key / derivation_path / account_index'.
+        """
+        key = (seed_data_id, derivation_path, account_index)
+        with self._lock:
+            account_key = self._account_keys.get(key)
+        if account_key is None:
+            account_key = (
+                self.root_key(seed_data_id, load_mnemonic)
+                .subkey_for_path(derivation_path)
+                .subkey_for_path(f"{account_index}p")
+            )
+            with self._lock:
+                self._account_keys[key] = account_key
+        return account_key
+
+    def wipe(self, seed_data_id: Optional[int] = None) -> None:
+        """
+        Drop the keys of the seed seed_data_id, or all the keys.
+        """
+        with self._lock:
+            if seed_data_id is None:
+                self._root_keys.clear()
+                self._account_keys.clear()
+                return
+            self._root_keys.pop(seed_data_id, None)
+            for key in [key for key in self._account_keys if key[0] == seed_data_id]:
+                del self._account_keys[key]
+
+
+_key_cache = None
+
+
+def key_cache() -> KeyCache:
+    global _key_cache
+    if not _key_cache:
+        _key_cache = KeyCache()
+    return _key_cache
@@ -0,0 +1,143 @@
+import hashlib
+import math
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+DEFAULT_ERROR_RATE = 0.001
+MIN_FILTER_CAPACITY = 1000
+
+
+def script_hash_to_digest(script_hash: str) -> bytes:
+    # The Electrum script hash is the SHA256 of the script, reversed, in hex.
+    return bytes.fromhex(script_hash)[::-1]
+
+
+class BloomFilter:
+    """
+    A Bloom filter of SHA256 digests. The digests being uniformly distributed, the bit
+    positions are read from slices of the digest instead of hashing it again.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = DEFAULT_ERROR_RATE) -> None:
+        self.capacity = max(1, capacity)
+        self.bit_count = math.ceil(
+            -self.capacity * math.log(error_rate) / math.log(2) ** 2
+        )
+        # At most 8 positions of 4 bytes in a 32 bytes digest.
+        self.hash_count = min(
+            8, max(1, round(self.bit_count / self.capacity * math.log(2)))
+        )
+        self.count = 0
+        self._bits = bytearray((self.bit_count + 7) // 8)
+
+    def _positions(self, digest: bytes) -> Iterable[int]:
+        for i in range(0, self.hash_count * 4, 4):
+            yield int.from_bytes(digest[i : i + 4], "little") % self.bit_count
+
+    def add(self, digest: bytes) -> None:
+        for position in self._positions(digest):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(digest)
+        )
+
+
+class OwnedScriptIndex:
+    """
+    Matches the scripts owned by a wallet, by the SHA256 of the raw script, so that the
+    outputs of a tx are classified without encoding their addresses.
+
+    The address data loaded in memory are kept by script. The scripts of all the
+    addresses of the wallet are in a Bloom filter, so that foreign scripts, like most
+    outputs of a coinjoin, are rejected without querying the DB. Only the scripts
+    passing the filter but not loaded are loaded with `load_address_data`.
+
+    load_script_hashes: returns the Electrum script hashes of all the wallet addresses.
+    load_address_data: returns the address data of an Electrum script hash, if any.
+    """
+
+    def __init__(
+        self,
+        load_script_hashes: Callable[[], Iterable[str]],
+        load_address_data: Callable[[str], Optional[Any]],
+        error_rate: float = DEFAULT_ERROR_RATE,
+    ) -> None:
+        self._load_script_hashes = load_script_hashes
+        self._load_address_data = load_address_data
+        self._error_rate = error_rate
+
+        # SHA256 of the script => address data
+        self._address_data: Dict[bytes, Any] = {}
+        # The scripts that passed the filter, but aren't owned.
+        self._not_owned: Set[bytes] = set()
+
+        self.filter_rejects = 0
+        self.loads = 0
+        self.false_positives = 0
+        self._rebuild_filter()
+
+    def _rebuild_filter(self) -> None:
+        digests = {
+            script_hash_to_digest(script_hash)
+            for script_hash in self._load_script_hashes()
+        }
+        # The address data not saved in the DB yet.
+        digests.update(self._address_data)
+
+        self._filter = BloomFilter(
+            max(MIN_FILTER_CAPACITY, 2 * len(digests)), self._error_rate
+        )
+        for digest in digests:
+            self._filter.add(digest)
+
+    def add(self, address_data) -> None:
+        digest = script_hash_to_digest(address_data.script_hash)
+        if digest in self._address_data:
+            self._address_data[digest] = address_data
+            return
+
+        self._address_data[digest] = address_data
+        self._not_owned.discard(digest)
+        if self._filter.count >= self._filter.capacity:
+            self._rebuild_filter()
+        else:
+            self._filter.add(digest)
+
+    def lookup(self, script: bytes) -> Optional[Any]:
+        """
+        Return the address data of script if it belongs to the wallet, None otherwise.
+        """
+        digest = hashlib.sha256(script).digest()
+        address_data = self._address_data.get(digest)
+        if address_data is not None:
+            return address_data
+        if digest not in self._filter:
+            self.filter_rejects += 1
+            return None
+        if digest in self._not_owned:
+            return None
+
+        self.loads += 1
+        address_data = self._load_address_data(digest[::-1].hex())
+        if address_data is None:
+            self.false_positives += 1
+            self._not_owned.add(digest)
+            return None
+        self._address_data[digest] = address_data
+        return address_data
+
+    def __contains__(self, script: bytes) -> bool:
+        return self.lookup(script) is not None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "loaded_scripts": len(self._address_data),
+            "filter_capacity": self._filter.capacity,
+            "filter_count": self._filter.count,
+            "filter_rejects": self.filter_rejects,
+            "loads": self.loads,
+            "false_positives": self.false_positives,
+        }
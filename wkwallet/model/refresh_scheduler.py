@@ -0,0 +1,144 @@
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Any, Deque, Dict, Optional
+
+
+class RefreshPriority(IntEnum):
+    # The receiving addresses, where new deposits show up.
+    EXTERNAL = 0
+    # The addresses with a balance or unconfirmed txs.
+    ACTIVE = 1
+    # The scan of the internal (change) chains.
+    INTERNAL = 2
+    # The background parsing of the tx history, see HistoryBackfill. Its pending count
+    # is in txs.
+    BACKFILL = 3
+
+
+class RefreshScheduler:
+    """
+    Shares the request budget of the Electrum connection between the refreshing wallets.
+
+    Wallets don't send their address batches themselves: they queue the addresses by
+    priority and `notify` the scheduler, which starts their batches whenever the request
+    window has room. The wallet shown in the UI goes first, except for its backfill,
+    then batches are granted by priority, round-robin between the wallets having
+    addresses of that priority.
+
+    A wallet is any object with:
+      - `pending_update_addresses_count(priority) -> int`
+      - `start_refresh_batch(priority, batch_size) -> Optional[asyncio.Task]`
+    """
+
+    def __init__(self, request_window) -> None:
+        self._request_window = request_window
+        self._foreground_wallet = None
+
+        # Wallets with pending addresses, in round-robin order, per priority.
+        self._ready: Dict[RefreshPriority, Deque[Any]] = {
+            priority: deque() for priority in RefreshPriority
+        }
+        # When a (wallet, priority) last started waiting for a batch.
+        self._waiting_since: Dict[tuple, float] = {}
+
+        self.in_flight = 0
+        self._wait_count = {priority: 0 for priority in RefreshPriority}
+        self._total_wait = {priority: 0.0 for priority in RefreshPriority}
+        self._max_wait = {priority: 0.0 for priority in RefreshPriority}
+
+    def set_foreground_wallet(self, wallet) -> None:
+        self._foreground_wallet = wallet
+
+    def notify(self, wallet) -> None:
+        """
+        The wallet has queued addresses to update.
+        """
+        now = time.monotonic()
+        for priority in RefreshPriority:
+            if wallet.pending_update_addresses_count(priority) <= 0:
+                continue
+            if wallet not in self._ready[priority]:
+                self._ready[priority].append(wallet)
+                self._waiting_since[(wallet, priority)] = now
+        self._schedule()
+
+    def _next_batch(self) -> Optional[tuple]:
+        for priority in RefreshPriority:
+            if priority == RefreshPriority.BACKFILL:
+                break
+            ready = self._ready[priority]
+            if self._foreground_wallet in ready:
+                return self._foreground_wallet, priority
+        for priority in RefreshPriority:
+            if self._ready[priority]:
+                return self._ready[priority][0], priority
+        return None
+
+    def _schedule(self) -> None:
+        while self._request_window.has_capacity():
+            next_batch = self._next_batch()
+            if next_batch is None:
+                return
+            wallet, priority = next_batch
+
+            # Round-robin: the wallet goes to the back of the queue.
+            ready = self._ready[priority]
+            ready.remove(wallet)
+            task = wallet.start_refresh_batch(priority, self._request_window.batch_size)
+
+            now = time.monotonic()
+            waiting_since = self._waiting_since.pop((wallet, priority))
+            if task is None:
+                continue
+            self._record_wait(priority, now - waiting_since)
+            if wallet.pending_update_addresses_count(priority) > 0:
+                ready.append(wallet)
+                self._waiting_since[(wallet, priority)] = now
+
+            self.in_flight += 1
+            self._request_window.acquire()
+            task.add_done_callback(self._batch_completed)
+
+    def _batch_completed(self, _) -> None:
+        self.in_flight -= 1
+        self._request_window.release()
+        self._schedule()
+
+    def _record_wait(self, priority: RefreshPriority, wait: float) -> None:
+        self._wait_count[priority] += 1
+        self._total_wait[priority] += wait
+        self._max_wait[priority] = max(self._max_wait[priority], wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        The number of batches in flight, and per priority the number of waiting wallets,
+        of queued addresses and the time batches waited to be started.
+        """
+        priorities = {}
+        for priority in RefreshPriority:
+            count = self._wait_count[priority]
+            priorities[priority.name] = {
+                "waiting_wallets": len(self._ready[priority]),
+                "queue_depth": sum(
+                    wallet.pending_update_addresses_count(priority)
+                    for wallet in self._ready[priority]
+                ),
+                "started_batches": count,
+                "avg_wait": self._total_wait[priority] / count if count else 0.0,
+                "max_wait": self._max_wait[priority],
+            }
+        return {"in_flight": self.in_flight, "priorities": priorities}
+
+
+_refresh_scheduler = None
+
+
+def refresh_scheduler() -> RefreshScheduler:
+    global _refresh_scheduler
+    if not _refresh_scheduler:
+        # Imported here so that the scheduler can be used without the Electrum client.
+        from electrum_client import electrum_client
+
+        _refresh_scheduler = RefreshScheduler(electrum_client.request_window)
+    return _refresh_scheduler
@@ -0,0 +1,54 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from kivy.logger import Logger
+
+# The workers of the background executor, which runs the blocking loads of the wallets
+# (the tx managers) and the HTTP requests off the network loop.
+BACKGROUND_WORKERS = 2
+
+_background_executor: Optional[ThreadPoolExecutor] = None
+
+
+def background_executor() -> ThreadPoolExecutor:
+    """
+    The executor shared by all the wallets for their blocking work. Along with the
+    network loop of the electrum client and the thread of the write-behind buffer, its
+    workers are the threads of the app, however many wallets there are.
+    """
+    global _background_executor
+    if not _background_executor:
+        _background_executor = ThreadPoolExecutor(
+            BACKGROUND_WORKERS, thread_name_prefix="background"
+        )
+    return _background_executor
+
+
+def rss_bytes() -> Optional[int]:
+    """
+    The resident set size of the process, None if it can't be read.
+    """
+    try:
+        # Linux and Android.
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # The peak RSS, in KiB on Linux and in bytes on macOS.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if os.uname().sysname == "Darwin" else max_rss * 1024
+
+
+def log_runtime_stats(context: str) -> None:
+    rss = rss_bytes()
+    rss_text = f"{rss / 2**20:.1f} MiB" if rss is not None else "unknown"
+    Logger.info(
+        f"WKWallet: Runtime {context}: {threading.active_count()} threads, "
+        f"RSS {rss_text}"
+    )
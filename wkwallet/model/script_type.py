@@ -38,6 +38,9 @@ class ScriptType:
         def address(self):
             return BTC.address.for_p2pkh(self.key.hash160())
 
+        def script(self):
+            return BTC.contract.for_p2pkh(self.key.hash160())
+
         @classmethod
         def derivation_path(cls):
             return "44p/0p"
@@ -48,8 +51,10 @@ class ScriptType:
 
     class SH_WPKH(BaseScriptType):
         def address(self):
-            wpkh_script = BTC.contract.for_p2pkh_wit(self.key.hash160())
-            return BTC.address.for_p2s(wpkh_script)
+            return BTC.address.for_p2s(self._wpkh_script())
+
+        def script(self):
+            return BTC.contract.for_p2s(self._wpkh_script())
 
         @classmethod
         def derivation_path(cls):
@@ -59,6 +64,9 @@ class ScriptType:
         def script_type_name(cls):
             return "SH_WPKH"
 
+        def _wpkh_script(self):
+            return BTC.contract.for_p2pkh_wit(self.key.hash160())
+
     class WPKH(BaseScriptType):
         def __init__(self, key: pycoin.key.Key.Key, address_index=None) -> None:
             super().__init__(key, address_index)
@@ -0,0 +1,133 @@
+"""
+BIP32 public child key derivation (CKDpub) on libsecp256k1, through ctypes.
+
+The library is the one python-bitcoinlib loads for signing when it's present. When it
+isn't available, `is_available()` is False and callers fall back to pycoin.
+"""
+import ctypes
+import ctypes.util
+import hashlib
+import hmac
+import threading
+from typing import Optional, Tuple
+
+from kivy.logger import Logger
+
+SECP256K1_CONTEXT_VERIFY = (1 << 0) | (1 << 8)
+SECP256K1_EC_COMPRESSED = (1 << 1) | (1 << 8)
+
+_lock = threading.Lock()
+_loaded = False
+_lib = None
+_context = None
+
+
+def _load_library(path: Optional[str]):
+    try:
+        from bitcoin.core import key as bitcoin_key
+    except ImportError:
+        bitcoin_key = None
+
+    if path is None and bitcoin_key is not None:
+        # Reuse the library already loaded by python-bitcoinlib, if any.
+        if bitcoin_key._libsecp256k1 is not None:
+            return bitcoin_key._libsecp256k1
+        path = bitcoin_key._libsecp256k1_path
+    if path is None:
+        path = ctypes.util.find_library("secp256k1")
+    if path is None:
+        return None
+    return ctypes.cdll.LoadLibrary(path)
+
+
+def load_libsecp256k1(path: Optional[str] = None) -> bool:
+    """
+    Load libsecp256k1 and create the context used for derivation. It's called on the
+    first use, calling it with a path loads that library instead.
+    """
+    global _loaded, _lib, _context
+
+    with _lock:
+        if _loaded and path is None:
+            return _context is not None
+        _loaded = True
+        _lib, _context = None, None
+        try:
+            lib = _load_library(path)
+            if lib is None:
+                return False
+
+            lib.secp256k1_context_create.restype = ctypes.c_void_p
+            lib.secp256k1_context_create.argtypes = [ctypes.c_uint]
+            lib.secp256k1_ec_pubkey_parse.restype = ctypes.c_int
+            lib.secp256k1_ec_pubkey_parse.argtypes = [
+                ctypes.c_void_p,
+                ctypes.c_char_p,
+                ctypes.c_char_p,
+                ctypes.c_size_t,
+            ]
+            lib.secp256k1_ec_pubkey_tweak_add.restype = ctypes.c_int
+            lib.secp256k1_ec_pubkey_tweak_add.argtypes = [
+                ctypes.c_void_p,
+                ctypes.c_char_p,
+                ctypes.c_char_p,
+            ]
+            lib.secp256k1_ec_pubkey_serialize.restype = ctypes.c_int
+            lib.secp256k1_ec_pubkey_serialize.argtypes = [
+                ctypes.c_void_p,
+                ctypes.c_char_p,
+                ctypes.POINTER(ctypes.c_size_t),
+                ctypes.c_char_p,
+                ctypes.c_uint,
+            ]
+
+            # A context of our own, the one of python-bitcoinlib is for signing.
+            context = lib.secp256k1_context_create(SECP256K1_CONTEXT_VERIFY)
+            if not context:
+                return False
+        except (OSError, AttributeError) as e:
+            Logger.warning(f"WKWallet: Unable to load libsecp256k1: {e}")
+            return False
+
+        _lib, _context = lib, context
+        Logger.info("WKWallet: Using libsecp256k1 for key derivation")
+        return True
+
+
+def is_available() -> bool:
+    if _loaded:
+        return _context is not None
+    return load_libsecp256k1()
+
+
+def ckd_pub(sec: bytes, chain_code: bytes, index: int) -> Tuple[bytes, bytes]:
+    """
+    Derive the non-hardened child `index` of the public node (sec, chain_code), and
+    return the (compressed sec, chain code) of the child.
+    """
+    if index < 0 or index >= 0x80000000:
+        raise ValueError(f"Invalid non-hardened index: {index}")
+    if not is_available():
+        raise RuntimeError("libsecp256k1 is not available")
+
+    I = hmac.new(chain_code, sec + index.to_bytes(4, "big"), hashlib.sha512).digest()
+    I_left, child_chain_code = I[:32], I[32:]
+
+    pubkey = ctypes.create_string_buffer(64)
+    if not _lib.secp256k1_ec_pubkey_parse(_context, pubkey, sec, len(sec)):
+        raise ValueError("Invalid public key")
+    # Fails if I_left isn't lower than the curve order, or the child is the point at
+    # infinity, in which case the index is invalid.
+    if not _lib.secp256k1_ec_pubkey_tweak_add(_context, pubkey, I_left):
+        raise ValueError(f"Invalid child index: {index}")
+
+    child_sec = ctypes.create_string_buffer(33)
+    child_sec_len = ctypes.c_size_t(33)
+    _lib.secp256k1_ec_pubkey_serialize(
+        _context,
+        child_sec,
+        ctypes.byref(child_sec_len),
+        pubkey,
+        SECP256K1_EC_COMPRESSED,
+    )
+    return child_sec.raw[: child_sec_len.value], child_chain_code
@@ -1,46 +1,75 @@
 import asyncio
-from typing import Dict, Iterator, Optional, Set
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
 
+from db.base_model import pooled_reads
+from db.raw_tx_store import raw_tx_store
 from db.tx_data import TxData
 from db.wallet_data import WalletData
+from db.write_behind_buffer import write_behind_buffer
 from electrum_client import electrum_client
 from kivy.logger import Logger
-from utils import create_async_io_background_loop
 
 from .block_manager import block_manager
 
 
 class TxManager:
-    def __init__(self, wallet_data: WalletData) -> None:
+    def __init__(
+        self,
+        wallet_data: WalletData,
+        tx_heights: Optional[Iterable[Tuple[str, int, bool]]] = None,
+    ) -> None:
+        """
+        tx_heights: (tx_id, height, is_processed) of all the txs of the wallet, from its
+            snapshot, see db.wallet_snapshot. The TxData are then loaded on first use.
+        """
         self._wallet_data = wallet_data
-        self._loop = create_async_io_background_loop()
 
         self._tx_id_set: Set[str] = set()
         self._parsed_tx_ids: Set[str] = set()
         self._pending_tx_ids: Set[str] = set()
         self._height_to_tx_ids: Dict[int, Set[str]] = {}
 
-        self._tx_id_to_data: Dict[str, TxData] = {}
-        self._tx_id_to_event: Dict[str, asyncio.Event] = {}
+        self._loaded_tx_id_to_data: Optional[Dict[str, TxData]] = None
 
-        for tx_data in wallet_data.txs:
-            tx_id = tx_data.tx_id
-            self._tx_id_set.add(tx_id)
-            self._tx_id_to_data[tx_id] = tx_data
-            if tx_data.is_processed:
-                self._parsed_tx_ids.add(tx_id)
-            if tx_data.height <= 0:
-                self._pending_tx_ids.add(tx_id)
-            else:
-                if self._height_to_tx_ids.get(tx_data.height) is None:
-                    self._height_to_tx_ids[tx_data.height] = set()
-                self._height_to_tx_ids[tx_data.height].add(tx_id)
+        if tx_heights is None:
+            with pooled_reads():
+                self._load_txs()
+        else:
+            for tx_id, height, is_processed in tx_heights:
+                self._index_tx(tx_id, height, is_processed)
 
-    def save_data(self, data):
-        async def save_data_async(data):
-            data.save()
+    @property
+    def _tx_id_to_data(self) -> Dict[str, TxData]:
+        if self._loaded_tx_id_to_data is None:
+            with pooled_reads():
+                self._load_txs()
+        return self._loaded_tx_id_to_data
+
+    def _load_txs(self) -> None:
+        self._loaded_tx_id_to_data = {}
+        for tx_data in self._wallet_data.txs:
+            self._loaded_tx_id_to_data[tx_data.tx_id] = tx_data
+            self._index_tx(tx_data.tx_id, tx_data.height, tx_data.is_processed)
+
+        # Load the decoded txs in one query, so that the txs are classified without
+        # being deserialized.
+        raw_tx_store().prefetch(
+            TxData.select(TxData.tx_id).where(TxData.wallet == self._wallet_data)
+        )
+
+    def _index_tx(self, tx_id: str, height: int, is_processed: bool) -> None:
+        self._tx_id_set.add(tx_id)
+        if is_processed:
+            self._parsed_tx_ids.add(tx_id)
+        if height <= 0:
+            self._pending_tx_ids.add(tx_id)
+        else:
+            if self._height_to_tx_ids.get(height) is None:
+                self._height_to_tx_ids[height] = set()
+            self._height_to_tx_ids[height].add(tx_id)
 
-        asyncio.run_coroutine_threadsafe(save_data_async(data), self._loop)
+    def save_data(self, data):
+        write_behind_buffer().save(data)
 
     def tx_heights(self):
         return self._height_to_tx_ids.keys()
@@ -49,12 +78,14 @@ class TxManager:
         return self._height_to_tx_ids[height]
 
     def remove_tx(self, tx_id: str) -> None:
+        # Loaded first, the loading indexes the txs again.
+        tx_id_to_data = self._tx_id_to_data
         if tx_id in self._pending_tx_ids:
             self._pending_tx_ids.remove(tx_id)
 
-        if tx_id in self._tx_id_to_data:
-            self._tx_id_to_data[tx_id].delete_instance(recursive=True)
-            del self._tx_id_to_data[tx_id]
+        if tx_id in tx_id_to_data:
+            write_behind_buffer().delete(tx_id_to_data[tx_id])
+            del tx_id_to_data[tx_id]
 
     def get_tx(self, tx_id: str) -> Optional[TxData]:
         return self._tx_id_to_data.get(tx_id)
@@ -67,8 +98,6 @@ class TxManager:
         return (tx_id not in self._parsed_tx_ids) or (tx_id in self._pending_tx_ids)
 
     async def add_tx_async(self, tx_id: str, height: int) -> None:
-        block = await block_manager().get_block(height)
-
         if tx_id not in self._tx_id_to_data:
             self._tx_id_to_data[tx_id] = TxData(
                 wallet=self._wallet_data,
@@ -91,14 +120,34 @@ class TxManager:
             if tx_id in self._pending_tx_ids:
                 self._pending_tx_ids.remove(tx_id)
 
-        if block is not None and (self._tx_id_to_data[tx_id].timestamp is None):
-            # Update the height and timestamp of the tx_data
-            self._tx_id_to_data[tx_id].height = height
-            self._tx_id_to_data[tx_id].timestamp = block.timestamp
-            self.save_data(self._tx_id_to_data[tx_id])
-            Logger.debug(
-                f"Saved block for raw_tx: {tx_id}, block: {block}, height: {height}"
-            )
+        tx_data = self._tx_id_to_data[tx_id]
+        if height > 0 and (tx_data.timestamp is None or tx_data.height != height):
+            # Update the height and timestamp of the tx_data. The timestamp stays None
+            # until the header of the block is fetched, see `update_tx_timestamps`.
+            tx_data.height = height
+            tx_data.timestamp = block_manager().get_blocktime(height)
+            self.save_data(tx_data)
+            Logger.debug(f"Saved height for raw_tx: {tx_id}, height: {height}")
+
+    def update_tx_timestamps(self) -> None:
+        """
+        Set the timestamps of the confirmed txs whose block header has been fetched since
+        they were added.
+        """
+        tx_id_to_data = self._tx_id_to_data
+        for height, tx_ids in self._height_to_tx_ids.items():
+            blocktime = None
+            for tx_id in tx_ids:
+                tx_data = tx_id_to_data.get(tx_id)
+                if tx_data is None or tx_data.timestamp is not None:
+                    continue
+                if blocktime is None:
+                    blocktime = block_manager().get_blocktime(height)
+                    if blocktime is None:
+                        break
+                tx_data.height = height
+                tx_data.timestamp = blocktime
+                self.save_data(tx_data)
 
     async def get_tx_with_data(self, tx_id) -> Optional[TxData]:
         if tx_id not in self._tx_id_to_data:
@@ -107,35 +156,41 @@ class TxManager:
                 tx_id=tx_id,
             )
             self.save_data(self._tx_id_to_data[tx_id])
-        # Return the tx_object directly if it is a confirmed tx
-        if (
-            self._tx_id_to_data[tx_id].tx_object is not None
-            and self._tx_id_to_data[tx_id].height > 0
-        ):
-            return self._tx_id_to_data[tx_id]
-
         tx_data = self._tx_id_to_data[tx_id]
-
-        if tx_id not in self._tx_id_to_event:
-            event = asyncio.Event()
-            self._tx_id_to_event[tx_id] = event
-            try:
-                tx_data.hex = await electrum_client.rpc(
-                    "blockchain.transaction.get", [tx_id]
-                )
-                if tx_data.hex is None:
-                    return None
-                tx_data.save()
-            except Exception as e:
-                Logger.error(f"Unable to fetch tx {tx_id}, error: {e}")
-
-                tx_data.delete_instance(recursive=True)
-                del self._tx_id_to_data[tx_id]
-                tx_data = None
-            event.set()
-        else:
-            await self._tx_id_to_event[tx_id].wait()
-            tx_data = self._tx_id_to_data.get(tx_id)
+        # Return the tx directly if it is a confirmed tx fetched already, by this wallet
+        # or another one.
+        if tx_data.height > 0 and raw_tx_store().contains(tx_id):
+            return await self._saved(tx_data)
+
+        try:
+            # The electrum client fetches a tx requested by several wallets at once
+            # only once, and sends the fetches requested around the same time as one
+            # batch.
+            tx_hex = await electrum_client.get_transaction(tx_id)
+        except Exception as e:
+            # Keep the tx, a failed fetch doesn't mean the tx has been dropped from the
+            # mempool. The next call fetches it again.
+            Logger.error(f"Unable to fetch tx {tx_id}, error: {e}")
+            raise
+        if tx_hex is None:
+            return None
+        # Decoded once, and stored unless another wallet stored it already.
+        raw = bytes.fromhex(tx_hex)
+        await asyncio.wrap_future(
+            write_behind_buffer().submit(lambda: raw_tx_store().add(tx_id, raw))
+        )
+        return await self._saved(tx_data)
+
+    async def _saved(self, tx_data: TxData) -> TxData:
+        # Saved right away if it's new, the UTXOs of the tx reference it.
+        if tx_data.id is None:
+
+            def insert():
+                # Inserted by the flush preceding the writes, unless it failed.
+                if tx_data.id is None:
+                    write_behind_buffer().save_now(tx_data)
+
+            await asyncio.wrap_future(write_behind_buffer().submit(insert))
         return tx_data
 
     def contains_tx(self, tx_id: str) -> bool:
@@ -152,6 +207,6 @@ class TxManager:
         if tx_id not in self._parsed_tx_ids:
             tx_data.balance_change = balance_change
             tx_data.is_processed = True
-            tx_data.save()
+            self.save_data(tx_data)
 
             self._parsed_tx_ids.add(tx_id)
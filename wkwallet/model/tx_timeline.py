@@ -0,0 +1,83 @@
+import heapq
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from db.base_model import pooled_reads
+from db.tx_data import TxData
+from db.wallet_data import WalletData
+from peewee import Tuple as SqlTuple
+
+# The sort height of the unconfirmed txs, listed before the confirmed ones.
+PENDING_SORT_HEIGHT = 2**31 - 1
+
+
+class TxCursor(NamedTuple):
+    """
+    The position of a tx in the timeline, which is sorted by (sort_height, tx_id)
+    descending. A page starts after the cursor of the last tx of the previous page.
+    """
+
+    sort_height: int
+    tx_id: str
+
+
+def tx_cursor(tx_data: TxData) -> TxCursor:
+    if tx_data.height <= 0:
+        return TxCursor(PENDING_SORT_HEIGHT, tx_data.tx_id)
+    return TxCursor(tx_data.height, tx_data.tx_id)
+
+
+def wallet_txs_page(
+    wallet_data: WalletData, after: Optional[TxCursor] = None, count: int = 20
+) -> List[TxData]:
+    """
+    The txs of a wallet after the cursor `after`: the unconfirmed txs, then the parsed
+    confirmed txs from the most recent. The confirmed txs are read from the (wallet,
+    is_processed, height, tx_id) index of TxData, so a page costs the same at any depth.
+    The txs are read from the read pool.
+    """
+    with pooled_reads():
+        txs: List[TxData] = []
+        if after is None or after.sort_height == PENDING_SORT_HEIGHT:
+            pending_query = TxData.select().where(
+                (TxData.wallet == wallet_data) & (TxData.height <= 0)
+            )
+            if after is not None:
+                pending_query = pending_query.where(TxData.tx_id < after.tx_id)
+            txs.extend(pending_query.order_by(TxData.tx_id.desc()).limit(count))
+            after = None
+        if len(txs) >= count:
+            return txs
+
+        confirmed_query = TxData.select().where(
+            (TxData.wallet == wallet_data)
+            & (TxData.is_processed == True)
+            & (TxData.height > 0)
+        )
+        if after is not None:
+            confirmed_query = confirmed_query.where(
+                SqlTuple(TxData.height, TxData.tx_id)
+                < SqlTuple(after.sort_height, after.tx_id)
+            )
+        confirmed_query = confirmed_query.order_by(
+            TxData.height.desc(), TxData.tx_id.desc()
+        )
+        txs.extend(confirmed_query.limit(count - len(txs)))
+        return txs
+
+
+def timeline_page(
+    wallets_data: Iterable[WalletData],
+    after: Optional[TxCursor] = None,
+    count: int = 20,
+) -> Tuple[List[TxData], Optional[TxCursor]]:
+    """
+    The txs of several wallets after the cursor `after`, merged into one timeline.
+    Return the txs and the cursor of the next page, None if it's the last page.
+    """
+    with pooled_reads():
+        wallet_pages = [
+            wallet_txs_page(wallet_data, after, count) for wallet_data in wallets_data
+        ]
+    txs = list(heapq.merge(*wallet_pages, key=tx_cursor, reverse=True))[:count]
+    next_cursor = tx_cursor(txs[-1]) if len(txs) == count else None
+    return txs, next_cursor
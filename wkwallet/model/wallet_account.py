@@ -3,8 +3,8 @@ from typing import Any, Dict, Optional, Set, Type
 from db.account_data import AccountData
 from db.address_data import AddressData
 from db.chain_data import ChainData
-from pycoin.symbols.btc import network as BTC
 
+from .address_deriver import AddressDeriver
 from .script_type import ScriptType, script_types
 
 
@@ -38,7 +38,7 @@ class WalletAccount:
         self.data = account_data
 
         self.xpub = account_data.xpub
-        self.master_key = BTC.parse(self.xpub)
+        self.master_key = account_data.master_pub_key
         self.chains = {}  # type: Dict[int, Any]
         for chain_data in account_data.chains:
             self.chains[chain_data.chain_index] = script_types[
@@ -54,6 +54,8 @@ class WalletAccount:
             else:
                 self.disable_fidelity_bonds()
 
+        self.address_deriver = AddressDeriver(self.master_key, self.chains)
+
     def update_balance(self):
         self.balance = sum(
             addr_data.total_balance for addr_data in self.active_addresses
@@ -92,12 +94,7 @@ class WalletAccount:
         chain_index, address_index = path.split("/")
         chain_index, address_index = int(chain_index), int(address_index)
 
-        if not chain_index in self.chains:
-            return None
-
-        script_type = self.chains[chain_index]
-        key = self.master_key.subkey_for_path(path)
-        return script_type(key, address_index)
+        return self.address_deriver.script_object(chain_index, address_index)
 
     def address_for_path(self, path: str) -> Optional[str]:
         script_object = self.script_object_for_path(path)
@@ -7,6 +7,7 @@ from android_utils import android_open_file, android_save_string_to_file
 from db.address_data import AddressData
 from db.tx_data import TxData
 from db.wallet_data import WalletData
+from db.write_behind_buffer import write_behind_buffer
 from kivy import platform
 from kivy.logger import Logger
 from kivy.logger import LoggerHistory
@@ -73,7 +74,7 @@ def import_label_jsonl(label_jsonl, target_wallet_data: WalletData):
         for tx_data in TxData.select().where(TxData.tx_id == ref):
             if target_wallet_data is None or tx_data.wallet == target_wallet_data:
                 tx_data.label = label
-                tx_data.save()
+                write_behind_buffer().save(tx_data)
                 Logger.debug(f"Tx label saved: {label} -> {ref}")
     elif type == "addr":
         for addr_data in AddressData.select().where(AddressData.address_str == ref):
@@ -82,12 +83,12 @@ def import_label_jsonl(label_jsonl, target_wallet_data: WalletData):
                 or addr_data.account.wallet == target_wallet_data
             ):
                 addr_data.label = label
-                addr_data.save()
+                write_behind_buffer().save(addr_data)
                 Logger.debug(f"Addr label saved: {label} -> {ref}")
     elif type == "xpub":
         if target_wallet_data.accounts[0].xpub == ref:
             target_wallet_data.name = label
-            target_wallet_data.save()
+            write_behind_buffer().save(target_wallet_data)
             Logger.debug(f"Xpub label saved: {label} -> {ref}")
 
 
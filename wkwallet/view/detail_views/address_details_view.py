@@ -1,4 +1,5 @@
 from db.address_data import AddressData
+from db.write_behind_buffer import write_behind_buffer
 from kivy.lang import Builder
 from kivy.properties import ObjectProperty
 from kivy.uix.screenmanager import Screen
@@ -27,7 +28,7 @@ class AddressDetailsView(Screen):
 
     def on_pre_leave(self, *args):
         self.address_data.label = self.address_label_input.text
-        self.address_data.save()
+        write_behind_buffer().save(self.address_data)
         return super().on_pre_leave(*args)
 
     def on_pre_enter(self, *args):
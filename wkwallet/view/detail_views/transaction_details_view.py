@@ -1,4 +1,5 @@
 from db.tx_data import TxData
+from db.write_behind_buffer import write_behind_buffer
 from kivy.lang import Builder
 from kivy.properties import ObjectProperty
 from kivy.uix.screenmanager import Screen
@@ -23,9 +24,16 @@ class TransactionDetailsView(Screen):
 
     def on_pre_enter(self, *args):
         self.ids.balance_change_label.text = "{:,}".format(self.tx_data.balance_change)
+        # The fee is only known for the txs whose inputs are all from this wallet.
+        fee = self.tx_data.fee
+        if fee is None:
+            self.ids.fee_label.text = ""
+        else:
+            vsize = self.tx_data.decoded_tx.vsize
+            self.ids.fee_label.text = f"Fee: {fee:,} sats ({fee / vsize:.1f} sat/vB)"
         return super().on_pre_enter(*args)
 
     def on_pre_leave(self, *args):
         self.tx_data.label = self.tx_label_input.text
-        self.tx_data.save()
+        write_behind_buffer().save(self.tx_data)
         return super().on_pre_leave(*args)
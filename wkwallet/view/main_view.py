@@ -1,5 +1,5 @@
 import asyncio
-from typing import List
+from typing import List, Optional
 
 from db.tx_data import TxData
 from electrum_client import electrum_client
@@ -15,6 +15,8 @@ from kivymd.uix.dialog import MDDialog
 from kivymd.uix.list import OneLineAvatarListItem
 from kivymd.uix.menu import MDDropdownMenu
 from model.exchange_rate_manager import exchange_rate_manager, toggle_currency
+from model.history_backfill import BackfillProgress
+from model.tx_timeline import TxCursor, timeline_page
 from settings_manager import settings_manager
 from tx_summary_view_model import TxSummaryRow
 from utils import limit_length
@@ -25,11 +27,27 @@ from wallet_manager import WalletsObserver, wallet_manager
 
 Builder.load_file("view/main_view.kv")
 
+# The balance shown until it's known.
+BALANCE_PLACEHOLDER = "- sats"
+
+
+def history_status(progress: BackfillProgress) -> str:
+    """
+    The progress of the history backfill of a wallet, as shown on its card. Until the
+    backfill is started, the cursor is the one saved by the last one.
+    """
+    if not progress.completed:
+        return f"History: {progress.parsed_count:,} of {progress.total_count:,} txs"
+    if progress.cursor_height is not None:
+        return f"History from block {progress.cursor_height:,}"
+    return ""
+
 
 class WalletCard(MDCard):
     wallet = ObjectProperty()  # type: Wallet
     title = StringProperty()
     balance = StringProperty()
+    history_status = StringProperty()
     manager = ObjectProperty()
 
     def on_release(self):
@@ -86,6 +104,8 @@ class MainView(Screen, WalletsObserver):
 
         self.wallet_cards = []
         self.connect_callback = None
+        # The cursor of the next page of the tx history, None when it's all loaded.
+        self.next_txs_cursor: Optional[TxCursor] = None
 
         menu_items = [
             {
@@ -113,6 +133,15 @@ class MainView(Screen, WalletsObserver):
         )
         self.connect()
 
+    @mainthread
+    def on_history_backfill_progress(self, wallet, progress):
+        for wallet_card in self.wallet_cards:
+            if wallet_card.wallet is wallet:
+                wallet_card.history_status = history_status(progress)
+        if progress.completed:
+            # The balance changes of the txs parsed by the backfill are now known.
+            self.update_ui()
+
     def on_enter(self, *args):
         wallet_manager().register_observer(self)
         self.update_ui()
@@ -205,9 +234,14 @@ class MainView(Screen, WalletsObserver):
 
     @mainthread
     def refresh(self):
-        self.balance_button.text = "- sats"
+        self.balance_button.text = BALANCE_PLACEHOLDER
         self.wallet_cards = [
-            WalletCard(wallet=wallet, title=wallet.wallet_title(), manager=self.manager)
+            WalletCard(
+                wallet=wallet,
+                title=wallet.wallet_title(),
+                history_status=history_status(wallet.history_backfill_progress()),
+                manager=self.manager,
+            )
             for wallet in wallet_manager().wallets
         ]
         self.ids.wallet_cards.clear_widgets()
@@ -258,14 +292,16 @@ class MainView(Screen, WalletsObserver):
             self.balance_button.text = "all wallets hidden"
         else:
             self.balance_button.disabled = False
-            total_balance = sum(
-                wallet.total_balance if not wallet.is_hidden() else 0
-                for wallet in wallet_manager().wallets
-            )
-            self.balance_button.text = exchange_rate_manager.format_balance(
-                total_balance,
-                settings_manager.currency,
-            )
+            shown_wallets = [
+                wallet for wallet in wallet_manager().wallets if not wallet.is_hidden()
+            ]
+            if all(wallet.is_loaded for wallet in shown_wallets):
+                self.balance_button.text = exchange_rate_manager.format_balance(
+                    sum(wallet.total_balance for wallet in shown_wallets),
+                    settings_manager.currency,
+                )
+            else:
+                self.balance_button.text = BALANCE_PLACEHOLDER
         self.refresh_spinner.active = wallet_manager().is_refreshing
         if self.receive_button.disabled:
             self.receive_button.disabled = wallet_manager().is_refreshing
@@ -276,19 +312,48 @@ class MainView(Screen, WalletsObserver):
             wallet_card.title = limit_length(
                 wallet_card.wallet.wallet_title(), MAX_WALLET_LABEL_LENGTH
             )
+            if not wallet_card.wallet.is_loaded:
+                wallet_card.balance = BALANCE_PLACEHOLDER
+                continue
             wallet_card.balance = exchange_rate_manager.format_balance(
                 wallet_card.wallet.total_balance,
                 wallet_card.wallet.data.currency,
             )
 
+        # The wallets are loaded off the UI thread, their balances are shown once loaded.
+        for wallet in wallet_manager().wallets:
+            if not wallet.is_loaded:
+                wallet.load_in_background(self.on_wallet_loaded)
+
+    @mainthread
+    def on_wallet_loaded(self, wallet):
+        self.update_toplevel_ui()
+
     def update_ui(self) -> None:
         self.update_toplevel_ui()
 
-        txs: List[TxData] = []
-        for wallet in wallet_manager().wallets:
-            txs += wallet.get_txs()
+        txs, self.next_txs_cursor = timeline_page(
+            wallet.data for wallet in wallet_manager().wallets
+        )
+        self.ids.tx_history_list.data = self.tx_history_list_data(txs)
+
+    def load_more_txs(self) -> None:
+        if self.next_txs_cursor is None:
+            return
+        txs, self.next_txs_cursor = timeline_page(
+            (wallet.data for wallet in wallet_manager().wallets),
+            self.next_txs_cursor,
+        )
+        self.ids.tx_history_list.data.extend(self.tx_history_list_data(txs))
+
+    def on_tx_history_scroll(self, scroll_y: float) -> None:
+        # scroll_y is 0 at the bottom of the list.
+        if scroll_y <= 0:
+            self.load_more_txs()
+
+    def tx_history_list_data(self, txs: List[TxData]) -> List[dict]:
         tx_history_rows = []
-        for tx in sorted(txs, reverse=True):
+        for tx in txs:
             tx_history_row = TxSummaryRow(
                 tx_data=tx,
                 tx_icon=(
@@ -302,7 +367,7 @@ class MainView(Screen, WalletsObserver):
                 ),
             )
             tx_history_rows.append(tx_history_row)
-        self.ids.tx_history_list.data = [
+        return [
             {
                 "viewclass": "TransactionListItem",
                 "tx_data": tx_history_row.tx_data,
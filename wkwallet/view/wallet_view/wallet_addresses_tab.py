@@ -114,7 +114,7 @@ class WalletAddressesTab(MDFloatLayout, MDTabsBase):
             for address_data in unused_addresses:
                 if not address_data.status:
                     address_data.status = "new"
-                    address_data.save()
+                    self.wallet.save_data(address_data)
                 address_list_item = AddressListItem(
                     account=account,
                     address_data=address_data,
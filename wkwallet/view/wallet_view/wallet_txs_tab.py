@@ -1,5 +1,6 @@
-from typing import List
+from typing import List, Optional
 
+from db.tx_data import TxData
 from kivy.clock import mainthread
 from kivy.lang import Builder
 from kivy.properties import ObjectProperty
@@ -8,6 +9,7 @@ from kivymd.uix.floatlayout import MDFloatLayout
 from kivymd.uix.recycleview import RecycleView
 from kivymd.uix.tab import MDTabsBase
 from model.exchange_rate_manager import exchange_rate_manager
+from model.tx_timeline import TxCursor, tx_cursor
 from tx_summary_view_model import TxSummaryRow
 from utils import limit_length
 from view.components.transaction_list_item import MAX_TX_LABEL_LEN
@@ -22,12 +24,30 @@ class WalletTxsTab(MDFloatLayout, MDTabsBase):
 
     tx_history_list: RecycleView = ObjectProperty()
 
+    # The cursor of the next page of the tx history, None when it's all loaded.
+    next_txs_cursor: Optional[TxCursor] = None
+
     @mainthread
     def update_ui(self) -> None:
         txs = self.wallet.get_txs()
+        self.next_txs_cursor = tx_cursor(txs[-1]) if txs else None
+        self.tx_history_list.data = self.tx_history_list_data(txs)
+
+    def load_more_txs(self) -> None:
+        if self.next_txs_cursor is None:
+            return
+        txs = self.wallet.get_txs(self.next_txs_cursor)
+        self.next_txs_cursor = tx_cursor(txs[-1]) if txs else None
+        self.tx_history_list.data.extend(self.tx_history_list_data(txs))
+
+    def on_tx_history_scroll(self, scroll_y: float) -> None:
+        # scroll_y is 0 at the bottom of the list.
+        if scroll_y <= 0:
+            self.load_more_txs()
 
+    def tx_history_list_data(self, txs: List[TxData]) -> List[dict]:
         tx_history_rows: List[TxSummaryRow] = []
-        for tx in sorted(txs, reverse=True):
+        for tx in txs:
             tx_history_row = TxSummaryRow(
                 tx_data=tx,
                 tx_icon=(
@@ -42,7 +62,7 @@ class WalletTxsTab(MDFloatLayout, MDTabsBase):
             )
             tx_history_rows.append(tx_history_row)
 
-        self.tx_history_list.data = [
+        return [
             {
                 "viewclass": "TransactionListItem",
                 "tx_data": tx_history_row.tx_data,
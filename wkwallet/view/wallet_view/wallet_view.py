@@ -8,6 +8,7 @@ from kivymd.uix.label import MDLabel
 from kivymd.uix.menu import MDDropdownMenu
 from kivymd.uix.spinner import MDSpinner
 from model.exchange_rate_manager import exchange_rate_manager, toggle_currency
+from model.refresh_scheduler import refresh_scheduler
 from utils import export_labels_to_file, import_labels_from_file, limit_length
 from view.wallet_view.wallet_addresses_tab import WalletAddressesTab
 from view.wallet_view.wallet_coins_tab import WalletCoinsTab
@@ -74,6 +75,8 @@ class WalletView(Screen, WalletsObserver):
 
     def set_wallet(self, wallet: Wallet):
         self.wallet = wallet
+        # The addresses of the shown wallet are refreshed first.
+        refresh_scheduler().set_foreground_wallet(wallet)
         Clock.schedule_once(lambda dt: self.update_ui(), 0.3)
 
     def on_enter(self, *args):
@@ -83,6 +86,7 @@ class WalletView(Screen, WalletsObserver):
 
     def on_leave(self, *args):
         wallet_manager().deregister_observer(self)
+        refresh_scheduler().set_foreground_wallet(None)
         return super().on_leave(*args)
 
     def on_balance_updated(self):
@@ -108,6 +112,10 @@ class WalletView(Screen, WalletsObserver):
     def on_tx_summaries_updated(self, refreshing_wallets):
         self.update_ui()
 
+    def on_history_backfill_progress(self, wallet, progress):
+        if wallet == self.wallet and progress.completed:
+            self.txs_tab.update_ui()
+
     @mainthread
     def update_ui(self) -> None:
         MAX_WALLET_LABEL_LENGTH = 12
@@ -125,7 +133,7 @@ class WalletView(Screen, WalletsObserver):
 
     def on_press_balance_button(self):
         self.wallet.data.currency = toggle_currency(self.wallet.data.currency)
-        self.wallet.data.save()
+        self.wallet.save_data(self.wallet.data)
 
         self.update_balance()
         self.coins_tab.update_ui()
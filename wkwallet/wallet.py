@@ -1,107 +1,281 @@
 import asyncio
+import threading
+import time
 from collections import deque
+from concurrent.futures import Future
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Set, Tuple
 
 from db.account_data import AccountData
 from db.address_data import AddressData
+from db.base_model import pooled_reads
+from db.identity_map import identity_map
 from db.tx_data import TxData
 from db.utxo_data import UTXOData
 from db.wallet_data import WalletData
+from db.wallet_snapshot import (
+    load_snapshot_tx_heights,
+    load_wallet_snapshot,
+    save_wallet_snapshot,
+    wallet_generation,
+)
+from db.write_behind_buffer import write_behind_buffer
 from electrum_client import *
 from kivy.logger import Logger
+from model.address_deriver import DerivedAddress
+from model.address_materializer import materialize_addresses, select_address_ranges
 from model.block_manager import block_manager
+from model.coinjoin import AnonSetCalculator
+from model.derivation_pool import (
+    DERIVATION_BATCH_SIZE,
+    address_index_ranges,
+    derivation_pool,
+)
 from model.exchange_rate_manager import exchange_rate_manager
 from model.fidelity_bond import lock_year_month_to_address_index
+from model.history_backfill import BackfillProgress, HistoryBackfill
+from model.owned_script_index import OwnedScriptIndex
+from model.refresh_scheduler import RefreshPriority, refresh_scheduler
+from model.runtime import background_executor
 from model.script_type import ScriptType
 from model.tx_manager import TxManager
+from model.tx_timeline import TxCursor, wallet_txs_page
 from model.wallet_account import WalletAccount
-from pycoin.coins.bitcoin.TxOut import TxOut as pycoin_tx_out
-from pycoin.symbols.btc import network as BTC
-from utils import bip_329_record, create_async_io_background_loop
+from utils import bip_329_record
 
 MAX_TX_DETAILS_COUNT = 20
 DEEP_REFRESH_GAP_LIMIT = 50
 RECENT_ADDRESSES_TO_LOAD = 50
+# The txs of the first page of the tx history, kept in the snapshot of the wallet.
+RECENT_TXS_TO_LOAD = 20
 
 
 class Wallet:
     def __init__(self, wallet_data: WalletData):
+        """
+        The wallet is opened without loading its state, which is loaded on its first
+        use, see `load`.
+        """
         # Public properties
-        self.data = wallet_data
-        self._read_loop = create_async_io_background_loop()
-        self._write_loop = create_async_io_background_loop()
-        self._completed_loading = False
+        # The foreign keys to the wallet and its accounts are dereferenced to these
+        # objects, see db.identity_map.
+        self.data = identity_map().add(wallet_data)
+
+        # The state of the wallet, see `load`.
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._load_future: Optional[Future] = None
+        self._accounts: Dict[int, WalletAccount] = {}
+        self._xpub = ""
+        self._total_balance = 0
+        self._tx_manager: Optional[TxManager] = None
+        # Separate from the load lock, so that the UI isn't blocked by the load of the
+        # txs.
+        self._tx_manager_lock = threading.Lock()
+        # The generation of the snapshot the wallet was loaded from, see tx_manager.
+        self._snapshot_generation: Optional[int] = None
+        # The generation of the snapshot and the first page of the tx history, see
+        # get_txs.
+        self._snapshot_recent_txs: Optional[Tuple[int, List[TxData]]] = None
+
+        self._addr_indexes_to_data: Dict[Tuple[int, int, int], AddressData] = {}
+        self._addr_str_to_data = {}  # type: Dict[str, AddressData]
+        # The addresses of the wallet by script, to match the outputs of the txs. Its
+        # filter is built from all the addresses of the wallet, by `load`.
+        self._owned_scripts: Optional[OwnedScriptIndex] = None
 
-        # Basic info
-        master_key = BTC.parse(self.data.accounts[0].xpub.strip())
-        self._master_key = master_key
-        self.xpub = self._master_key.as_text()
+        # Cache data for parsing transactions.
+        self._address_to_tx_ids = {}  # type: Dict[AddressData, Set[str]]
+        # The balance changes of the txs parsed by the current refresh.
+        self._tx_id_to_balance_change = {}  # type: Dict[str, int]
+
+        # Refresh tasks
+        self._refresh_tasks: List[asyncio.Task] = []
+
+        self._anon_set_calculator = AnonSetCalculator(
+            get_tx=lambda tx_id: self.tx_manager.get_tx_with_data(tx_id=tx_id),
+            contains_tx=lambda tx_id: self.tx_manager.contains_tx(tx_id=tx_id),
+            owns_script=self.owns_script,
+            on_cj_computed=self.save_data,
+        )
+
+        # The background parsing of the txs not parsed by the refreshes.
+        self._history_backfill = HistoryBackfill(self.data.history_backfill_height)
+        self._backfill_progress_callback = None
+        self._backfill_task: Optional[asyncio.Task] = None
+
+        # Addresses derived by the derivation pool, whose address data isn't created yet.
+        self._derived_addresses = {}  # type: Dict[Tuple[int, int, int], DerivedAddress]
+        self._derivation_tasks = {}  # type: Dict[Tuple[int, int, int], asyncio.Task]
+
+    def load(self) -> None:
+        """
+        Load the accounts, the active and most recent addresses and the balances of the
+        wallet, from its snapshot when it's up to date. Called when the wallet is first
+        viewed or refreshed, the txs are loaded by tx_manager.
+        """
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._load_state()
+            self._loaded = True
 
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def load_in_background(self, loaded_callback) -> None:
+        """
+        Start loading the wallet in the background executor, unless it's already
+        started, then call loaded_callback with the wallet, on the executor thread.
+        """
+        if self._load_future is not None:
+            return
+        self._load_future = background_executor().submit(self.load)
+
+        def load_done(future: Future) -> None:
+            if future.exception() is not None:
+                Logger.error(
+                    f"[{self.wallet_title()}]: Unable to load the wallet, error: "
+                    f"{future.exception()}"
+                )
+                return
+            loaded_callback(self)
+
+        self._load_future.add_done_callback(load_done)
+
+    def _load_state(self) -> None:
         # Accounts info
-        self.accounts: Dict[int, WalletAccount] = {}
         acct_data: AccountData
         for acct_data in self.data.accounts:
-            self.accounts[acct_data.account_index] = WalletAccount(acct_data)
+            acct_data = identity_map().add(acct_data)
+            self._accounts[acct_data.account_index] = WalletAccount(acct_data)
 
-        asyncio.run_coroutine_threadsafe(
-            self.load_wallet_data(),
-            self._read_loop,
-        )
+        # Basic info
+        self._master_key = self._accounts[0].master_key
+        self._xpub = self._master_key.as_text()
 
-        self.addr_indexes_to_data = {}  # type: Dict[Tuple[int, int, int], AddressData]
-        self._addr_str_to_data = {}  # type: Dict[str, AddressData]
+        # The state saved by the last refresh, unless the wallet has been written since.
+        snapshot = load_wallet_snapshot(self.data)
+        if snapshot is not None:
+            self._snapshot_generation = snapshot.generation
+            self._snapshot_recent_txs = (snapshot.generation, snapshot.recent_txs)
 
         # Load active addresses and the most recent addresses
         Logger.info("Loading active addresses and most recent addresses ...")
-        for acct_data in self.data.accounts:
-            addr_data: AddressData
+        if snapshot is not None:
+            addresses_data = snapshot.addresses
+        else:
+            addresses_data = self._select_loaded_addresses()
+        # The address_data object in account.active_addresses and self.addr_indexes_to_data
+        # must be the same one.
+        self._owned_scripts = OwnedScriptIndex(
+            self._load_script_hashes, self._load_address_data_for_script_hash
+        )
+        addr_data: AddressData
+        for addr_data in addresses_data:
+            if addr_data.is_active:
+                self._accounts[addr_data.account_index].add_active_address(addr_data)
+            self._addr_str_to_data[addr_data.address_str] = addr_data
+            self._addr_indexes_to_data[addr_data.indexes_tuple()] = addr_data
+            self._owned_scripts.add(addr_data)
+
+        for account in self._accounts.values():
+            account.update_balance()
+        self._total_balance = sum(
+            account.balance for account in self._accounts.values()
+        )
+        Logger.info("Loading active addresses and most recent addresses done")
+
+    @property
+    def accounts(self) -> Dict[int, WalletAccount]:
+        self.load()
+        return self._accounts
 
-            # The address_data object in account.active_addresses and self.addr_indexes_to_data
-            # must be the same one.
-            for addr_data in acct_data.addresses.where(AddressData.is_active == True):
-                self.accounts[acct_data.account_index].add_active_address(addr_data)
-                self._addr_str_to_data[addr_data.address_str] = addr_data
-                self.addr_indexes_to_data[addr_data.indexes_tuple()] = addr_data
+    @property
+    def xpub(self) -> str:
+        self.load()
+        return self._xpub
 
+    @property
+    def total_balance(self) -> int:
+        self.load()
+        return self._total_balance
+
+    @property
+    def addr_indexes_to_data(self) -> Dict[Tuple[int, int, int], AddressData]:
+        self.load()
+        return self._addr_indexes_to_data
+
+    @property
+    def owned_scripts(self) -> OwnedScriptIndex:
+        self.load()
+        return self._owned_scripts
+
+    @property
+    def tx_manager(self) -> TxManager:
+        """
+        The txs of the wallet, loaded on first use. The refreshes load them in the
+        background executor, see model.runtime.
+        """
+        if self._tx_manager is None:
+            self.load()
+            with self._tx_manager_lock:
+                if self._tx_manager is None:
+                    Logger.info(f"Initializing tx_manager...")
+                    tx_heights = None
+                    if self._snapshot_generation is not None:
+                        tx_heights = load_snapshot_tx_heights(
+                            self.data, self._snapshot_generation
+                        )
+                    self._tx_manager = TxManager(self.data, tx_heights)
+                    Logger.info(f"Initializing tx_manager done")
+        return self._tx_manager
+
+    def save_data(self, data):
+        write_behind_buffer().save(data)
+
+    def _select_loaded_addresses(self) -> List[AddressData]:
+        """
+        The addresses loaded on start: the active addresses, and the most recent ones of
+        each chain.
+        """
+        addresses_data = []
+        for account in self._accounts.values():
+            acct_data = account.data
+            addresses_data.extend(
+                acct_data.addresses.where(AddressData.is_active == True)
+            )
             for chain_index in (0, 1):
-                for addr_data in (
+                addresses_data.extend(
                     acct_data.addresses.where(
                         (AddressData.chain_index == chain_index)
                         & (AddressData.is_active == False)
                     )
                     .order_by(AddressData.address_index.desc())
                     .limit(RECENT_ADDRESSES_TO_LOAD)
-                ):
-                    self._addr_str_to_data[addr_data.address_str] = addr_data
-                    self.addr_indexes_to_data[addr_data.indexes_tuple()] = addr_data
-
-            self.accounts[acct_data.account_index].update_balance()
-        self.total_balance = sum(account.balance for account in self.accounts.values())
-        Logger.info("Loading active addresses and most recent addresses done")
-
-        # Cache data for parsing transactions.
-        self._address_to_tx_ids = {}  # type: Dict[AddressData, Set[str]]
-        self._tx_id_to_balance_change = {}  # type: Dict[str, int]
-
-        # Refresh tasks
-        self._refresh_tasks: List[asyncio.Task] = []
-
-    def save_data(self, data):
-        async def save_data_async(data):
-            data.save()
-
-        asyncio.run_coroutine_threadsafe(save_data_async(data), self._write_loop)
+                )
+        return addresses_data
 
-    async def load_wallet_data(self) -> None:
-        Logger.info(f"Initializing tx_manager...")
-        self.tx_manager = TxManager(self.data)
-        Logger.info(f"Initializing tx_manager done")
-        self._completed_loading = True
+    def save_snapshot(self) -> None:
+        """
+        Save the state loaded on start, see db.wallet_snapshot. The next start loads it
+        instead of querying the addresses and the txs, unless the wallet is written in
+        between.
+        """
+        # Immediate: no other connection writes between the reads and the save.
+        with WalletData._meta.database.atomic("IMMEDIATE"):
+            save_wallet_snapshot(
+                self.data,
+                self._select_loaded_addresses(),
+                wallet_txs_page(self.data, count=RECENT_TXS_TO_LOAD),
+            )
 
     def set_wallet_name(self, name):
         self.data.name = name
-        self.data.save()
+        self.save_data(self.data)
 
     def is_hidden(self):
         return self.data.currency == "HIDDEN"
@@ -109,8 +283,18 @@ class Wallet:
     def wallet_title(self):
         if self.data.name:
             return self.data.name
-        else:
-            return self.xpub[:10]
+        if not self._xpub:
+            # The xpub of the first account, without loading the wallet.
+            with pooled_reads():
+                self._xpub = (
+                    AccountData.select(AccountData.xpub)
+                    .where(
+                        (AccountData.wallet == self.data)
+                        & (AccountData.account_index == 0)
+                    )
+                    .scalar()
+                )
+        return self._xpub[:10]
 
     def owns_address(self, address_str) -> bool:
         return self.get_address_data(address_str) is not None
@@ -121,12 +305,41 @@ class Wallet:
                 AddressData.wallet == self.data,
                 AddressData.address_str == address_str,
             )
+            if self._addr_str_to_data[address_str]:
+                self.owned_scripts.add(self._addr_str_to_data[address_str])
         return self._addr_str_to_data[address_str]
 
+    def owns_script(self, script: bytes) -> bool:
+        return script in self.owned_scripts
+
+    def get_script_address_data(self, script: bytes) -> Optional[AddressData]:
+        """
+        Return the address data of the output script `script` if it belongs to the
+        wallet, without encoding its address.
+        """
+        return self.owned_scripts.lookup(script)
+
+    def _load_script_hashes(self) -> List[str]:
+        return [
+            script_hash
+            for (script_hash,) in AddressData.select(AddressData.script_hash)
+            .where(AddressData.wallet == self.data)
+            .tuples()
+        ]
+
+    def _load_address_data_for_script_hash(
+        self, script_hash: str
+    ) -> Optional[AddressData]:
+        return AddressData.get_or_none(
+            AddressData.wallet == self.data,
+            AddressData.script_hash == script_hash,
+        )
+
     def new_internal_address_indexes(self):
         address_indexes = []
 
-        for account_data in self.data.accounts:
+        for account in self.accounts.values():
+            account_data = account.data
             account_index = account_data.account_index
             account_address_indexes = [
                 (account_index, 1, address_index)
@@ -160,7 +373,8 @@ class Wallet:
     def all_internal_address_indexes(self):
         address_indexes = []
 
-        for account_data in self.data.accounts:
+        for account in self.accounts.values():
+            account_data = account.data
             account_index = account_data.account_index
             account_address_indexes = [
                 (account_index, 1, address_index)
@@ -190,7 +404,8 @@ class Wallet:
     def external_address_indexes(self):
         address_indexes = []
 
-        for account_data in self.data.accounts:
+        for account in self.accounts.values():
+            account_data = account.data
             account_index = account_data.account_index
             account_address_indexes = [
                 (account_index, 0, address_index)
@@ -242,7 +457,13 @@ class Wallet:
             )
         return exported_labels
 
-    def refresh(self, refresh_callback=None):
+    def refresh(self, refresh_callback=None, backfill_progress_callback=None):
+        """
+        refresh_callback: called with the wallet when the refresh is completed.
+        backfill_progress_callback: called with the wallet and its BackfillProgress after
+            each batch of the history backfill that follows the refresh.
+        """
+        self._backfill_progress_callback = backfill_progress_callback
         asyncio.run_coroutine_threadsafe(
             Wallet.refresh_async(self, refresh_callback),
             electrum_client.loop,
@@ -254,24 +475,37 @@ class Wallet:
         return len(self._refresh_tasks) - self._completed_refresh_tasks_count
 
     async def refresh_async(self, refresh_callback):
-        # Sleep until the initial loading is completed
-        while not self._completed_loading:
-            await asyncio.sleep(1)
+        # The state of the wallet is loaded off the network loop.
+        await asyncio.get_running_loop().run_in_executor(
+            background_executor(), lambda: self.tx_manager
+        )
 
         Logger.info(f"[{self.wallet_title()}]: Refreshing wallet...")
+        # The backfill is started again once the refresh is completed. Its batch
+        # running, if any, is completed first, since the refresh may parse its txs.
+        self._history_backfill.stop()
+        if self._backfill_task is not None:
+            await asyncio.wait({self._backfill_task})
 
         # Refresh tasks
         self._refresh_tasks = []
-        self._pending_update_addr_index_tuples = []
+        self._pending_update_addr_index_tuples = {
+            priority: [] for priority in RefreshPriority
+        }
         self._completed_refresh_tasks_count = 0
+        self._refresh_task_completed = asyncio.Event()
 
         # Reset balances
         self.processed_address_indexes = set()
+        # The addresses of the wallet may change during the refresh.
+        self._anon_set_calculator.reset()
 
         # Step 1: update the addresses info
 
         # Update all external addresses
-        self.update_addresses_info(self.external_address_indexes())
+        self.update_addresses_info(
+            self.external_address_indexes(), RefreshPriority.EXTERNAL
+        )
 
         if self.data.completed_initial_sync:
             # Update only the active addresses and new addresses
@@ -279,7 +513,7 @@ class Wallet:
                 address_index_tuples = [
                     address.indexes_tuple() for address in account.active_addresses
                 ]
-                self.update_addresses_info(address_index_tuples)
+                self.update_addresses_info(address_index_tuples, RefreshPriority.ACTIVE)
                 Logger.info(
                     f"[{self.wallet_title()}]: Refreshing {address_index_tuples}"
                 )
@@ -288,10 +522,13 @@ class Wallet:
         else:
             self.update_addresses_info(self.all_internal_address_indexes())
 
-        finished_tasks_count = 0
-        while finished_tasks_count < len(self._refresh_tasks):
-            finished_tasks_count = len(self._refresh_tasks)
-            await asyncio.gather(*self._refresh_tasks)
+        # The batches are started by the refresh scheduler, wait until all the queued
+        # addresses have been updated.
+        while self.running_tasks_count > 0 or self.pending_update_addresses_count() > 0:
+            self._refresh_task_completed.clear()
+            await self._refresh_task_completed.wait()
+        # Raise the errors of the tasks, if any.
+        await asyncio.gather(*self._refresh_tasks)
 
         Logger.info(f"[{self.wallet_title()}]: All address info updated.")
         self.save_account_data()
@@ -299,6 +536,7 @@ class Wallet:
         # Step 2: update the block headers
         Logger.info(f"[{self.wallet_title()}]: Updating block headers...")
         await block_manager().update_block_headers(self.tx_manager.tx_heights())
+        self.tx_manager.update_tx_timestamps()
         Logger.info(f"[{self.wallet_title()}]: All block headers updated.")
 
         # Step 3: fetch transaction details
@@ -307,62 +545,216 @@ class Wallet:
         Logger.info(f"[{self.wallet_title()}]: All transactions details updated.")
 
         self.finish_refresh()
+        # The refresh is saved before the observers are notified.
+        await asyncio.wrap_future(write_behind_buffer().submit(self.save_snapshot))
         Logger.info(f"[{self.wallet_title()}]: Refresh completed.")
 
         if refresh_callback:
             refresh_callback(self)
 
-    def update_pending_addresses(self):
-        MAX_ADDRESSES_PER_REQUEST = 40
-        MAX_CONCURRENT_REQUESTS_COUNT = 5
+        self.start_history_backfill()
 
-        while self.running_tasks_count < MAX_CONCURRENT_REQUESTS_COUNT:
-            # No pending addreses to update
-            if not self._pending_update_addr_index_tuples:
-                break
+    def pending_update_addresses_count(
+        self, priority: Optional[RefreshPriority] = None
+    ) -> int:
+        """
+        The count of addresses queued for the refresh, or of txs ready to be parsed by
+        the backfill for RefreshPriority.BACKFILL.
+        """
+        if priority == RefreshPriority.BACKFILL:
+            return self._history_backfill.ready_count()
+        if priority is None:
+            return sum(
+                len(tuples)
+                for tuples in self._pending_update_addr_index_tuples.values()
+            )
+        return len(self._pending_update_addr_index_tuples[priority])
 
-            # Create refresh coroutines and append them to the pending list
-            def task_completed(_):
-                self._completed_refresh_tasks_count += 1
-                Logger.debug(
-                    f"[{self.wallet_title()}]: Pending update addresses: {len(self._pending_update_addr_index_tuples)}"
-                )
-                self.update_pending_addresses()
+    def start_refresh_batch(
+        self, priority: RefreshPriority, batch_size: int
+    ) -> Optional[asyncio.Task]:
+        """
+        Called by the refresh scheduler when this wallet is granted a batch.
+        """
+        if priority == RefreshPriority.BACKFILL:
+            batch = self._history_backfill.next_batch(batch_size)
+            if not batch:
+                return None
+            self._backfill_task = asyncio.create_task(
+                self.backfill_history_batch(batch)
+            )
+            return self._backfill_task
 
-            task = asyncio.create_task(
-                self.update_addresses_info_async(
-                    self._pending_update_addr_index_tuples[:MAX_ADDRESSES_PER_REQUEST]
+        pending_tuples = self._pending_update_addr_index_tuples[priority]
+        if not pending_tuples:
+            return None
+
+        def task_completed(_):
+            self._completed_refresh_tasks_count += 1
+            self._refresh_task_completed.set()
+            Logger.debug(
+                f"[{self.wallet_title()}]: Pending update addresses: {self.pending_update_addresses_count()}"
+            )
+
+        task = asyncio.create_task(
+            self.update_addresses_info_async(pending_tuples[:batch_size])
+        )
+        del pending_tuples[:batch_size]
+        self._refresh_tasks.append(task)
+        Logger.debug(
+            f"[{self.wallet_title()}]: Waiting for {self.running_tasks_count} tasks"
+        )
+        Logger.debug(
+            f"[{self.wallet_title()}]: Pending update addresses: {self.pending_update_addresses_count()}"
+        )
+        task.add_done_callback(task_completed)
+        return task
+
+    def update_addresses_info(
+        self, address_index_tuples, priority=RefreshPriority.INTERNAL
+    ):
+        address_index_tuples = list(reversed(address_index_tuples))
+        self._pending_update_addr_index_tuples[priority] += address_index_tuples
+        self.prederive_addresses(address_index_tuples)
+        refresh_scheduler().notify(self)
+
+    def prederive_addresses(self, address_index_tuples) -> None:
+        """
+        Start deriving, in the derivation pool, the addresses of address_index_tuples
+        that aren't created yet. The jobs are started in the order of the tuples, which
+        is the order their refresh batches are started.
+        """
+        missing_tuples = [
+            address_index_tuple
+            for address_index_tuple in address_index_tuples
+            if address_index_tuple not in self.addr_indexes_to_data
+            and address_index_tuple not in self._derived_addresses
+            and address_index_tuple not in self._derivation_tasks
+        ]
+        if not missing_tuples:
+            return
+        # Until the jobs are started, the tuples wait for the lookup of the created
+        # addresses.
+        task = asyncio.create_task(self._start_derivations(missing_tuples))
+        for address_index_tuple in missing_tuples:
+            self._derivation_tasks[address_index_tuple] = task
+
+    def _created_address_tuples(
+        self, address_index_tuples
+    ) -> Set[Tuple[int, int, int]]:
+        return {
+            address_data.indexes_tuple()
+            for address_data in select_address_ranges(
+                self.data,
+                address_index_tuples,
+                AddressData.account_index,
+                AddressData.chain_index,
+                AddressData.address_index,
+            )
+        }
+
+    async def _start_derivations(self, missing_tuples) -> None:
+        lookup_task = asyncio.current_task()
+        try:
+            # Skip the addresses already in the DB, they are loaded instead. The lookup
+            # runs on the thread of the write-behind buffer, after the pending inserts.
+            created_tuples = await asyncio.wrap_future(
+                write_behind_buffer().submit(
+                    lambda: self._created_address_tuples(missing_tuples)
                 )
             )
-            self._pending_update_addr_index_tuples = (
-                self._pending_update_addr_index_tuples[MAX_ADDRESSES_PER_REQUEST:]
+        except Exception as e:
+            # The addresses are derived on the loop when their batch is started.
+            Logger.error(
+                f"[{self.wallet_title()}]: Unable to look up the addresses to derive, "
+                f"error: {e}"
             )
-            self._refresh_tasks.append(task)
-            Logger.debug(
-                f"[{self.wallet_title()}]: Waiting for {self.running_tasks_count} tasks"
+            return
+        finally:
+            for address_index_tuple in missing_tuples:
+                if self._derivation_tasks.get(address_index_tuple) is lookup_task:
+                    del self._derivation_tasks[address_index_tuple]
+
+        positions = {}
+        for address_index_tuple in missing_tuples:
+            if address_index_tuple not in created_tuples:
+                positions.setdefault(address_index_tuple, len(positions))
+
+        ranges = address_index_ranges(positions, max_length=DERIVATION_BATCH_SIZE)
+        ranges.sort(
+            key=lambda r: min(positions[(r[0], r[1], index)] for index in range(*r[2:]))
+        )
+        for account_index, chain_index, start, stop in ranges:
+            task = asyncio.create_task(
+                derivation_pool().derive_range(
+                    self.accounts[account_index].address_deriver,
+                    chain_index,
+                    start,
+                    stop,
+                )
             )
-            Logger.debug(
-                f"[{self.wallet_title()}]: Pending update addresses: {len(self._pending_update_addr_index_tuples)}"
+            range_tuples = [
+                (account_index, chain_index, address_index)
+                for address_index in range(start, stop)
+            ]
+            for address_index_tuple in range_tuples:
+                self._derivation_tasks[address_index_tuple] = task
+            task.add_done_callback(
+                lambda task, range_tuples=range_tuples: self._derivation_completed(
+                    task, range_tuples
+                )
             )
-            task.add_done_callback(task_completed)
 
-    def update_addresses_info(self, address_index_tuples):
-        self._pending_update_addr_index_tuples += reversed(address_index_tuples)
-        self.update_pending_addresses()
+    def _derivation_completed(self, task: asyncio.Task, range_tuples) -> None:
+        for address_index_tuple in range_tuples:
+            self._derivation_tasks.pop(address_index_tuple, None)
+        if task.cancelled():
+            return
+        if task.exception():
+            # The addresses are derived on the loop when their batch is started.
+            Logger.error(
+                f"[{self.wallet_title()}]: Unable to derive addresses {range_tuples[0]} "
+                f"to {range_tuples[-1]}, error: {task.exception()}"
+            )
+            return
+        for address_index_tuple, derived_address in zip(range_tuples, task.result()):
+            if address_index_tuple not in self.addr_indexes_to_data:
+                self._derived_addresses[address_index_tuple] = derived_address
+
+    async def derive_addresses(self, address_index_tuples) -> None:
+        """
+        Wait for the derivation of the addresses of address_index_tuples not created yet.
+        """
+        self.prederive_addresses(address_index_tuples)
+        # The lookups started, then the jobs they started.
+        while True:
+            tasks = {
+                self._derivation_tasks[address_index_tuple]
+                for address_index_tuple in address_index_tuples
+                if address_index_tuple in self._derivation_tasks
+            }
+            tasks = {task for task in tasks if not task.done()}
+            if not tasks:
+                return
+            await asyncio.wait(tasks)
 
     async def update_addresses_info_async(self, address_index_tuples):
         if not address_index_tuples:
             return
 
-        requests = []
-        callbacks = []
+        new_address_index_tuples = []
         for address_index_tuple in address_index_tuples:
             if address_index_tuple in self.processed_address_indexes:
                 continue
             self.processed_address_indexes.add(address_index_tuple)
+            new_address_index_tuples.append(address_index_tuple)
 
-            # Get script_hash
-            address_data = self.address_data_for_index_tuple(address_index_tuple)
+        await self.derive_addresses(new_address_index_tuples)
+        address_data_list = []
+        for address_index_tuple, address_data in zip(
+            new_address_index_tuples,
+            await self.address_data_for_index_tuples(new_address_index_tuples),
+        ):
             # During initial_sync, do not fetch address_data if it has already been
             # updated before and that it's not active at this moment.
             if (
@@ -376,6 +768,21 @@ class Wallet:
                 Logger.debug(
                     f"{address_index_tuple}: address_data.update_time {address_data.update_time}"
                 )
+            address_data_list.append(address_data)
+
+        if electrum_client.use_subscriptions:
+            address_data_list = await self.filter_changed_addresses(address_data_list)
+            # The status the fetched history will correspond to. It's captured before
+            # sending the requests so that a change notified in the meantime is not
+            # mistaken as already fetched.
+            status_hashes = [
+                electrum_client.script_hash_status(address_data.script_hash)
+                for address_data in address_data_list
+            ]
+
+        requests = []
+        callbacks = []
+        for address_data in address_data_list:
             script_hash = address_data.script_hash
 
             # Request for getting address balance
@@ -387,13 +794,31 @@ class Wallet:
 
         if not requests:
             return
+        request_window = electrum_client.request_window
+        start_time = time.monotonic()
         try:
             responses = await electrum_client.batch_rpc(requests)
         except Exception as e:
-            raise e
+            request_window.on_error(e)
+            # The addresses keep their previous status, and are fetched again on the
+            # next refresh.
+            Logger.error(
+                f"[{self.wallet_title()}]: Unable to update {len(address_data_list)} addresses, error: {e}"
+            )
+            return
+        request_window.on_success(time.monotonic() - start_time)
+        Logger.debug(
+            f"[{self.wallet_title()}]: Request window: batch_size {request_window.batch_size}, max_in_flight {request_window.max_in_flight}"
+        )
         if len(responses) != len(callbacks):
             raise Exception("responses len doesn't match callbacks len")
 
+        if electrum_client.use_subscriptions:
+            # Remember the status of the fetched history, so that the address is
+            # skipped until its status changes again.
+            for address_data, status_hash in zip(address_data_list, status_hashes):
+                address_data.status_hash = status_hash
+
         for i in range(len(responses)):
             (method, address_data, is_async) = callbacks[i]
             data = responses[i]
@@ -402,6 +827,34 @@ class Wallet:
             else:
                 method(address_data, data)
 
+    async def filter_changed_addresses(
+        self, address_data_list: List[AddressData]
+    ) -> List[AddressData]:
+        """
+        Return the addresses whose Electrum status hash differs from the one stored
+        when their history was last fetched. Addresses that are not subscribed on the
+        current connection yet are subscribed first, in one batch.
+        """
+        script_hashes_to_subscribe = [
+            address_data.script_hash
+            for address_data in address_data_list
+            if not electrum_client.is_script_hash_subscribed(address_data.script_hash)
+        ]
+        if script_hashes_to_subscribe:
+            await electrum_client.subscribe_script_hashes(script_hashes_to_subscribe)
+
+        changed_address_data_list = []
+        for address_data in address_data_list:
+            status_hash = electrum_client.script_hash_status(address_data.script_hash)
+            if (
+                address_data.update_time is None
+                or status_hash != address_data.status_hash
+            ):
+                changed_address_data_list.append(address_data)
+            else:
+                Logger.debug(f"unchanged address {address_data.indexes_tuple()}")
+        return changed_address_data_list
+
     def update_address_balance(self, address_data: AddressData, address_balance):
         account_index, chain_index = (
             address_data.account_index,
@@ -446,7 +899,7 @@ class Wallet:
 
         # This address has tx history, update last_used_address_indexes and fetch info of more addresses.
         if chain_index in (0, 1) and len(address_history) > 0:
-            account_data = self.data.accounts[account_index]
+            account_data = self.accounts[account_index].data
             chain_data = account_data.chains[chain_index]
             if not self.data.completed_initial_sync and chain_index != 0:
                 gap_limit = DEEP_REFRESH_GAP_LIMIT
@@ -459,7 +912,7 @@ class Wallet:
                 original_first_addr_index = chain_data.first_unused_index
                 new_first_addr_index = address_index + 1
                 chain_data.first_unused_index = new_first_addr_index
-                chain_data.save()
+                self.save_data(chain_data)
                 Logger.info(
                     (
                         f"[{self.wallet_title()}]: Refreshing "
@@ -477,7 +930,10 @@ class Wallet:
                             original_first_addr_index + gap_limit,
                             new_first_addr_index + gap_limit,
                         )
-                    ]
+                    ],
+                    RefreshPriority.EXTERNAL
+                    if chain_index == 0
+                    else RefreshPriority.INTERNAL,
                 )
 
         # Update the update time of address_data
@@ -495,10 +951,11 @@ class Wallet:
     async def fetch_transactions_details(self) -> None:
         """
         Step 3: Fetch the tx details. We only fetch the most recent MAX_TX_DETAILS_COUNT
-        txs to avoid long waiting on large wallets.
+        txs to avoid long waiting on large wallets, the others are parsed by the history
+        backfill once the refresh is completed.
         """
-        # TODO: allow continously fetching more and more tx histories.
         self.recent_tx_history: List[str] = []
+        self._tx_id_to_balance_change = {}
         tx_to_process_ids = set()
 
         # Prepare `tx_to_process` and `recent_tx_history`
@@ -524,7 +981,8 @@ class Wallet:
         additional_txs_to_process = []
         for account in self.accounts.values():
             for address in account.active_addresses:
-                for tx_id in self._address_to_tx_ids[address]:
+                # Addresses skipped because their status didn't change have no new txs.
+                for tx_id in self._address_to_tx_ids.get(address, ()):
                     if tx_id not in tx_to_process_ids:
                         # if (
                         #     tx_id not in tx_to_process_ids
@@ -533,16 +991,104 @@ class Wallet:
                         tx_to_process_ids.add(tx_id)
                         additional_txs_to_process.append(tx_id)
 
+        parsing_tx_ids = []
         pending_tasks = []
-        for tx_id in self.recent_tx_history:
-            if self.tx_manager.tx_needs_parsing(tx_id):
-                pending_tasks.append(asyncio.create_task(self.parse_transaction(tx_id)))
-        for tx_id in additional_txs_to_process:
+        for tx_id in self.recent_tx_history + additional_txs_to_process:
             if self.tx_manager.tx_needs_parsing(tx_id):
+                parsing_tx_ids.append(tx_id)
                 pending_tasks.append(asyncio.create_task(self.parse_transaction(tx_id)))
-        await asyncio.gather(*pending_tasks)
+        results = await asyncio.gather(*pending_tasks, return_exceptions=True)
+        for tx_id, result in zip(parsing_tx_ids, results):
+            if isinstance(result, Exception):
+                # The tx stays unparsed, and is parsed again on the next refresh.
+                Logger.error(f"Unable to parse tx {tx_id}, error: {result}")
+            elif result is not None:
+                self._tx_id_to_balance_change[tx_id] = result
+
+    def start_history_backfill(self) -> None:
+        """
+        Parse in the background the confirmed txs left unparsed by the refresh, newest
+        first, so that the balance changes of the whole history get known.
+        """
+        self._history_backfill.start(
+            {
+                height: self.tx_manager.tx_ids_of_height(height)
+                for height in self.tx_manager.tx_heights()
+            },
+            self.tx_manager.has_parsed_tx,
+        )
+        if self._history_backfill.pending_count:
+            Logger.info(
+                f"[{self.wallet_title()}]: Backfilling "
+                f"{self._history_backfill.pending_count} txs"
+            )
+        self._schedule_history_backfill()
+
+    def history_backfill_progress(self) -> BackfillProgress:
+        return self._history_backfill.progress()
+
+    def _schedule_history_backfill(self) -> None:
+        if not self._history_backfill.pending_count:
+            return
+        # Wait for the bandwidth budget of the backfill.
+        delay = self._history_backfill.next_batch_delay()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(
+                delay, refresh_scheduler().notify, self
+            )
+        else:
+            refresh_scheduler().notify(self)
+
+    async def backfill_history_batch(self, batch) -> None:
+        tx_ids = [
+            tx_id for _, tx_id in batch if not self.tx_manager.has_parsed_tx(tx_id)
+        ]
+        results = await asyncio.gather(
+            *(self.parse_transaction(tx_id) for tx_id in tx_ids),
+            return_exceptions=True,
+        )
 
-    async def parse_transaction(self, tx_id) -> None:
+        failed_tx_ids = set()
+        fetched_bytes = 0
+        for tx_id, result in zip(tx_ids, results):
+            tx_data = self.tx_manager.get_tx(tx_id)
+            if tx_data is None:
+                # Dropped from the mempool.
+                continue
+            if isinstance(result, Exception) or result is None:
+                # Parsed again on the next backfill.
+                Logger.error(f"Unable to backfill tx {tx_id}, error: {result}")
+                failed_tx_ids.add(tx_id)
+                continue
+            self.tx_manager.mark_tx_as_parsed(tx_id=tx_id, balance_change=result)
+            decoded_tx = tx_data.decoded_tx
+            if decoded_tx is not None:
+                fetched_bytes += decoded_tx.size
+
+        progress = self._history_backfill.batch_completed(
+            batch,
+            [(height, tx_id) for height, tx_id in batch if tx_id not in failed_tx_ids],
+            fetched_bytes,
+        )
+        if self.data.history_backfill_height != progress.cursor_height:
+            self.data.history_backfill_height = progress.cursor_height
+            self.save_data(self.data)
+        if progress.completed:
+            # The txs parsed by the backfill are in the next snapshot.
+            await asyncio.wrap_future(write_behind_buffer().submit(self.save_snapshot))
+        Logger.debug(
+            f"[{self.wallet_title()}]: Backfilled {progress.parsed_count} of "
+            f"{progress.total_count} txs"
+        )
+        if self._backfill_progress_callback:
+            self._backfill_progress_callback(self, progress)
+        self._schedule_history_backfill()
+
+    async def parse_transaction(self, tx_id) -> Optional[int]:
+        """
+        Update the UTXOs and the addresses of the wallet in the tx, and return the
+        balance change of the tx, None if it no longer exists.
+        """
         tx_data: TxData = await self.tx_manager.get_tx_with_data(tx_id=tx_id)
         if tx_data is None:
             # This tx_id no longer exist in mempool, delete this tx completely from this
@@ -552,33 +1098,27 @@ class Wallet:
             if tx_id in self.recent_tx_history:
                 self.recent_tx_history.remove(tx_id)
             # TODO:Mark the address_data as inactive if needed.
-            return
+            return None
 
-        address_for_script = BTC.address.for_script
-        self._tx_id_to_balance_change[tx_id] = 0
+        balance_change = 0
 
         # If an output addresses belongs to the wallet, then the UTXO is received by us.
-        tx_out: pycoin_tx_out
-        for tx_index in range(len(tx_data.tx_object.txs_out)):
-            tx_out = tx_data.tx_object.txs_out[tx_index]
-            out_address = address_for_script(tx_out.puzzle_script())
-            out_address_data = self.get_address_data(out_address)
+        decoded_tx = tx_data.decoded_tx
+        for tx_index, tx_out in enumerate(decoded_tx.txs_out):
+            out_address_data = self.get_script_address_data(tx_out.puzzle_script())
             if out_address_data:
-                Logger.debug(f"updating address status for {out_address}")
-                # This UTXO is received by us.
-                utxo_data = UTXOData.get_or_none(
-                    UTXOData.tx == tx_data,
-                    UTXOData.address == out_address_data,
+                Logger.debug(
+                    f"updating address status for {out_address_data.address_str}"
                 )
-                if utxo_data is None:
-                    utxo_data = UTXOData.create(
-                        account=out_address_data.account,
-                        address=out_address_data,
-                        tx=tx_data,
-                        tx_index=tx_index,
-                        balance=tx_out.coin_value,
+                # This UTXO is received by us.
+                utxo_data = await asyncio.wrap_future(
+                    write_behind_buffer().submit(
+                        lambda: self._get_or_create_utxo_data(
+                            tx_data, out_address_data, tx_index, tx_out.coin_value
+                        )
                     )
-                self._tx_id_to_balance_change[tx_id] += tx_out.coin_value
+                )
+                balance_change += tx_out.coin_value
                 await self.update_utxo_address_status(
                     tx_data, utxo_data, out_address_data
                 )
@@ -587,90 +1127,102 @@ class Wallet:
         # this wallet has participated. If so, we should fetch that tx and see if the
         # spent input was a UTXO of this wallet.
         pre_tx_outs = []  # [ (tx_hash, tx_out_index) ]
-        for tx_in in tx_data.tx_object.txs_in:
-            pre_tx_id = str(tx_in.previous_hash)
+        for tx_in in decoded_tx.txs_in:
+            pre_tx_id = tx_in.previous_hash
             if self.tx_manager.contains_tx(tx_id=pre_tx_id):
                 pre_index = tx_in.previous_index
                 pre_tx_outs.append((pre_tx_id, pre_index))
 
-        def deduct_tx_in_value(pre_tx_object, pre_index, cur_tx_id):
+        # Fetch all the previous txs together so that they are sent in one batch.
+        pre_txs = await asyncio.gather(
+            *(
+                self.tx_manager.get_tx_with_data(tx_id=pre_tx_id)
+                for pre_tx_id, _ in pre_tx_outs
+            )
+        )
+        for (pre_tx_id, pre_index), pre_tx in zip(pre_tx_outs, pre_txs):
             # deduct the value if the output belongs to an address of this wallet
-            pre_tx_out = pre_tx_object.txs_out[pre_index]
-            pre_tx_out_address = address_for_script(pre_tx_out.puzzle_script())
-
-            if self.owns_address(pre_tx_out_address):
-                self._tx_id_to_balance_change[cur_tx_id] -= pre_tx_object.txs_out[
-                    pre_index
-                ].coin_value
-
-        for pre_tx_id, pre_index in pre_tx_outs:
-            pre_tx = await self.tx_manager.get_tx_with_data(tx_id=pre_tx_id)
-            deduct_tx_in_value(
-                pre_tx_object=pre_tx.tx_object,
-                pre_index=pre_index,
-                cur_tx_id=tx_id,
+            pre_tx_out = pre_tx.decoded_tx.txs_out[pre_index]
+            if self.owns_script(pre_tx_out.puzzle_script()):
+                balance_change -= pre_tx_out.coin_value
+
+        # The fee is known when all the inputs spend txs of the wallet.
+        if pre_tx_outs and len(pre_tx_outs) == len(decoded_tx.txs_in):
+            total_in = sum(
+                pre_tx.decoded_tx.txs_out[pre_index].coin_value
+                for (_, pre_index), pre_tx in zip(pre_tx_outs, pre_txs)
             )
+            fee = total_in - decoded_tx.total_out()
+            if tx_data.fee != fee:
+                await asyncio.wrap_future(
+                    write_behind_buffer().submit(lambda: tx_data.set_fee(fee))
+                )
+                self.tx_manager.save_data(tx_data)
+        return balance_change
+
+    def _get_or_create_utxo_data(
+        self, tx_data: TxData, address_data: AddressData, tx_index: int, balance: int
+    ) -> UTXOData:
+        utxo_data = UTXOData.get_or_none(
+            UTXOData.tx == tx_data,
+            UTXOData.address == address_data,
+        )
+        if utxo_data is None:
+            utxo_data = UTXOData.create(
+                account=address_data.account,
+                address=address_data,
+                tx=tx_data,
+                tx_index=tx_index,
+                balance=balance,
+            )
+        return utxo_data
 
-    def get_txs(self, start_index=0, count=20) -> List[TxData]:
-        end_index = start_index + count
-
-        txs = []
-        cur_index = 0
-
-        # All pending transactions
-        for tx_data in self.data.txs.where(TxData.height <= 0):
-            Logger.debug(f"get_tx: {tx_data.tx_id}, UNCONFIRMED")
-
-            if cur_index >= start_index:
-                txs.append(tx_data)
-            cur_index += 1
-            if cur_index >= end_index:
-                break
-
-        # Other recent transactions
-        for tx_data in self.data.txs.where(TxData.is_processed == True).order_by(
-            TxData.height.desc()
-        ):
-            Logger.debug(f"get_tx: {tx_data.tx_id}, height: {tx_data.height}")
-
-            if cur_index >= start_index:
-                txs.append(tx_data)
-            cur_index += 1
-            if cur_index >= end_index:
-                break
-        return txs
+    def get_txs(self, after: Optional[TxCursor] = None, count=20) -> List[TxData]:
+        """
+        The page of the tx history after the cursor `after`, see model.tx_timeline.
+        The first page is taken from the snapshot until the wallet is written.
+        """
+        self.load()
+        if after is None and count <= RECENT_TXS_TO_LOAD and self._snapshot_recent_txs:
+            generation, recent_txs = self._snapshot_recent_txs
+            with pooled_reads():
+                current_generation = wallet_generation(self.data)
+            if current_generation == generation:
+                return recent_txs[:count]
+            self._snapshot_recent_txs = None
+        return wallet_txs_page(self.data, after, count)
 
     def finish_refresh(self):
         # Mark initial sync as completed
         self.data.completed_initial_sync = True
-        self.data.save()
+        self.save_data(self.data)
 
         # Update wallet balance
 
-        for acct_data in self.data.accounts:
-            self.accounts[acct_data.account_index].update_balance()
-        self.total_balance = sum(account.balance for account in self.accounts.values())
+        for account in self.accounts.values():
+            account.update_balance()
+        self._total_balance = sum(account.balance for account in self.accounts.values())
 
         # Save the TxData
         for tx_id in self.recent_tx_history:
+            balance_change = self._tx_id_to_balance_change.get(tx_id)
+            # Txs that failed to be parsed have no balance change.
+            if balance_change is None:
+                continue
             if not self.tx_manager.has_parsed_tx(tx_id):
                 self.tx_manager.mark_tx_as_parsed(
-                    tx_id=tx_id, balance_change=self._tx_id_to_balance_change[tx_id]
+                    tx_id=tx_id, balance_change=balance_change
                 )
 
+        # The addresses derived for the refresh but never requested are derived again
+        # by the next one if needed.
+        self._derived_addresses.clear()
+
     def get_cj_value_and_count(self, tx_data: TxData):
         """
         Return (cj_value, cj_count) of raw_tx
         """
-        cj_value, cj_count = None, 1
-        for tx_out_i in tx_data.tx_object.txs_out:
-            count = 0
-            for tx_out_j in tx_data.tx_object.txs_out:
-                if tx_out_j.coin_value == tx_out_i.coin_value:
-                    count += 1
-            if count > cj_count:
-                cj_value, cj_count = tx_out_i.coin_value, count
-        return cj_value, cj_count
+        return self._anon_set_calculator.cj_value_and_count(tx_data)
 
     async def update_utxo_address_status(
         self,
@@ -687,9 +1239,13 @@ class Wallet:
             utxo_data.anon_set_count = 1
         else:
             # For coin join output, we check its input to see if the input itself was also a coin join
-            utxo_data.anon_set_count = cj_count
-            await self.calc_pre_txs_anon_set_count(tx_data, utxo_data)
-        utxo_data.save()
+            utxo_data.anon_set_count = (
+                cj_count
+                + await self._anon_set_calculator.ancestors_anon_set_count(
+                    tx_data, utxo_data.balance
+                )
+            )
+        self.save_data(utxo_data)
 
         # Update the status of address_data
         if address_data.chain_index == 2:
@@ -719,8 +1275,8 @@ class Wallet:
     ):
         # Save relevant input utxos to a list so that we can parse them later.
         input_utxos_to_parse = []  # [ (pre_tx_id, pre_tx_out_index) ]
-        for tx_in in tx_data.tx_object.txs_in:
-            pre_tx_id = str(tx_in.previous_hash)
+        for tx_in in tx_data.decoded_tx.txs_in:
+            pre_tx_id = tx_in.previous_hash
             if self.tx_manager.contains_tx(tx_id=pre_tx_id):
                 input_utxos_to_parse.append((pre_tx_id, tx_in.previous_index))
 
@@ -729,132 +1285,104 @@ class Wallet:
             pre_tx_data: TxData,
             pre_tx_out_index,
         ):
-            pre_tx_out = pre_tx_data.tx_object.txs_out[pre_tx_out_index]
+            pre_tx_out = pre_tx_data.decoded_tx.txs_out[pre_tx_out_index]
 
             # Only proceed when the previous tx_out belongs to us.
-            pre_address = BTC.address.for_script(pre_tx_out.puzzle_script())
-            if self.owns_address(pre_address):
+            if self.owns_script(pre_tx_out.puzzle_script()):
                 address_data.status = "non-cj-change"
                 return
 
         # To parse the tx inputs, we need to fetch their own tx objects first.
-        for pre_tx_id, pre_tx_out_index in input_utxos_to_parse:
-            pre_tx_data = await self.tx_manager.get_tx_with_data(tx_id=pre_tx_id)
-            await parse_pre_tx_out(
-                address_data=address_data,
-                pre_tx_data=pre_tx_data,
-                pre_tx_out_index=pre_tx_out_index,
+        pre_txs_data = await asyncio.gather(
+            *(
+                self.tx_manager.get_tx_with_data(tx_id=pre_tx_id)
+                for pre_tx_id, _ in input_utxos_to_parse
             )
-
-    async def calc_pre_txs_anon_set_count(
-        self,
-        tx_data: TxData,
-        dest_utxo_data: UTXOData,
-    ):
-        # Save relevant input utxos to a list so that we can parse them later.
-        input_utxos_to_parse = []  # [ (pre_tx_id, pre_tx_out_index) ]
-        for tx_in in tx_data.tx_object.txs_in:
-            pre_tx_id = str(tx_in.previous_hash)
-            if self.tx_manager.contains_tx(tx_id=pre_tx_id):
-                input_utxos_to_parse.append((pre_tx_id, tx_in.previous_index))
-
-        async def parse_pre_tx_out(
-            pre_tx_data: TxData, pre_tx_out_index, dest_utxo_data: UTXOData
+        )
+        for (pre_tx_id, pre_tx_out_index), pre_tx_data in zip(
+            input_utxos_to_parse, pre_txs_data
         ):
-            # We only increase the anon_set_count if the input utxo is no less than the dest utxo.
-            pre_tx_out = pre_tx_data.tx_object.txs_out[pre_tx_out_index]
-            if pre_tx_out.coin_value < dest_utxo_data.balance:
-                return
-
-            # Only proceed when the previous tx_out belongs to us.
-            pre_address = BTC.address.for_script(pre_tx_out.puzzle_script())
-            if self.owns_address(pre_address):
-                # If the inputs were the outputs of coin join themselves, we increase the
-                # anon_set_count by the counter parties count of the previous coin join.
-                cj_value, cj_count = self.get_cj_value_and_count(pre_tx_data)
-                if pre_tx_out.coin_value == cj_value:
-                    dest_utxo_data.anon_set_count += cj_count - 1
-                    # This is a coin join, we recursively check its own input and see if they are coinjoin
-                    # outputs as well.
-                    await self.calc_pre_txs_anon_set_count(
-                        pre_tx_data,
-                        dest_utxo_data,
-                    )
-
-        # To parse the tx inputs, we need to fetch their own tx objects first.
-        for pre_tx_id, pre_tx_out_index in input_utxos_to_parse:
-            pre_tx_data = await self.tx_manager.get_tx_with_data(tx_id=pre_tx_id)
             await parse_pre_tx_out(
+                address_data=address_data,
                 pre_tx_data=pre_tx_data,
                 pre_tx_out_index=pre_tx_out_index,
-                dest_utxo_data=dest_utxo_data,
             )
 
     def get_deposit_address(self, delta=0) -> Tuple[str, str]:
         """
         Return: (addr_str, addr_path)
         """
-        addr_index = self.data.accounts[0].chains[0].first_unused_index + delta
-        addr_str = self.data.accounts[0].addr_str(chain_index=0, addr_index=addr_index)
+        account_data = self.accounts[0].data
+        addr_index = account_data.chains[0].first_unused_index + delta
+        addr_str = account_data.addr_str(chain_index=0, addr_index=addr_index)
         addr_path = f"0/{addr_index}"
         return (addr_str, addr_path)
 
     def save_account_data(self):
-        with self.data._meta.database.atomic():
-            self.data.save()
-            for account_data in self.data.accounts:
-                account_data.save()
-                for chain_data in account_data.chains:
-                    chain_data.save()
-
-    def address_data_for_index_tuple(self, address_index_tuple) -> AddressData:
-        if address_index_tuple in self.addr_indexes_to_data:
-            return self.addr_indexes_to_data[address_index_tuple]
-
-        account_index, chain_index, address_index = address_index_tuple
-
-        address_data = AddressData.get_or_none(
-            AddressData.wallet == self.data,
-            AddressData.account_index == account_index,
-            AddressData.chain_index == chain_index,
-            AddressData.address_index == address_index,
-        )
-        if not address_data:
-            Logger.debug(f"Creating address data for {address_index_tuple}")
-            path = f"{chain_index}/{address_index}"
-            address_str = self.data.accounts[account_index].addr_str(
-                chain_index, address_index
-            )
-
-            address_data = AddressData(
-                wallet=self.data,
-                account=self.data.accounts[account_index],
-                address_str=address_str,
-                script_hash=self.accounts[account_index].ES_hash_for_path(path),
-                account_index=account_index,
-                chain_index=chain_index,
-                address_index=address_index,
-                path=path,
+        self.save_data(self.data)
+        for account in self.accounts.values():
+            account_data = account.data
+            self.save_data(account_data)
+            for chain_data in account_data.chains:
+                self.save_data(chain_data)
+
+    async def address_data_for_index_tuples(
+        self, address_index_tuples
+    ) -> List[AddressData]:
+        """
+        The address data of a list of index tuples. The addresses not loaded yet are
+        loaded or created by model.address_materializer, on the thread of the write
+        behind buffer: the rows are selected by ranges, and the missing addresses are
+        derived by ranges, unless the derivation pool derived them already, and
+        inserted in one transaction.
+        """
+        missing_tuples = [
+            address_index_tuple
+            for address_index_tuple in address_index_tuples
+            if address_index_tuple not in self.addr_indexes_to_data
+        ]
+        if missing_tuples:
+            tuple_to_data = await asyncio.wrap_future(
+                write_behind_buffer().submit(
+                    lambda: materialize_addresses(
+                        self.data,
+                        self.accounts,
+                        missing_tuples,
+                        self._derived_addresses,
+                    )
+                )
             )
-        self.addr_indexes_to_data[address_index_tuple] = address_data
-        self._addr_str_to_data[address_data.address_str] = address_data
+            for address_data in tuple_to_data.values():
+                self._add_address_data(address_data)
 
-        self.save_data(address_data)
+        return [
+            self.addr_indexes_to_data[address_index_tuple]
+            for address_index_tuple in address_index_tuples
+        ]
 
-        return self.addr_indexes_to_data[address_index_tuple]
+    def _add_address_data(self, address_data: AddressData) -> None:
+        self.addr_indexes_to_data[address_data.indexes_tuple()] = address_data
+        self._addr_str_to_data[address_data.address_str] = address_data
+        self.owned_scripts.add(address_data)
 
     def enable_disable_fidelity_bonds(self, is_enabled):
         self.data.has_fidelity_bonds = is_enabled
-        self.data.save()
+        self.save_data(self.data)
 
         if not is_enabled:
-            AddressData.delete().where(
-                (AddressData.account == self.data.accounts[0])
-                & (AddressData.chain_index == 2)
-            ).execute()
+            account_data = self.accounts[0].data
+            write_behind_buffer().submit(
+                lambda: AddressData.delete()
+                .where(
+                    (AddressData.account == account_data)
+                    & (AddressData.chain_index == 2)
+                )
+                .execute()
+            )
             self.accounts[0].disable_fidelity_bonds()
 
         if is_enabled:
             self.accounts[0].chains[2] = ScriptType.WSH_FB
         elif 2 in self.accounts[0].chains:
             del self.accounts[0].chains[2]
+        self.accounts[0].data.reset_chain_script_types()
@@ -1,14 +1,20 @@
 from abc import abstractmethod
-from typing import List, Set
+from typing import List, Optional, Set
 
 from db.account_data import AccountData
 from db.address_data import AddressData
 from db.chain_data import ChainData
+from db.identity_map import identity_map
+from db.raw_tx_store import raw_tx_store
 from db.seed_data import SeedData
 from db.tx_data import TxData
 from db.wallet_data import WalletData
+from db.write_behind_buffer import write_behind_buffer
 from kivy.logger import Logger
-from model.crypt_utils import mnemonic_to_seed
+from model.crypt_utils import mnemonic_to_root_key
+from model.history_backfill import BackfillProgress
+from model.key_cache import key_cache
+from model.runtime import log_runtime_stats
 from model.script_type import ScriptType
 from pycoin.symbols.btc import network as BTC
 from utils import bip_329_record
@@ -33,12 +39,18 @@ class WalletsObserver:
     def on_tx_summaries_updated(self, refreshing_wallets):
         pass
 
+    @abstractmethod
+    def on_history_backfill_progress(self, wallet, progress: BackfillProgress):
+        pass
+
 
 class WalletManager:
     def __init__(self) -> None:
         self.wallets = []  # type: List[Wallet]
+        # The wallets are loaded when they are first viewed or refreshed.
         for wallet_data in WalletData.select():
             self.open_wallet(wallet_data)
+        log_runtime_stats(f"{len(self.wallets)} wallets opened")
 
         self.is_refreshing = False
         self.refreshing_wallets: List[Wallet] = []
@@ -50,32 +62,29 @@ class WalletManager:
         script_type: ScriptType.BaseScriptType = ScriptType.WPKH,
         n_accounts=1,
     ) -> Wallet:
-        if not mnemonic_to_seed(mnemonic):
+        root_key = mnemonic_to_root_key(mnemonic)
+        if not root_key:
             return None
 
-        # Create WalletData object
-        seed_data = SeedData.create(mnemonic=mnemonic)
-        wallet_data = WalletData.create(seed_data=seed_data)
-
-        # Create AccountData objects
-        accounts_root_key = seed_data.root_key.subkey_for_path(
-            script_type.derivation_path()
+        seed_data = (
+            write_behind_buffer()
+            .submit(lambda: SeedData.create(mnemonic=mnemonic))
+            .result()
         )
-        for account_index in range(n_accounts):
-            account_key = accounts_root_key.subkey_for_path(f"{account_index}p")
-            xpub = account_key.as_text()
-            account_info = AccountData.create(
-                wallet=wallet_data,
-                account_index=account_index,
-                xpub=xpub,
+        # The root key is derived once, the private keys are derived from the cache.
+        key_cache().set_root_key(seed_data.id, root_key)
+        xpubs = [
+            key_cache()
+            .account_key(
+                seed_data.id,
+                lambda: mnemonic,
+                script_type.derivation_path(),
+                account_index,
             )
-            for i in (0, 1):
-                ChainData.create(
-                    account=account_info,
-                    chain_index=i,
-                    script_type_name=script_type.script_type_name(),
-                )
-            account_index += 1
+            .as_text()
+            for account_index in range(n_accounts)
+        ]
+        wallet_data = self._create_wallet_data(xpubs, script_type, seed_data)
 
         new_wallet = Wallet(wallet_data)
         self.wallets.append(new_wallet)
@@ -90,28 +99,42 @@ class WalletManager:
             if not verify_xpub(xpub):
                 return None
 
-        wallet_data = WalletData.create()
-
-        # Create accounts from xpubs
-        account_index = 0
-        for xpub in xpubs:
-            account_data = AccountData.create(
-                wallet=wallet_data,
-                account_index=account_index,
-                xpub=xpub,
-            )
-            for i in (0, 1):
-                ChainData.create(
-                    account=account_data,
-                    chain_index=i,
-                    script_type_name=script_type.script_type_name(),
-                )
-            account_index += 1
+        wallet_data = self._create_wallet_data(xpubs, script_type)
 
         new_wallet = Wallet(wallet_data)
         self.wallets.append(new_wallet)
         return new_wallet
 
+    def _create_wallet_data(
+        self,
+        xpubs: List[str],
+        script_type: ScriptType.BaseScriptType,
+        seed_data: Optional[SeedData] = None,
+    ) -> WalletData:
+        """
+        Create the rows of a wallet with an account of each xpub, on the thread of the
+        write-behind buffer.
+        """
+
+        def create() -> WalletData:
+            with WalletData._meta.database.atomic():
+                wallet_data = WalletData.create(seed_data=seed_data)
+                for account_index, xpub in enumerate(xpubs):
+                    account_data = AccountData.create(
+                        wallet=wallet_data,
+                        account_index=account_index,
+                        xpub=xpub,
+                    )
+                    for i in (0, 1):
+                        ChainData.create(
+                            account=account_data,
+                            chain_index=i,
+                            script_type_name=script_type.script_type_name(),
+                        )
+            return wallet_data
+
+        return write_behind_buffer().submit(create).result()
+
     def open_wallet(self, wallet_data: WalletData):
         Logger.info(f"Opening wallet {wallet_data.name}...")
         self.wallets.append(Wallet(wallet_data))
@@ -120,9 +143,23 @@ class WalletManager:
     def remove_wallet(self, wallet_info: WalletData):
         for wallet in self.wallets:
             if wallet.data == wallet_info:
-                wallet.data.delete_instance(recursive=True)
+                if wallet.data.seed_data_id is not None:
+                    key_cache().wipe(wallet.data.seed_data_id)
+                # Deleted after the pending saves of the wallet, which would insert
+                # its rows again.
+                write_behind_buffer().submit(
+                    lambda: self._delete_wallet_data(wallet.data)
+                ).result()
+                for account in wallet.accounts.values():
+                    identity_map().remove(account.data)
+                identity_map().remove(wallet.data)
                 self.wallets.remove(wallet)
 
+    def _delete_wallet_data(self, wallet_data: WalletData) -> None:
+        wallet_data.delete_instance(recursive=True)
+        # The txs of no other wallet.
+        raw_tx_store().delete_unreferenced(TxData.select(TxData.tx_id))
+
     def register_observer(self, wallets_observer: WalletsObserver):
         self.observers.add(wallets_observer)
 
@@ -163,6 +200,7 @@ class WalletManager:
             Logger.info(f"WKWallet: Refreshing wallet: {wallet.wallet_title()}")
             wallet.refresh(
                 self.on_wallet_refresh_completed,
+                self.on_history_backfill_progress,
             )
             self.pending_wallets.add(wallet)
 
@@ -172,6 +210,7 @@ class WalletManager:
             self.pending_wallets.remove(wallet)
         if not self.pending_wallets:
             Logger.info("WKWallet: All wallets have completed refreshing.")
+            log_runtime_stats("refresh completed")
             self.is_refreshing = False
             for wallets_observer in self.observers:
                 wallets_observer.on_tx_summaries_updated(self.refreshing_wallets)
@@ -180,6 +219,14 @@ class WalletManager:
             for wallet in self.pending_wallets:
                 Logger.info(f"WKWallet: Pending wallet:{wallet.wallet_title()}")
 
+    def on_history_backfill_progress(self, wallet, progress: BackfillProgress):
+        if progress.completed:
+            Logger.info(
+                f"WKWallet: History backfill completed: {wallet.wallet_title()}"
+            )
+        for wallets_observer in self.observers:
+            wallets_observer.on_history_backfill_progress(wallet, progress)
+
     def update_tx_summaries(self, target_wallets: List[Wallet] = []):
         if not target_wallets:
             target_wallets = self.wallets